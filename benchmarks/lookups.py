@@ -0,0 +1,185 @@
+"""
+Benchmark lookup and write paths against a synthetic database.
+
+Reports latency percentiles and throughput for single lookups and
+`batch_query` per lookup key, lookups with the 'all' index, and the
+`add_alias` and `make_primary` writes, as JSON:
+
+    python benchmarks/lookups.py --participants 100000 -o tmp/benchmark.json
+
+All work happens on a temporary copy of the database.
+"""
+
+from id_search import config
+import click
+import datetime
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+# synthetic is imported in main, since it imports id_search.db, which
+# creates its engine from the config
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def summarize(name, times, items=1):
+    """Summarize a list of timings, each covering items lookups."""
+
+    times = sorted(times)
+
+    def pct(p):
+        return times[min(len(times) - 1, int(p / 100 * len(times)))] * 1000
+
+    return {
+        'name': name,
+        'runs': len(times),
+        'items_per_run': items,
+        'p50_ms': pct(50),
+        'p95_ms': pct(95),
+        'p99_ms': pct(99),
+        'mean_ms': statistics.mean(times) * 1000,
+        'throughput_per_s': items * len(times) / sum(times),
+    }
+
+
+def reset_caches(utils, cache):
+    """Forget what lookups know about the database, e.g. after writes."""
+
+    utils.forget_tables()
+    cache.clear_caches()
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    fn(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+@click.command()
+@click.option('-n', '--participants', 'n', default=10000, show_default=True,
+              help='Participants in the generated database.')
+@click.option('--db', 'source', type=click.Path(exists=True),
+              help='Benchmark a copy of this database instead.')
+@click.option('--lookups', default=200, show_default=True,
+              help='Single lookups per key.')
+@click.option('--batch-size', default=10000, show_default=True,
+              help='Rows per batch_query.')
+@click.option('--repeat', default=5, show_default=True,
+              help='Runs of each batch_query.')
+@click.option('--writes', default=50, show_default=True,
+              help='Calls of each write command.')
+@click.option('--build-index', is_flag=True,
+              help='Build the identifier index before benchmarking.')
+@click.option('--seed', default=0, show_default=True)
+@click.option('-o', '--output', default='tmp/benchmark.json',
+              show_default=True)
+def main(n, source, lookups, batch_size, repeat, writes, build_index, seed,
+         output):
+    """Benchmark lookup and write paths."""
+
+    workdir = tempfile.mkdtemp()
+    path = os.path.join(workdir, 'benchmark.db')
+    # The engine is created from the config when id_search.db is first
+    # imported, so the URL is set before anything imports it
+    config.set({'db-url': f'sqlite:///{path}',
+                'snapshot': {'enabled': False}})
+    import synthetic
+    from id_search import cache, db, utils
+    from sqlalchemy import func, select
+    from sqlalchemy.orm import Session
+    import pandas as pd
+
+    if db.engine.url.database != path:
+        raise click.ClickException(
+            f'id_search.db was imported before the benchmark database was '
+            f'configured, and is bound to {db.engine.url}'
+        )
+    if source:
+        shutil.copy(source, path)
+    else:
+        print(f'Generating {n} participants...')
+        synthetic.generate(path, n, seed)
+
+    if build_index:
+        utils.build_index()
+    reset_caches(utils, cache)
+
+    rng = random.Random(seed)
+    results = []
+    samples = {}
+    with Session(db.engine) as session:
+        for key, pairs in utils.lookups.items():
+            if key == 'all':
+                continue
+            table, column = pairs[0]
+            expr = utils.index_expr(column)
+            samples[key] = session.scalars(
+                select(expr).select_from(table).where(expr.is_not(None))
+                .order_by(func.random()).limit(max(lookups, batch_size))
+            ).all()
+
+        for key in samples:
+            times = [timed(utils.get_participants, v, utils.lookups[key],
+                           session) for v in samples[key][:lookups]]
+            results.append(summarize(f'lookup {key}', times))
+
+        mixed = [v for values in samples.values() for v in values]
+        times = [timed(utils.get_participants, v, utils.lookups['all'],
+                       session) for v in rng.sample(mixed, lookups)]
+        results.append(summarize('lookup all', times))
+
+    for key in list(samples) + ['all']:
+        pool = samples[key] if key in samples else mixed
+        values = pd.Series(rng.choices(pool, k=batch_size))
+        times = [timed(utils.batch_query, values, key) for _ in range(repeat)]
+        results.append(summarize(f'batch_query {key}', times, batch_size))
+
+    # Writes: add new aliases, then promote them to primary IDs
+    with Session(db.engine) as session:
+        cids = session.scalars(
+            select(db.RegisteredParticipant.consortium_id)
+            .order_by(func.random()).limit(writes)
+        ).all()
+    aliases = synthetic._cids(rng, len(cids))
+    reset_caches(utils, cache)
+    results.append(summarize('add_alias', [
+        timed(utils.add_alias, cid, alias)
+        for cid, alias in zip(cids, aliases)
+    ]))
+    results.append(summarize('make_primary', [
+        timed(utils.make_primary, alias) for alias in aliases
+    ]))
+
+    report = {
+        'meta': {
+            'timestamp': datetime.datetime.now().isoformat(),
+            'participants': n if not source else None,
+            'source': source,
+            'identifier_index': build_index,
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+        },
+        'results': results,
+    }
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    for r in results:
+        print(f'{r["name"]:45} p50 {r["p50_ms"]:9.2f} ms  '
+              f'p95 {r["p95_ms"]:9.2f} ms  '
+              f'{r["throughput_per_s"]:10.0f} /s')
+    print(f'Results have been saved to {output}')
+    shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main()
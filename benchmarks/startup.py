@@ -0,0 +1,74 @@
+"""
+Benchmark CLI startup time against a budget.
+
+Exits with status 1 if the median time of any command exceeds its budget, or
+if importing the CLI pulls in modules that should only be imported by the
+commands that need them.
+
+    python benchmarks/startup.py --runs 20
+"""
+
+import click
+import statistics
+import subprocess
+import sys
+import time
+
+# Modules that must not be imported at CLI startup
+HEAVY_MODULES = ['pandas', 'numpy', 'sqlalchemy', 'id_search.db',
+                 'id_search.utils']
+
+# Command -> startup budget in seconds
+BUDGETS = {
+    'import id_search.cli': ([sys.executable, '-c', 'import id_search.cli'],
+                             0.25),
+    'id-search --help': ([sys.executable, '-m', 'id_search.cli', '--help'],
+                         0.3),
+    'id-search add-alias --help': ([sys.executable, '-m', 'id_search.cli',
+                                    'add-alias', '--help'], 0.3),
+}
+
+
+def timeit(cmd, runs):
+    """Return the median wall time of running cmd."""
+
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+@click.command()
+@click.option('--runs', default=10, show_default=True,
+              help='Number of runs per command.')
+@click.option('--scale', default=1.0, show_default=True,
+              help='Multiply all budgets, e.g. for slow machines.')
+def main(runs, scale):
+    """Benchmark CLI startup time against a budget."""
+
+    failed = False
+    imported = subprocess.run(
+        [sys.executable, '-c',
+         'import sys, id_search.cli; print(" ".join(sys.modules))'],
+        check=True, capture_output=True, text=True
+    ).stdout.split()
+    for module in HEAVY_MODULES:
+        if module in imported:
+            print(f'FAIL {module} imported at startup')
+            failed = True
+
+    for name, (cmd, budget) in BUDGETS.items():
+        budget *= scale
+        elapsed = timeit(cmd, runs)
+        status = 'ok' if elapsed <= budget else 'FAIL'
+        failed |= elapsed > budget
+        print(f'{status:4} {name}: {elapsed*1000:.0f} ms '
+              f'(budget {budget*1000:.0f} ms)')
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
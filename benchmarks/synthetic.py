@@ -0,0 +1,200 @@
+"""
+Generate a synthetic IBDGC ID database for benchmarking.
+
+Fills every table of the `id_search.db` schema with random but realistic
+data at a configurable scale, respecting all of its constraints:
+
+    python benchmarks/synthetic.py --participants 100000 tmp/synthetic.db
+"""
+
+from id_search import db
+from sqlalchemy import create_engine, event, insert
+import click
+import datetime
+import os
+import random
+import string
+
+CENTERS = 20
+# Fraction of participants with each kind of child record
+ALIAS_RATE = 0.05
+LCL_RATE = 0.5
+DNA_RATE = 0.9
+BLOOD_RATE = 0.3
+LOCAL_DNA_RATE = 0.4
+GENOTYPING_RATE = 0.7
+BATCH = 50000
+
+
+def _cids(rng, n):
+    """Return n distinct Consortium IDs matching db.CID_PATTERN."""
+
+    return [f'{string.ascii_uppercase[i // 10**12]}'
+            f'{i // 10**6 % 10**6:06d}-{i % 10**6:06d}'
+            for i in rng.sample(range(26 * 10**12), n)]
+
+
+def _phenotype(rng):
+    """Return (affection, diag, control) satisfying the check constraints."""
+
+    affection = rng.choice(['Affected', 'Affected', 'Unaffected', 'Unknown',
+                            None])
+    if affection == 'Affected':
+        return affection, rng.choice(['CD', 'UC', 'Indeterminate',
+                                      'Unknown', None]), None
+    if affection == 'Unaffected':
+        return affection, None, rng.choice([True, False, None])
+    return affection, None, None
+
+
+def _barcode(rng):
+    return (f'{rng.randrange(10**11, 10**12):012d}'
+            f'_R{rng.randrange(1, 13):02d}C{rng.randrange(1, 3):02d}')
+
+
+def participants(rng, n):
+    """
+    Yield (participant, children) tuples for n participants, grouped into
+    families with parents and spouses linked.
+
+    children maps each child table to a list of rows.
+    """
+
+    cids = _cids(rng, n + int(2 * n * ALIAS_RATE) + 10)
+    aliases = iter(cids[n:])
+    niddk = iter(rng.sample(range(100000, 1000000), min(900000, n)))
+    local_ids = {}
+    public_ids = iter(rng.sample(range(1, 10 * n + 1), n))
+
+    i = 0
+    family = 0
+    while i < n:
+        family += 1
+        size = min(rng.choice([1, 1, 2, 3, 3, 4, 5, 6]), n - i)
+        center_id = rng.randrange(1, CENTERS + 1)
+        # No separators, so that "<pedigree>-<individual>" splits back
+        local_pedigree = f'P{center_id:02d}{family:06d}'
+        # The first two members of larger families are the parents
+        parents = cids[i:i + 2] if size > 2 else []
+        for individual in range(1, size + 1):
+            cid = cids[i]
+            i += 1
+            local_ids[center_id] = local_ids.get(center_id, 0) + 1
+            affection, diag, control = _phenotype(rng)
+            parent = individual <= 2 and size > 2
+            p = {
+                'consortium_id': cid,
+                'center_id': center_id,
+                'family_id': str(family),
+                'individual_id': individual,
+                'father': None if parent or size < 3 else 1,
+                'mother': None if parent or size < 3 else 2,
+                'spouse': parents[2 - individual] if parent else None,
+                'public_id': next(public_ids) if rng.random() < 0.8 else None,
+                'public_family_id': family,
+                'local_id': f'L{center_id:02d}{local_ids[center_id]:07d}',
+                'local_pedigree': local_pedigree,
+                'local_individual': individual,
+                'registration_date': datetime.date(2000, 1, 1)
+                + datetime.timedelta(days=rng.randrange(9000)),
+                'yob': rng.randrange(1920, 2020),
+                'sex': rng.choice(['Male', 'Female', 'Unknown']),
+                'affection': affection,
+                'diag': diag,
+                'control': control,
+                'withdrawn': rng.random() < 0.01,
+            }
+
+            children = {table: [] for table in
+                        [db.Alias, db.RutgersLCL, db.DNASample, db.BloodSample,
+                         db.LocalDNASample, db.GenotypingResult]}
+            alias = next(aliases) if rng.random() < ALIAS_RATE else None
+            if alias is not None:
+                children[db.Alias].append({'alias': alias,
+                                           'consortium_id': cid})
+            if rng.random() < LCL_RATE:
+                no = next(niddk, None)
+                if no is not None:
+                    children[db.RutgersLCL].append({
+                        'niddk_no': no,
+                        'knumber': f'K{no % 100000:05d}'
+                                   + rng.choice(['', '', 'A', 'B']),
+                        'consortium_id': cid,
+                    })
+            if rng.random() < DNA_RATE:
+                children[db.DNASample].append({'id': f'DNA{i:08d}',
+                                               'consortium_id': cid})
+            if rng.random() < BLOOD_RATE:
+                children[db.BloodSample].append({
+                    'id': f'BLD{i:08d}', 'consortium_id': cid,
+                    'sample_type': rng.choice(['Serum', 'Plasma']),
+                })
+            if rng.random() < LOCAL_DNA_RATE:
+                children[db.LocalDNASample].append({
+                    'id': f'{local_ids[center_id]:07d}-D',
+                    'center_id': center_id, 'consortium_id': cid,
+                })
+            if rng.random() < GENOTYPING_RATE:
+                project = rng.choice(['Immunochip', 'Exome Chip', 'GSA'])
+                children[db.GenotypingResult].append({
+                    'id': f'GM{rng.randrange(100, 300)}-{i}',
+                    'consortium_id': cid, 'project': project,
+                    'barcode': _barcode(rng),
+                })
+            yield p, children
+
+
+def generate(path, n, seed=0):
+    """Create a synthetic database with n participants at path."""
+
+    if os.path.exists(path):
+        os.remove(path)
+    engine = create_engine(f'sqlite:///{path}')
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        dbapi_connection.execute('PRAGMA journal_mode = OFF')
+        dbapi_connection.execute('PRAGMA synchronous = OFF')
+
+    db.Base.metadata.create_all(engine)
+    rng = random.Random(seed)
+
+    with engine.begin() as conn:
+        conn.execute(insert(db.Center), [
+            {'id': c, 'name': f'Center {c:02d}',
+             'investigator': f'Investigator {c:02d}'}
+            for c in range(1, CENTERS + 1)
+        ])
+
+        rows = {}
+
+        def flush():
+            for table, batch in rows.items():
+                if batch:
+                    conn.execute(insert(table.__table__), batch)
+            rows.clear()
+
+        for count, (p, children) in enumerate(participants(rng, n), 1):
+            rows.setdefault(db.RegisteredParticipant, []).append(p)
+            for table, items in children.items():
+                rows.setdefault(table, []).extend(items)
+            if count % BATCH == 0:
+                flush()
+        flush()
+    engine.dispose()
+
+
+@click.command()
+@click.option('-n', '--participants', 'n', default=10000, show_default=True,
+              help='Number of participants.')
+@click.option('--seed', default=0, show_default=True)
+@click.argument('path', default='tmp/synthetic.db')
+def main(n, seed, path):
+    """Generate a synthetic database at PATH."""
+
+    print(f'Generating {n} participants in {path}...')
+    generate(path, n, seed)
+
+
+if __name__ == '__main__':
+    main()
@@ -9,8 +9,37 @@ config = confuse.Configuration('IBDGCDatabase', __name__)
 if os.path.isfile('config.yaml'):
     config.set_file('config.yaml')
 
-loaders = sorted((importlib.import_module(name)
-                  for finder, name, ispkg
-                  in pkgutil.iter_modules([Path(__file__).parent / 'loaders'],
-                                          prefix='ibdgc_db.loaders.')),
-                 key=lambda x: getattr(x, 'PRIORITY', float('inf')))
+
+class ReadOnlyError(Exception):
+    """Raised when writing to a database opened as a read-only snapshot."""
+
+
+class CenterNotFound(ValueError):
+    """Raised when restricting a lookup to a center that does not exist."""
+
+
+class IndexNotBuilt(Exception):
+    """Raised when searching a database without the identifier index."""
+
+
+def get_loaders():
+    """
+    Return the loaders defined in the modules of id_search/loaders, in order
+    of priority.
+
+    Each module contributes an instance of every Loader subclass with a
+    model it defines, or else itself if it has an execute(db) function.
+    """
+    from id_search.loaders import Loader
+
+    loaders = []
+    for finder, name, ispkg in pkgutil.iter_modules(
+            [Path(__file__).parent / 'loaders'], prefix='id_search.loaders.'):
+        module = importlib.import_module(name)
+        found = [obj() for obj in vars(module).values()
+                 if isinstance(obj, type) and issubclass(obj, Loader)
+                 and obj.__module__ == name and obj.model is not None]
+        if not found and hasattr(module, 'execute'):
+            found = [module]
+        loaders += found
+    return sorted(loaders, key=lambda x: getattr(x, 'PRIORITY', float('inf')))
@@ -0,0 +1,276 @@
+"""
+Async lookup API, for embedding in asyncio services.
+
+Queries run on SQLAlchemy's async engine with the aiosqlite driver (install
+with `pip install .[async]`), through a bounded pool of connections. The
+lookup logic of `utils` is shared with the blocking API, by running it on
+the async connections with `run_sync`.
+
+Concurrent requests are coalesced: values requested while a batch is
+pending join that batch, which is resolved with one batched query, and
+values already being resolved are not queried again. For example:
+
+    async with AsyncLookupService() as service:
+        records = await service.lookup(['DNA00000001', 'N554248-583117'])
+"""
+
+from id_search import cache, db, utils
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.util import greenlet_spawn
+import asyncio
+import pandas as pd
+
+
+def async_engine(pool_size=5, max_overflow=0, pool_timeout=30):
+    """
+    Return an async engine for the database of `db.engine`, opened the same
+    way (e.g. as a read-only snapshot).
+
+    At most pool_size + max_overflow connections are open at once; further
+    requests wait up to pool_timeout seconds for a connection.
+    """
+
+    url = db.engine.url
+    if url.get_backend_name() != 'sqlite':
+        raise Exception('The async API only supports SQLite databases')
+    engine = create_async_engine(url.set(drivername='sqlite+aiosqlite'),
+                                 poolclass=AsyncAdaptedQueuePool,
+                                 pool_size=pool_size,
+                                 max_overflow=max_overflow,
+                                 pool_timeout=pool_timeout)
+    if db.snapshot:
+        db.set_snapshot_pragmas(engine.sync_engine)
+    return engine
+
+
+class Coalescer:
+    """
+    Merge concurrent requests for values into batches.
+
+    Values requested while a batch is pending join it, and values of a batch
+    being resolved share its results. A batch is resolved once all coroutines
+    ready to run have added their values, or after window seconds.
+
+    Parameters
+    ----------
+    resolve : coroutine function
+        Called with a list of distinct values, returning a dict of results
+        by value.
+    default : callable, optional
+        Returns the result of values missing from the dict, e.g. list.
+    window : float, default 0
+        Seconds to wait for more values before resolving a batch.
+    """
+
+    def __init__(self, resolve, default=None, window=0):
+        self.resolve = resolve
+        self.default = default
+        self.window = window
+        self._pending = {}
+        self._running = {}
+        self._tasks = set()
+
+    async def get(self, values):
+        """Return a dict of the results of values."""
+
+        loop = asyncio.get_running_loop()
+        futures = {}
+        for value in values:
+            future = self._running.get(value) or self._pending.get(value)
+            if future is None:
+                future = self._pending[value] = loop.create_future()
+                if len(self._pending) == 1:
+                    task = loop.create_task(self._flush())
+                    self._tasks.add(task)
+                    task.add_done_callback(self._tasks.discard)
+            futures[value] = future
+        # Shielded, so that a cancelled request does not cancel the results
+        # shared with other requests
+        results = await asyncio.gather(*map(asyncio.shield, futures.values()))
+        return dict(zip(futures, results))
+
+    async def _flush(self):
+        await asyncio.sleep(self.window)
+        batch, self._pending = self._pending, {}
+        self._running.update(batch)
+        try:
+            results = await self.resolve(list(batch))
+            for value, future in batch.items():
+                if value in results:
+                    future.set_result(results[value])
+                else:
+                    future.set_result(None if self.default is None
+                                      else self.default())
+        except Exception as e:
+            for future in batch.values():
+                if future.done():
+                    continue
+                future.set_exception(e)
+                # Marked as retrieved, in case all requests were cancelled
+                future.exception()
+        finally:
+            for value, future in batch.items():
+                # Only if the batch itself was cancelled
+                future.cancel()
+                self._running.pop(value, None)
+
+
+class AsyncLookupService:
+    """
+    Async counterpart of `service.LookupService`, sharing one async engine
+    between concurrent requests.
+
+    Parameters
+    ----------
+    engine : AsyncEngine, optional
+        Defaults to a new engine from `async_engine`.
+    window : float, default 0
+        Seconds to wait for concurrent requests to coalesce, see
+        `Coalescer`.
+    """
+
+    def __init__(self, engine=None, window=0):
+        self.engine = engine or async_engine()
+        self.window = window
+        self._resolvers = {}
+        self._hydrator = Coalescer(self._hydrate, window=window)
+        self._cache_lock = asyncio.Lock()
+
+    async def __aenter__(self):
+        await self.warm()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def warm(self):
+        """Open a pooled connection and load the identifier cache."""
+
+        async with self.engine.connect():
+            pass
+        await greenlet_spawn(utils.has_index, self.engine.sync_engine)
+        await self._refresh_cache()
+
+    async def close(self):
+        """Close all pooled connections."""
+
+        await self.engine.dispose()
+
+    async def _refresh_cache(self):
+        # Built outside of sessions and by one request at a time, since the
+        # cache is built under a thread lock and from its own connection
+        async with self._cache_lock:
+            await greenlet_spawn(cache.identifier_cache,
+                                 self.engine.sync_engine)
+
+    async def _run(self, fn):
+        """Call fn(session) with the sync Session of a new AsyncSession."""
+
+        async with AsyncSession(self.engine) as session:
+            return await session.run_sync(fn)
+
+    def _keys(self, index):
+        try:
+            return utils.lookups[index]
+        except KeyError:
+            raise ValueError(f'Unknown index "{index}"')
+
+    async def resolve(self, values, index='all', center=None):
+        """
+        Resolve identifiers to Consortium IDs.
+
+        Returns
+        -------
+        dict
+            Sorted list of the Consortium IDs matched by each value.
+        """
+
+        keys = self._keys(index)
+        if isinstance(values, str):
+            values = [values]
+        resolver = self._resolvers.get((index, center))
+        if resolver is None:
+            async def resolve(batch):
+                await self._refresh_cache()
+                found = await self._run(
+                    lambda s: utils.resolve(batch, keys, s, center)
+                )
+                matched = {}
+                for value, cid in found.sort_values('consortium_id')[
+                        ['value', 'consortium_id']].itertuples(index=False):
+                    matched.setdefault(value, []).append(cid)
+                return matched
+            resolver = self._resolvers[(index, center)] = Coalescer(
+                resolve, default=list, window=self.window
+            )
+        return await resolver.get(dict.fromkeys(values))
+
+    async def _hydrate(self, cids):
+        def load(session):
+            return {
+                p.consortium_id: utils.extract_participant_data(p)
+                for p in utils.load_participants(cids, session)
+            }
+        return await self._run(load)
+
+    async def load_participants(self, cids):
+        """
+        Return the records of participants by Consortium ID, see
+        `utils.extract_participant_data`, skipping unknown IDs.
+        """
+
+        records = await self._hydrator.get(dict.fromkeys(cids))
+        return [record for record in records.values() if record is not None]
+
+    async def get_participants(self, value, index='all', center=None):
+        """Return the records of the participants matched by one value."""
+
+        matched = await self.resolve([value], index, center)
+        return await self.load_participants(matched[value])
+
+    async def lookup(self, values, index='all', center=None):
+        """
+        Look up one or more identifiers.
+
+        Returns
+        -------
+        DataFrame
+            Records of matched participants, see `utils.lookup_records`.
+        """
+
+        matched = await self.resolve(values, index, center)
+        records = {
+            record['consortium_id']: record
+            for record in await self.load_participants(
+                cid for cids in matched.values() for cid in cids
+            )
+        }
+        return pd.DataFrame(
+            [{'value': value, **records[cid]}
+             for value, cids in matched.items() for cid in cids
+             if cid in records],
+            columns=['value', *utils.record_types()]
+        )
+
+    async def batch_query(self, values, keys=None, center=None):
+        """
+        Query participants based on a series or data frame of identifiers,
+        see `utils.batch_query`.
+        """
+
+        values, keys = utils.batch_columns(values, keys)
+        matches = []
+        for column, key in zip(values.columns, keys):
+            rows = utils.batch_rows(values[column])
+            matched = await self.resolve(
+                rows['value'].drop_duplicates().tolist(), key, center
+            )
+            found = pd.DataFrame(
+                [(value, cid) for value, cids in matched.items()
+                 for cid in cids],
+                columns=['value', 'consortium_id'], dtype=object
+            )
+            matches.append(rows.merge(found, on='value')[['row',
+                                                          'consortium_id']])
+        return utils.batch_result(matches, values.index)
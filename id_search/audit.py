@@ -0,0 +1,167 @@
+"""
+Database-wide audit of identifier conflicts.
+
+Each check is a single SQL statement whose rows are streamed to a file, so
+a snapshot of any size is audited with bounded memory:
+
+    ambiguous    identifiers resolving to more than one participant, within
+                 or across lookup columns (including aliases)
+    shared       identifiers that are only unique per center (e.g. local
+                 IDs), used by participants of several centers; these are
+                 warnings, as lookups within a center still resolve them
+    alias        aliases that are also a primary Consortium ID
+    dangling_fk  rows referencing a missing row of another table
+"""
+
+from id_search import db, output, utils
+from sqlalchemy import (select, union_all, literal, and_, case, func, cast,
+    String, null, PrimaryKeyConstraint, UniqueConstraint)
+import pandas as pd
+
+COLUMNS = ['check', 'kind', 'value', 'center_id', 'consortium_id', 'detail']
+TYPES = {'check': str, 'kind': str, 'value': str, 'center_id': int,
+         'consortium_id': str, 'detail': str}
+# Checks reported as warnings rather than conflicts
+WARNINGS = {'shared'}
+
+
+def center_scoped_kinds():
+    """
+    Return the kinds of lookup columns whose values are only unique per
+    center, i.e. part of a primary key or unique constraint with center_id.
+    """
+
+    kinds = []
+    for table, column in utils.lookups['all']:
+        names = {c.name for c in column.property.columns}
+        for constraint in table.__table__.constraints:
+            keys = set(constraint.columns.keys())
+            if (isinstance(constraint, (PrimaryKeyConstraint,
+                                        UniqueConstraint))
+                    and 'center_id' in keys and names <= keys):
+                kinds.append(utils.kind_name(table, column))
+                break
+    return kinds
+
+
+def ambiguous_identifiers():
+    """
+    Select every (kind, value, center_id, consortium_id) row of identifiers
+    matching several participants, in one pass over all lookup columns.
+
+    Rows of center-scoped kinds (see `center_scoped_kinds`) only matching
+    participants of other centers are reported by the 'shared' check.
+    """
+
+    ids = union_all(*utils.identifier_selects()).subquery()
+    # An identifier is ambiguous if its Consortium IDs differ, computed with
+    # window functions so that matches are listed without a second pass
+    cid = ids.c.consortium_id
+    value = {'partition_by': ids.c.value}
+    center = {'partition_by': [ids.c.value, ids.c.center_id]}
+    rows = select(
+        ids,
+        func.min(cid).over(**value).label('lo'),
+        func.max(cid).over(**value).label('hi'),
+        (func.min(cid).over(**center) != func.max(cid).over(**center))
+        .label('within_center'),
+    ).subquery()
+    shared = and_(rows.c.kind.in_(center_scoped_kinds()),
+                  ~rows.c.within_center)
+    return select(
+        case((shared, 'shared'), else_='ambiguous').label('check'),
+        rows.c.kind,
+        rows.c.value,
+        rows.c.center_id,
+        rows.c.consortium_id,
+        # Identifiers assigned by centers are only ambiguous in lookups
+        # without a center if they differ across centers
+        case((rows.c.within_center, 'within center'),
+             else_='across centers').label('detail'),
+    ).where(rows.c.lo != rows.c.hi).order_by(rows.c.value, rows.c.kind,
+                                              rows.c.consortium_id)
+
+
+def alias_collisions():
+    """Select aliases that are also the primary ID of a participant."""
+
+    alias = db.Alias
+    p = db.RegisteredParticipant
+    return select(
+        literal('alias').label('check'),
+        literal(utils.kind_name(alias, alias.alias)).label('kind'),
+        alias.alias.label('value'),
+        null().label('center_id'),
+        alias.consortium_id,
+        literal('also a primary Consortium ID').label('detail'),
+    ).join_from(alias, p, p.consortium_id == alias.alias).order_by(
+        alias.alias
+    )
+
+
+def dangling_foreign_keys():
+    """
+    Yield one statement per foreign key of the schema, selecting the rows
+    whose referenced row is missing.
+    """
+
+    for table in db.Base.metadata.sorted_tables:
+        for fk in table.foreign_key_constraints:
+            referred = fk.referred_table.alias()
+            local = [element.parent for element in fk.elements]
+            remote = [referred.c[element.column.name]
+                      for element in fk.elements]
+            value = cast(local[0], String)
+            for column in local[1:]:
+                value = value + '-' + cast(column, String)
+            names = ', '.join(f'{fk.referred_table.name}.{c.name}'
+                              for c in remote)
+            cid = table.c.get('consortium_id')
+            center_id = table.c.get('center_id')
+            yield select(
+                literal('dangling_fk').label('check'),
+                literal(', '.join(f'{table.name}.{c.name}' for c in local))
+                .label('kind'),
+                value.label('value'),
+                (null() if center_id is None else center_id)
+                .label('center_id'),
+                (null() if cid is None else cid).label('consortium_id'),
+                literal(f'no matching {names}').label('detail'),
+            ).outerjoin_from(
+                table, referred, and_(*[l == r for l, r in zip(local, remote)])
+            ).where(
+                and_(*[c.is_not(None) for c in local]),
+                remote[0].is_(None),
+            )
+
+
+def _frame(rows):
+    return pd.DataFrame(rows, columns=COLUMNS, dtype=object)
+
+
+def audit(path, engine=None, chunk_size=100000):
+    """
+    Run all checks, writing the conflicts found to path (CSV, TSV or
+    Parquet) as they are read.
+
+    Returns the number of rows written per check, including the checks in
+    WARNINGS.
+    """
+
+    engine = engine or db.engine
+    statements = [ambiguous_identifiers(), alias_collisions(),
+                  *dangling_foreign_keys()]
+    counts = {}
+    with engine.connect() as conn, \
+            output.TableWriter(path, types=TYPES) as writer:
+        for stmt in statements:
+            result = conn.execution_options(yield_per=chunk_size).execute(stmt)
+            for rows in result.partitions():
+                df = _frame(rows)
+                writer.write(df)
+                for check, count in df['check'].value_counts().items():
+                    counts[check] = counts.get(check, 0) + int(count)
+        if not writer.rows:
+            # Write the header even if no conflicts are found
+            writer.write(_frame([]))
+    return counts
@@ -0,0 +1,157 @@
+"""
+In-memory identifier cache, keyed to the snapshot of a SQLite database file.
+
+Processes running many lookups against one snapshot (e.g. `LookupService`)
+hold every identifier in an in-memory ID map, enabled by the
+`identifier-cache` config option. Changes to the database file are detected
+from its fingerprint, see `snapshot_fingerprint`.
+"""
+
+from id_search import config, db
+from id_search.idmap import IDMap, read_identifiers
+import hashlib
+import os
+import threading
+import time
+
+
+def database_path(engine):
+    """Return the path of the SQLite database file behind engine, or None."""
+
+    url = engine.url
+    if (url.get_backend_name() != 'sqlite'
+            or url.database in (None, '', ':memory:')):
+        return None
+    # Read-only engines open the file through a "file:" URI
+    return url.database.removeprefix('file:')
+
+
+def snapshot_fingerprint(path):
+    """
+    Return a fingerprint of a SQLite database file, which changes whenever
+    the file is replaced or written to.
+
+    Combines the file's mtime and size with a hash of its 100-byte header,
+    which holds the file change counter and schema cookie.
+    """
+
+    stat = os.stat(path)
+    with open(path, 'rb') as f:
+        header = hashlib.sha1(f.read(100)).hexdigest()
+    return (stat.st_mtime_ns, stat.st_size, header)
+
+
+# Seconds for which the fingerprint of a database file is reused
+FINGERPRINT_INTERVAL = 1.0
+_fingerprints = {}
+
+
+def recent_fingerprint(path):
+    """
+    Return `snapshot_fingerprint(path)`, reading the file at most once per
+    FINGERPRINT_INTERVAL seconds.
+
+    Changes made by other processes are therefore seen within that
+    interval. Writers in this process call `forget_fingerprints` so that
+    their own changes are seen at once.
+    """
+
+    now = time.monotonic()
+    checked = _fingerprints.get(path)
+    if checked is None or now - checked[0] >= FINGERPRINT_INTERVAL:
+        checked = _fingerprints[path] = (now, snapshot_fingerprint(path))
+    return checked[1]
+
+
+def forget_fingerprints():
+    """Read database fingerprints again on next use, e.g. after writes."""
+
+    _fingerprints.clear()
+
+
+class IdentifierCache:
+    """
+    In-memory ID map (see `idmap.IDMap`) of every identifier of a SQLite
+    database, for one snapshot of the database file.
+
+    Identifiers are held in a sorted array of fixed-width keys searched with
+    `numpy.searchsorted`, with parallel arrays of Consortium ID ordinals and
+    center ids. Each identifier takes the width of the longest key plus 6
+    bytes.
+    """
+
+    def __init__(self, path, fingerprint, idmap):
+        self.path = path
+        self.fingerprint = fingerprint
+        self.idmap = idmap
+
+    def __len__(self):
+        return len(self.idmap)
+
+    @classmethod
+    def build(cls, engine):
+        """Load all identifiers from the database behind engine."""
+
+        path = database_path(engine)
+        fingerprint = snapshot_fingerprint(path)
+        return cls(path, fingerprint,
+                   IDMap.from_sections(*read_identifiers(engine)))
+
+    def stale(self):
+        """
+        Return True if the database file has changed since loading, see
+        `recent_fingerprint`.
+        """
+
+        try:
+            return recent_fingerprint(self.path) != self.fingerprint
+        except OSError:
+            return True
+
+    def probe(self, values, kinds, center=None):
+        """
+        Match values (a sequence) against identifiers of the given kinds,
+        optionally within center.
+
+        Returns
+        -------
+        positions, kinds, consortium_ids : ndarray
+            Position in values, position in kinds and Consortium ID of each
+            match.
+        """
+
+        positions, found, ordinals = self.idmap.probe(values, kinds, center)
+        return positions, found, self.idmap.consortium_ids(ordinals)
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def identifier_cache(engine=None):
+    """
+    Return the in-memory identifier cache for engine, or None if disabled.
+
+    The cache is enabled by the `identifier-cache` config option for SQLite
+    file databases. It is built on first use and rebuilt whenever the
+    database file changes.
+    """
+
+    engine = engine or db.engine
+    if not config['identifier-cache'].get(bool):
+        return None
+    if database_path(engine) is None:
+        return None
+
+    with _caches_lock:
+        cache = _caches.get(engine)
+        if cache is None or cache.stale():
+            cache = _caches[engine] = IdentifierCache.build(engine)
+    return cache
+
+
+def clear_caches():
+    """Drop the identifier caches of all engines."""
+
+    with _caches_lock:
+        _caches.clear()
@@ -1,40 +1,136 @@
 """CLI for IBDGC database"""
 
+# Only lightweight modules are imported here. The database, SQLAlchemy and
+# pandas are imported by the commands that need them, which keeps startup
+# fast for scripts calling the CLI in a loop.
 import click
-from id_search import db
-from id_search import loaders
-from id_search import utils
-from sqlalchemy.orm import Session
-import pandas as pd
+from id_search import CenterNotFound, IndexNotBuilt, ReadOnlyError
 import os
+import time
 
 
-@click.group()
-def cli():
+class Group(click.Group):
+    """
+    Group reporting writes to a read-only snapshot, unknown centers and
+    searches without the identifier index as usage errors.
+    """
+
+    def invoke(self, ctx):
+        try:
+            return super().invoke(ctx)
+        except (CenterNotFound, IndexNotBuilt, ReadOnlyError) as e:
+            raise click.ClickException(str(e))
+
+
+@click.group(cls=Group)
+@click.option(
+    '--profile',
+    is_flag=True,
+    help='Report query counts and timings of the command to stderr.'
+)
+@click.pass_context
+def cli(ctx, profile):
     """CLI for IBDGC database"""
-    pass
+    if profile:
+        from id_search import profiling
+        profiler = ctx.with_resource(profiling.Profiler())
+        # Runs before the profiler is closed
+        ctx.call_on_close(profiler.report)
 
 
 @cli.command()
 def init_db():
     """Initialize database."""
+    from id_search import db
     db.init_db()
 
 
 @cli.command()
-def load_data():
+@click.option(
+    '-w',
+    '--workers',
+    default=1,
+    show_default=True,
+    help='Number of processes parsing source files.'
+)
+@click.option(
+    '--replace',
+    is_flag=True,
+    help='Delete existing rows of each loaded table first.'
+)
+def load_data(workers, replace):
     """Load data by executing all loaders."""
-    for loader in loaders:
-        if hasattr(loader, 'execute'):
-            print(f'Executing loader {loader.__name__}...')
-            loader.execute(db)
+    from id_search import get_loaders, loaders
+
+    loaders.load(get_loaders(), workers=workers, replace=replace)
+
+
+@cli.command()
+def build_index():
+    """Build the identifier index for the current database snapshot."""
+    from id_search import utils
+    utils.build_index()
+
+
+@cli.command()
+@click.argument('path', default='tmp/ibdgc.idmap')
+def export_idmap(path):
+    """Export all identifiers to a memory-mapped ID map file."""
+    from id_search import idmap
+    idmap.export_idmap(path)
+
+
+@cli.command()
+@click.option(
+    '-k',
+    '--column',
+    'columns',
+    multiple=True,
+    help='Column to export (repeatable). Defaults to all.'
+)
+@click.option(
+    '-c',
+    '--center',
+    help='Only export participants of a given center.'
+)
+@click.option(
+    '-o',
+    '--output',
+    'path',
+    default=os.path.join('tmp', 'participants.parquet'),
+    show_default=True,
+    help='Output file (.parquet, .arrow, .csv, .tsv, .csv.gz or .tsv.gz).'
+)
+@click.option(
+    '--chunk-size',
+    default=100000,
+    show_default=True,
+    help='Number of participants to read and write at a time.'
+)
+def export(columns, center, path, chunk_size):
+    """
+    Export one row per participant, with center, pedigree IDs, aliases and
+    lists of sample and genotyping IDs.
+    """
+    from id_search import export, utils
+
+    names = utils.record_types()
+    unknown = [column for column in columns if column not in names]
+    if unknown:
+        raise click.BadParameter(
+            f'{", ".join(unknown)} (choose from {", ".join(names)})',
+            param_hint='--column'
+        )
+    rows = export.export(path, list(columns), center, chunk_size)
+    print(f'Exported {rows} participants to {path}')
 
 
 def list_choices():
+    from id_search import utils
     s = '\b\nAvailable indices:\n'
     for idx in utils.lookups.keys():
         s += f'  {idx}\n'
-    centers = utils.get_centers()
+    centers = utils.cached_centers()
     if centers:
         s += '\b\nCenters:\n'
         for center in centers:
@@ -42,7 +138,86 @@ def list_choices():
     return s
 
 
-@cli.command(epilog=list_choices())
+def _lookup_keys(index):
+    """
+    Return the lookup keys of an --index option, see `utils.lookups`.
+
+    Checked here rather than with click.Choice, which would need the
+    database to build the CLI.
+    """
+    from id_search import utils
+
+    try:
+        return utils.lookups[index]
+    except KeyError:
+        raise click.BadParameter(
+            f'{index} (choose from {", ".join(utils.lookups)})',
+            param_hint='--index'
+        )
+
+
+def _read_chunks(file, size):
+    """Yield lists of up to size non-blank, stripped lines from file."""
+
+    chunk = []
+    for line in file:
+        value = line.strip()
+        if value:
+            chunk.append(value)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _read_table(path):
+    """Read a CSV, or TSV if path ends in .tsv or .txt, as strings."""
+    import pandas as pd
+
+    sep = '\t' if path.endswith(('.tsv', '.txt')) else ','
+    return pd.read_csv(path, sep=sep, dtype=str)
+
+
+def _stream_lookup(keys, center, input_file, path, chunk_size):
+    """Look up values read from input_file, appending results to path."""
+    from id_search import db, output, profiling, utils
+    from sqlalchemy.orm import Session
+
+    start = time.perf_counter()
+    count = 0
+    types = {'value': str, **utils.record_types()}
+    with Session(db.engine) as session, \
+            output.TableWriter(path, types=types) as writer:
+        for chunk in _read_chunks(input_file, chunk_size):
+            df = utils.lookup_records(chunk, keys, session, center)
+            with profiling.phase('output'):
+                writer.write(df)
+            # Keep memory bounded by the chunk size
+            session.expunge_all()
+
+            count += len(chunk)
+            rate = count / (time.perf_counter() - start)
+            click.echo(f'\rLooked up {count} values, {writer.rows} matches '
+                       f'({rate:.0f} values/s)', nl=False, err=True)
+    click.echo(err=True)
+
+    if writer.rows:
+        print(f"Results have been saved to {path}")
+    else:
+        print('No participants found')
+
+
+class LookupCommand(click.Command):
+    """Command listing indices and centers in its help epilog."""
+
+    def format_epilog(self, ctx, formatter):
+        # Built only when help is shown, as it needs the database
+        self.epilog = list_choices()
+        super().format_epilog(ctx, formatter)
+
+
+@cli.command(cls=LookupCommand)
 @click.option(
     '-i',
     '--index',
@@ -54,54 +229,486 @@ def list_choices():
     '--center',
     help='Restrict search to a given center.'
 )
+@click.option(
+    '--input',
+    'input_file',
+    type=click.File('r'),
+    help='Read values from a file, one per line ("-" for stdin).'
+)
+@click.option(
+    '-o',
+    '--output',
+    'path',
+    default=os.path.join('tmp', 'participants_lookup.csv'),
+    show_default=True,
+    help='Output file (.csv, .tsv or .parquet).'
+)
+@click.option(
+    '--chunk-size',
+    default=10000,
+    show_default=True,
+    help='Number of values from --input to look up at a time.'
+)
 @click.argument('values', nargs=-1)  # Accept multiple values
-def lookup(index, center, values):
+def lookup(index, center, input_file, path, chunk_size, values):
     """Lookup participants by one of several indices for multiple values."""
+    from id_search import db, output, profiling, utils
+    from sqlalchemy.orm import Session
+    import pandas as pd
+
+    keys = _lookup_keys(index)
+    if input_file is not None:
+        _stream_lookup(keys, center, input_file, path, chunk_size)
+        return
 
     with Session(db.engine) as session:
-        keys = utils.lookups[index]
-        all_results = []
+        results = [utils.get_participants(value, keys, session, center)
+                   for value in values]
+        # Hydrate all matched participants at once
+        utils.load_participants([p.consortium_id
+                                 for result in results for p in result],
+                                session)
 
-        for value in values:
-            results = utils.get_participants(value, keys, session, center)
-            for result in results:
-                participant_data = utils.extract_participant_data(result)
+        all_results = []
+        for result in results:
+            for participant in result:
+                participant_data = utils.extract_participant_data(participant)
                 all_results.append(participant_data)
 
         if all_results:
             df = pd.DataFrame(all_results)
             print(df)
 
-            # Create a temporary directory in the current working directory
-            temp_dir = os.path.join(os.getcwd(), "tmp")
-            if not os.path.exists(temp_dir):
-                os.makedirs(temp_dir)
-
-            # Define the CSV file path
-            csv_file_path = os.path.join(temp_dir, "participants_lookup.csv")
-
-            # Write to CSV
-            df.to_csv(csv_file_path, index=False)
-            print(f"Results have been saved to {csv_file_path}")
+            with profiling.phase('output'), \
+                    output.TableWriter(path, types=utils.record_types()) as writer:
+                writer.write(df)
+            print(f"Results have been saved to {path}")
         else:
             print('No participants found')
 
 
+@cli.command(cls=LookupCommand)
+@click.option(
+    '-i',
+    '--index',
+    default='all',
+    show_default=True
+)
+@click.option(
+    '-c',
+    '--center',
+    help='Restrict search to a given center.'
+)
+@click.option(
+    '--input',
+    'input_file',
+    type=click.File('r'),
+    help='Read values from a file, one per line ("-" for stdin).'
+)
+@click.option(
+    '-o',
+    '--output',
+    'path',
+    default=os.path.join('tmp', 'expand.csv'),
+    show_default=True,
+    help='Output file (.csv, .tsv or .parquet).'
+)
+@click.option(
+    '--chunk-size',
+    default=100000,
+    show_default=True,
+    help='Number of values to expand at a time.'
+)
+@click.argument('values', nargs=-1)
+def expand(index, center, input_file, path, chunk_size, values):
+    """
+    List all identifiers linked to the participants matched by each value,
+    one (input, consortium_id, id_kind, id_value) row per identifier.
+    """
+    from id_search import db, output, profiling, utils
+    from sqlalchemy.orm import Session
+
+    keys = _lookup_keys(index)
+    chunks = (_read_chunks(input_file, chunk_size) if input_file is not None
+              else _read_chunks(values, chunk_size))
+    types = dict.fromkeys(['input', 'consortium_id', 'id_kind', 'id_value'],
+                          str)
+    count = matched = 0
+    with Session(db.engine) as session, \
+            output.TableWriter(path, types=types) as writer:
+        for chunk in chunks:
+            df = utils.expand(chunk, keys, session, center)
+            with profiling.phase('output'):
+                writer.write(df)
+            count += len(chunk)
+            matched += df['input'].nunique()
+
+    if writer.rows:
+        print(f'Expanded {matched} of {count} values to {writer.rows} '
+              f'identifiers, saved to {path}')
+    else:
+        print('No participants found')
+
+
+@cli.command()
+@click.option(
+    '--input',
+    'input_file',
+    type=click.File('r'),
+    help='Read family IDs from a file, one per line ("-" for stdin).'
+)
+@click.option(
+    '-o',
+    '--output',
+    'path',
+    default=os.path.join('tmp', 'family.csv'),
+    show_default=True,
+    help='Output file (.csv, .tsv or .parquet).'
+)
+@click.option(
+    '--chunk-size',
+    default=10000,
+    show_default=True,
+    help='Number of families to read at a time.'
+)
+@click.argument('family_ids', nargs=-1)
+def family(input_file, path, chunk_size, family_ids):
+    """
+    List every member of the given families, with parents as Consortium IDs
+    and their sample and genotyping IDs.
+    """
+    from id_search import db, families, output, profiling
+    from sqlalchemy.orm import Session
+
+    chunks = (_read_chunks(input_file, chunk_size) if input_file is not None
+              else _read_chunks(family_ids, chunk_size))
+    count = found = 0
+    with Session(db.engine) as session, \
+            output.TableWriter(path, types=families.record_types()) as writer:
+        for chunk in chunks:
+            df = families.family_members(chunk, session)
+            with profiling.phase('output'):
+                writer.write(df)
+            count += len(chunk)
+            found += df['family_id'].nunique()
+
+    if writer.rows:
+        print(f'Found {writer.rows} members of {found} of {count} families, '
+              f'saved to {path}')
+    else:
+        print('No families found')
+
+
+@cli.command(cls=LookupCommand)
+@click.option(
+    '-i',
+    '--index',
+    default='all',
+    show_default=True
+)
+@click.option(
+    '-c',
+    '--center',
+    help='Restrict search to a given center.'
+)
+@click.option(
+    '--depth',
+    default=1,
+    show_default=True,
+    help='Number of generations to walk up and down.'
+)
+@click.option(
+    '--input',
+    'input_file',
+    type=click.File('r'),
+    help='Read values from a file, one per line ("-" for stdin).'
+)
+@click.option(
+    '-o',
+    '--output',
+    'path',
+    default=os.path.join('tmp', 'relatives.csv'),
+    show_default=True,
+    help='Output file (.csv, .tsv or .parquet).'
+)
+@click.option(
+    '--chunk-size',
+    default=10000,
+    show_default=True,
+    help='Number of values to look up at a time.'
+)
+@click.argument('values', nargs=-1)
+def relatives(index, center, depth, input_file, path, chunk_size, values):
+    """
+    List the ancestors and descendants of the participants matched by each
+    value, with their generation relative to the participant.
+    """
+    from id_search import db, families, output, profiling
+    from sqlalchemy.orm import Session
+
+    keys = _lookup_keys(index)
+    chunks = (_read_chunks(input_file, chunk_size) if input_file is not None
+              else _read_chunks(values, chunk_size))
+    types = {'value': str, 'generation': int, **families.record_types()}
+    count = matched = 0
+    with Session(db.engine) as session, \
+            output.TableWriter(path, types=types) as writer:
+        for chunk in chunks:
+            df = families.relatives(chunk, keys, session, center, depth)
+            with profiling.phase('output'):
+                writer.write(df)
+            count += len(chunk)
+            matched += df['value'].nunique()
+
+    if writer.rows:
+        print(f'Found {writer.rows} relatives of {matched} of {count} values, '
+              f'saved to {path}')
+    else:
+        print('No participants found')
+
+
+@cli.command(cls=LookupCommand)
+@click.option(
+    '-i',
+    '--index',
+    default='all',
+    show_default=True
+)
+@click.option(
+    '-c',
+    '--center',
+    help='Restrict search to a given center.'
+)
+@click.option(
+    '-d',
+    '--max-distance',
+    default=2,
+    show_default=True,
+    help='Maximum number of edits of fuzzy matches.'
+)
+@click.option(
+    '-n',
+    '--limit',
+    default=20,
+    show_default=True,
+    help='Maximum number of matches.'
+)
+@click.argument('query')
+def search(index, center, max_distance, limit, query):
+    """
+    Find identifiers matching a truncated or mistyped QUERY, best first.
+    Needs the identifier index (see build-index).
+    """
+    from id_search import db, fuzzy
+    from sqlalchemy.orm import Session
+
+    with Session(db.engine) as session:
+        df = fuzzy.search(query, _lookup_keys(index), session, center,
+                          max_distance=max_distance, limit=limit)
+    if df.empty:
+        print('No matching identifiers found')
+    else:
+        print(df.to_string(index=False))
+
+
+@cli.command()
+@click.option(
+    '-i',
+    '--index',
+    'keys',
+    multiple=True,
+    help='Index of each column in --column, or one index for all columns.  '
+         '[default: all]'
+)
+@click.option(
+    '-k',
+    '--column',
+    'columns',
+    multiple=True,
+    help='Column of identifiers to query (repeatable). Defaults to all.'
+)
+@click.option(
+    '-c',
+    '--center',
+    help='Restrict search to a given center.'
+)
+@click.option(
+    '-w',
+    '--workers',
+    default=1,
+    show_default=True,
+    help='Number of worker processes.'
+)
+@click.option(
+    '-o',
+    '--output',
+    'path',
+    default=os.path.join('tmp', 'batch_query.csv'),
+    show_default=True,
+    help='Output file (.csv, .tsv or .parquet).'
+)
+@click.argument('manifest', type=click.Path(exists=True, dir_okay=False))
+def batch_query(keys, columns, center, workers, path, manifest):
+    """Add Consortium IDs to a CSV or TSV manifest of identifiers."""
+    from id_search import output, profiling, utils
+
+    with profiling.phase('read'):
+        df = _read_table(manifest)
+    columns = list(columns) or list(df.columns)
+    missing = [column for column in columns if column not in df.columns]
+    if missing:
+        raise click.BadParameter(
+            f'{", ".join(missing)} not found in {manifest}',
+            param_hint='--column'
+        )
+    keys = list(keys) or ['all']
+    for key in keys:
+        _lookup_keys(key)
+    if len(keys) == 1:
+        keys = keys[0]
+    elif len(keys) != len(columns):
+        raise click.BadParameter(
+            f'{len(keys)} indices given for {len(columns)} columns (give '
+            f'one per --column, or one for all)',
+            param_hint='--index'
+        )
+
+    df['consortium_id'] = utils.batch_query(df[columns], keys, center,
+                                            workers=workers)
+    with profiling.phase('output'), output.TableWriter(path) as writer:
+        writer.write(df)
+    print(f"Results have been saved to {path}")
+
+
+@cli.command()
+@click.option(
+    '-o',
+    '--output',
+    'path',
+    default=os.path.join('tmp', 'audit.csv'),
+    show_default=True,
+    help='Output file (.csv, .tsv or .parquet).'
+)
+def audit(path):
+    """
+    Report identifiers matching several participants, aliases that are also
+    primary IDs and dangling foreign keys. Exits with an error if any are
+    found. Identifiers unique per center that are shared across centers are
+    only reported as warnings.
+    """
+    from id_search import audit
+
+    counts = audit.audit(path)
+    for check, count in counts.items():
+        note = ' (warning)' if check in audit.WARNINGS else ''
+        print(f'{check}: {count} rows{note}')
+    conflicts = sum(count for check, count in counts.items()
+                    if check not in audit.WARNINGS)
+    if conflicts:
+        raise click.ClickException(f'{conflicts} conflicts found, see {path}')
+    print('No conflicts found')
+
+
+@cli.command()
+@click.option(
+    '-o',
+    '--output',
+    'path',
+    default=os.path.join('tmp', 'changes.jsonl'),
+    show_default=True,
+    help='Output JSON lines file.'
+)
+@click.argument('old', type=click.Path(exists=True, dir_okay=False))
+@click.argument('new', type=click.Path(exists=True, dir_okay=False))
+def diff(path, old, new):
+    """
+    List rows added, removed and changed from snapshot OLD to NEW, and
+    participants re-keyed to one of their aliases.
+    """
+    from id_search import diff
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    counts = diff.diff(old, new, path)
+    for (table, op), count in counts.items():
+        print(f'{table}: {count} {op}')
+    print(f'{sum(counts.values())} changes saved to {path}')
+
+
+def _report_conflicts(conflicts, count, dry_run, done):
+    """Print conflicts of a bulk change and abort, or print done."""
+
+    if not conflicts.empty:
+        print(conflicts.to_string(index=False, na_rep=''))
+        raise click.ClickException(
+            f'{len(conflicts)} of {count} rows conflict; nothing was changed'
+        )
+    print(f'No conflicts in {count} rows' if dry_run else done)
+
+
 @cli.command()
 @click.argument('consortium_id')
 @click.argument('alias')
 def add_alias(consortium_id, alias):
     """Add alias for existing registered participant."""
+    from id_search import utils
 
     utils.add_alias(consortium_id, alias)
 
 
 @cli.command()
-@click.argument('alias')
-def make_primary(alias):
+@click.option(
+    '--dry-run',
+    is_flag=True,
+    help='Only report conflicts.'
+)
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+def add_aliases(dry_run, path):
+    """
+    Add aliases listed in the consortium_id and alias columns of a CSV or TSV
+    file, in one transaction.
+    """
+    from id_search import utils
+
+    pairs = _read_table(path)
+    missing = {'consortium_id', 'alias'} - set(pairs.columns)
+    if missing:
+        raise click.UsageError(
+            f'{path} has no {" or ".join(sorted(missing))} column'
+        )
+    pairs = pairs[['consortium_id', 'alias']].dropna(how='all')
+    conflicts = utils.add_aliases(pairs, dry_run)
+    _report_conflicts(conflicts, len(pairs), dry_run,
+                      f'Added {len(pairs)} aliases')
+
+
+@cli.command()
+@click.option(
+    '-f',
+    '--file',
+    'input_file',
+    type=click.File('r'),
+    help='Read aliases from a file, one per line ("-" for stdin).'
+)
+@click.option(
+    '--dry-run',
+    is_flag=True,
+    help='Only report conflicts.'
+)
+@click.argument('alias', required=False)
+def make_primary(input_file, dry_run, alias):
     """Make alias the primary Consortium ID for that participant."""
+    from id_search import utils
+
+    if (alias is None) == (input_file is None):
+        raise click.UsageError('Give either ALIAS or --file')
+    if input_file is None:
+        aliases = [alias]
+    else:
+        aliases = [line.strip() for line in input_file if line.strip()]
 
-    utils.make_primary(alias)
+    conflicts = utils.make_primaries(aliases, dry_run)
+    _report_conflicts(conflicts, len(aliases), dry_run,
+                      f'Made {len(aliases)} aliases primary')
 
 
 if __name__ == '__main__':
@@ -1,10 +1,12 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy import (Column, String, Integer, Boolean, Date, ForeignKey,
-    ForeignKeyConstraint, UniqueConstraint, CheckConstraint)
+    ForeignKeyConstraint, UniqueConstraint, CheckConstraint, MetaData, Table,
+    Index)
 from sqlalchemy.orm import (DeclarativeBase, Mapped, relationship,
     composite, mapped_column)
-from id_search import config
+from id_search import config, ReadOnlyError
 from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
 from pathlib import Path
 from dataclasses import dataclass
 import os
@@ -12,12 +14,68 @@ import os
 CID_PATTERN = '[A-Z][0-9][0-9][0-9][0-9][0-9][0-9]-[0-9][0-9][0-9][0-9][0-9][0-9]'
 
 url = make_url(config['db-url'].get())
-if url.drivername=='sqlite' and url.database:
-    os.makedirs(Path(url.database).parent, exist_ok=True)
-engine = create_engine(url)
+is_sqlite_file = (url.drivername=='sqlite'
+                  and url.database not in (None, '', ':memory:'))
+# Open the database as an immutable, read-only snapshot
+snapshot = is_sqlite_file and config['snapshot']['enabled'].get(bool)
+
+def readonly_engine(immutable=None):
+    """
+    Return a new engine that opens the database read-only.
+
+    SQLite files are opened through a read-only URI with the pragmas from
+    the `snapshot` config. If immutable (default: snapshot mode is enabled),
+    SQLite also skips all locking and change detection, so the file must
+    not be modified while it is open.
+    """
+
+    if not is_sqlite_file:
+        return create_engine(url)
+
+    if immutable is None:
+        immutable = snapshot
+    path = Path(url.database).resolve()
+    params = 'mode=ro&immutable=1' if immutable else 'mode=ro'
+    opts = config['snapshot']
+    ro_engine = create_engine(f'sqlite:///file:{path}?{params}&uri=true',
+                              poolclass=QueuePool,
+                              pool_size=opts['pool-size'].get(int),
+                              max_overflow=opts['max-overflow'].get(int))
+    set_snapshot_pragmas(ro_engine)
+    return ro_engine
+
+def set_snapshot_pragmas(engine):
+    """Set the pragmas of the `snapshot` config on each new connection."""
+
+    opts = config['snapshot']
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f'PRAGMA mmap_size = {opts["mmap-size"].get(int)}')
+        cursor.execute(f'PRAGMA cache_size = {opts["cache-size"].get(int)}')
+        cursor.execute(f'PRAGMA temp_store = {opts["temp-store"].get(str)}')
+        cursor.close()
+
+if snapshot:
+    engine = readonly_engine()
+else:
+    if is_sqlite_file:
+        os.makedirs(Path(url.database).parent, exist_ok=True)
+    engine = create_engine(url)
+
+def check_writable():
+    """Raise ReadOnlyError if the database is opened as a snapshot."""
+
+    if snapshot:
+        raise ReadOnlyError(
+            'Database is opened as a read-only snapshot; disable snapshot '
+            'mode in config.yaml to modify it'
+        )
 
 def init_db():
 
+    check_writable()
     print("Initializing database...")
     Base.metadata.create_all(engine)
 
@@ -108,6 +166,9 @@ class RegisteredParticipant(Base):
         UniqueConstraint('center_id', 'local_id', name='local_id_idx'),
         UniqueConstraint('center_id', 'local_pedigree', 'local_individual',
                          name='ped_ind_idx'),
+        # Local pedigree and local ID lookups without a center
+        Index('ped_ind_lookup_idx', 'local_pedigree', 'local_individual'),
+        Index('local_id_lookup_idx', 'local_id'),
         CheckConstraint(f'consortium_id GLOB "{CID_PATTERN}"', name='cid'),
         CheckConstraint(f'spouse GLOB "{CID_PATTERN}"', name='sp'),
         CheckConstraint('(yob > 1900) AND (yob < 2050)'),
@@ -137,6 +198,8 @@ class Alias(Base):
 
     __table_args__ = (
         CheckConstraint(f'alias GLOB "{CID_PATTERN}"', name='cid'),
+        # Identifiers linked to a participant
+        Index('alias_cid_idx', 'consortium_id'),
     )
 
     def __repr__(self):
@@ -153,7 +216,8 @@ class RutgersLCL(Base):
 
     __table_args__ = (
         CheckConstraint(f'niddk_no GLOB "[0-9][0-9][0-9][0-9][0-9][0-9]"', name='niddk_no_chk'),
-        CheckConstraint(f'knumber GLOB "K[0-9][0-9][0-9][0-9][0-9]*"', name='knumber_chk')
+        CheckConstraint(f'knumber GLOB "K[0-9][0-9][0-9][0-9][0-9]*"', name='knumber_chk'),
+        Index('rutgers_lcl_cid_idx', 'consortium_id'),
     )
 
     def __repr__(self):
@@ -169,6 +233,10 @@ class DNASample(Base):
                            nullable=False)
     date_collected = Column(Date, nullable=True)
 
+    __table_args__ = (
+        Index('dna_sample_cid_idx', 'consortium_id'),
+    )
+
     def __repr__(self):
        return (f'DNASample(consortium_id={self.consortium_id}, '
                f'id={self.id}, date_collected={self.date_collected})')
@@ -184,6 +252,7 @@ class BloodSample(Base):
 
     __table_args__ = (
         CheckConstraint('sample_type IN ("Serum","Plasma")'),
+        Index('blood_sample_cid_idx', 'consortium_id'),
     )
 
     def __repr__(self):
@@ -200,6 +269,12 @@ class LocalDNASample(Base):
                            nullable=False)
     date_collected = Column(Date, nullable=True)
 
+    __table_args__ = (
+        # Center-restricted lookups
+        Index('local_dna_sample_center_idx', 'center_id', 'id'),
+        Index('local_dna_sample_cid_idx', 'consortium_id'),
+    )
+
     def __repr__(self):
        return (f'LocalDNASample(id={self.id}, center={self.participant.center.name}, '
                f'consortium_id={self.consortium_id}, '
@@ -216,7 +291,8 @@ class GenotypingResult(Base):
 
     __table_args__ = (
         CheckConstraint('project IN ("Immunochip","Exome Chip","GSA")', name='validate_proj'),
-        CheckConstraint(f'barcode GLOB "[0-9][0-9][0-9][0-9][0-9][0-9][0-9][0-9][0-9][0-9][0-9][0-9]_R[0-9][0-9]C[0-9][0-9]"', name='validate_code')
+        CheckConstraint(f'barcode GLOB "[0-9][0-9][0-9][0-9][0-9][0-9][0-9][0-9][0-9][0-9][0-9][0-9]_R[0-9][0-9]C[0-9][0-9]"', name='validate_code'),
+        Index('genotyping_result_cid_idx', 'consortium_id'),
     )
 
     def __repr__(self):
@@ -235,3 +311,23 @@ Base.metadata.info = {
                 LocalDNASample.id,
                 GenotypingResult.id]
 }
+
+# Denormalized identifier lookup table. It is derived from the lookup columns
+# above and kept out of Base.metadata, so that it only exists once built for a
+# database snapshot with `id-search build-index`.
+index_metadata = MetaData()
+identifier_index = Table(
+    'identifier_index', index_metadata,
+    Column('value', String, nullable=False),
+    # Lookup column the value was found in, e.g. "dna_sample.id"
+    Column('kind', String, nullable=False),
+    Column('center_id', Integer, nullable=True),
+    Column('consortium_id', String(14), nullable=False),
+    # Covering index, so lookups never touch the table itself
+    Index('identifier_value_idx', 'value', 'kind', 'center_id',
+          'consortium_id'),
+)
+# Trigram full-text index over the values of identifier_index, used by fuzzy
+# search. It is an SQLite FTS5 table reading its rows from identifier_index,
+# so it is created with raw DDL by `utils.build_index`.
+search_index = 'identifier_search'
@@ -0,0 +1,140 @@
+"""
+Change sets between two snapshots of the database.
+
+Both SQLite files are attached to one connection and each table is compared
+by primary key with anti-joins and a join on the key, which SQLite answers
+by walking the primary key indexes of both files. Changes are streamed to a
+JSON lines file, one object per change:
+
+    {"table": ..., "op": "add", "key": {...}, "row": {...}}
+    {"table": ..., "op": "remove", "key": {...}}
+    {"table": ..., "op": "change", "key": {...}, "changes": {col: [old, new]}}
+    {"table": "registered_participant", "op": "rekey", "old": ..., "new": ...}
+
+Applying the add, remove and change records of every table turns OLD into
+NEW. Rekey records list the participants whose primary Consortium ID became
+an alias (see `utils.make_primaries`), so that caches keyed by Consortium ID
+can be re-keyed instead of rebuilt.
+"""
+
+from id_search import db
+from sqlalchemy import MetaData, create_engine, select, and_, or_
+import json
+
+
+def _attached(schema):
+    """Return a copy of the schema's tables in an attached database."""
+
+    metadata = MetaData()
+    for table in db.Base.metadata.sorted_tables:
+        table.to_metadata(metadata, schema=schema)
+    return metadata
+
+
+def _key(table, row):
+    return {c.name: row[c.name] for c in table.primary_key.columns}
+
+
+def rekeys(old, new):
+    """
+    Select (old, new) Consortium IDs of participants whose primary ID in OLD
+    is an alias in NEW.
+    """
+
+    alias = new.tables['new.alias']
+    was = old.tables['old.registered_participant']
+    now = new.tables['new.registered_participant']
+    return (select(alias.c.alias.label('old'),
+                   alias.c.consortium_id.label('new'))
+            .join_from(alias, was, was.c.consortium_id == alias.c.alias)
+            .outerjoin(now, now.c.consortium_id == alias.c.alias)
+            .where(now.c.consortium_id.is_(None))
+            .order_by(alias.c.alias))
+
+
+def table_changes(conn, old_table, new_table, chunk_size=10000):
+    """Yield the add, remove and change records of one table."""
+
+    name = new_table.name
+    pk = [c.name for c in new_table.primary_key.columns]
+    on = and_(*[old_table.c[c] == new_table.c[c] for c in pk])
+    rows = conn.execution_options(yield_per=chunk_size)
+
+    removed = (select(*[old_table.c[c] for c in pk])
+               .outerjoin_from(old_table, new_table, on)
+               .where(new_table.c[pk[0]].is_(None))
+               .order_by(*[old_table.c[c] for c in pk]))
+    for row in rows.execute(removed).mappings():
+        yield {'table': name, 'op': 'remove', 'key': dict(row)}
+
+    added = (select(new_table)
+             .outerjoin_from(new_table, old_table, on)
+             .where(old_table.c[pk[0]].is_(None))
+             .order_by(*[new_table.c[c] for c in pk]))
+    for row in rows.execute(added).mappings():
+        yield {'table': name, 'op': 'add', 'key': _key(new_table, row),
+               'row': dict(row)}
+
+    # Rows present in both whose other columns differ, NULLs included
+    others = [c.name for c in new_table.columns if c.name not in pk]
+    if not others:
+        return
+    changed = (select(*[new_table.c[c] for c in pk],
+                      *[old_table.c[c].label(f'old_{c}') for c in others],
+                      *[new_table.c[c].label(f'new_{c}') for c in others])
+               .join_from(new_table, old_table, on)
+               .where(or_(*[old_table.c[c].is_not(new_table.c[c])
+                            for c in others]))
+               .order_by(*[new_table.c[c] for c in pk]))
+    for row in rows.execute(changed).mappings():
+        yield {
+            'table': name, 'op': 'change', 'key': _key(new_table, row),
+            'changes': {c: [row[f'old_{c}'], row[f'new_{c}']]
+                        for c in others
+                        if row[f'old_{c}'] != row[f'new_{c}']},
+        }
+
+
+def diff(old_path, new_path, path):
+    """
+    Write the changes from the database at old_path to the one at new_path
+    to a JSON lines file at path.
+
+    Returns the number of records per table and op.
+    """
+
+    engine = create_engine('sqlite://')
+    old, new = _attached('old'), _attached('new')
+    counts = {}
+    with engine.connect() as conn, open(path, 'w') as f:
+        conn.exec_driver_sql('ATTACH DATABASE ? AS old', (str(old_path),))
+        conn.exec_driver_sql('ATTACH DATABASE ? AS new', (str(new_path),))
+        for schema in ('old', 'new'):
+            tables = set(conn.exec_driver_sql(
+                f'SELECT name FROM {schema}.sqlite_master '
+                f"WHERE type = 'table'"
+            ).scalars())
+            missing = set(db.Base.metadata.tables) - tables
+            if missing:
+                raise Exception(
+                    f'Tables missing from {schema.upper()} database: '
+                    f'{", ".join(sorted(missing))}'
+                )
+
+        def records():
+            for row in conn.execute(rekeys(old, new)):
+                yield {'table': 'registered_participant', 'op': 'rekey',
+                       'old': row.old, 'new': row.new}
+            for table in db.Base.metadata.sorted_tables:
+                yield from table_changes(
+                    conn, old.tables[f'old.{table.name}'],
+                    new.tables[f'new.{table.name}']
+                )
+
+        for record in records():
+            # Dates are written in ISO format
+            f.write(json.dumps(record, default=str) + '\n')
+            key = (record['table'], record['op'])
+            counts[key] = counts.get(key, 0) + 1
+    engine.dispose()
+    return counts
@@ -0,0 +1,125 @@
+"""
+Export of the full, denormalized participant table.
+
+Participants are streamed in primary key order through a server-side cursor,
+chunk_size at a time. The identifiers of each chunk's child collections are
+read with one query over the consortium_id indexes, for the range of
+Consortium IDs in the chunk (and its center, if exporting one center), so
+memory use is bounded by the chunk size whatever the size of the database.
+"""
+
+from id_search import db, output, profiling, utils
+from sqlalchemy import select, union_all, literal
+from sqlalchemy.inspection import inspect
+from sqlalchemy.orm import Session
+import pandas as pd
+
+
+def participants(names, center_id=None):
+    """
+    Select the participant columns among names, with the center's name, in
+    primary key order.
+    """
+
+    p = db.RegisteredParticipant.__table__
+    center = db.Center.__table__
+    selected = {attr.key: attr.columns[0].label(attr.key)
+                for attr in inspect(db.RegisteredParticipant).column_attrs}
+    selected['center'] = center.c.name.label('center')
+    columns = [selected[name] for name in names if name in selected]
+    if 'consortium_id' not in names:
+        # Needed to read the child collections
+        columns.insert(0, p.c.consortium_id)
+    stmt = (select(*columns)
+            .join_from(p, center, center.c.id == p.c.center_id)
+            .order_by(p.c.consortium_id))
+    if center_id is not None:
+        stmt = stmt.where(p.c.center_id == center_id)
+    return stmt
+
+
+def collections(names, lo, hi, center_id=None):
+    """
+    Select (consortium_id, collection, id) rows of the child collections
+    among names, for participants with a Consortium ID from lo to hi, and of
+    the given center if any.
+    """
+
+    p = db.RegisteredParticipant.__table__
+    relationships = inspect(db.RegisteredParticipant).relationships
+    selects = []
+    for name in names:
+        table = relationships[name].mapper.local_table
+        key = table.c[utils.COLLECTION_IDS[name]]
+        stmt = (select(table.c.consortium_id, literal(name), key)
+                .where(table.c.consortium_id.between(lo, hi)))
+        if center_id is not None:
+            # Rows of other centers' participants in the range are skipped
+            # in SQL, so only the chunk's rows are read into memory
+            stmt = (stmt.join_from(table, p,
+                                   p.c.consortium_id == table.c.consortium_id)
+                    .where(p.c.center_id == center_id))
+        selects.append(stmt)
+    return union_all(*selects)
+
+
+def export(path, names=None, center=None, chunk_size=100000, engine=None):
+    """
+    Write one row per participant to path (Parquet, Arrow IPC, CSV or TSV,
+    optionally gzip-compressed), chunk_size participants at a time.
+
+    Parameters
+    ----------
+    path : str
+        Output file, see `output.TableWriter`.
+    names : list of str, optional
+        Columns to export, among those of `utils.record_types`. Defaults
+        to all.
+    center : str, optional
+        Only export the participants of this center.
+    chunk_size : int, default 100000
+        Number of participants read and written at a time.
+    engine : Engine, optional
+        Defaults to `db.engine`.
+
+    Returns
+    -------
+    int
+        Number of participants written.
+    """
+
+    types = utils.record_types()
+    names = list(names or types)
+    unknown = [name for name in names if name not in types]
+    if unknown:
+        raise Exception(f'Unknown column(s): {", ".join(unknown)}. Choose '
+                        f'from {", ".join(types)}')
+    listed = [name for name in names if name in utils.COLLECTION_IDS]
+
+    engine = engine or db.engine
+    with Session(engine) as session, output.TableWriter(
+            path, types={name: types[name] for name in names}) as writer:
+        center_id = utils.get_center_id(session, center)
+        conn = session.connection()
+        result = conn.execution_options(yield_per=chunk_size).execute(
+            participants(names, center_id)
+        )
+        for rows in result.partitions():
+            with profiling.phase('query'):
+                chunk = pd.DataFrame(rows, columns=result.keys(), dtype=object)
+                cids = chunk['consortium_id']
+                ids = {}
+                if listed:
+                    linked = conn.execute(collections(
+                        listed, cids.iloc[0], cids.iloc[-1], center_id
+                    )).all()
+                    for cid, name, value in linked:
+                        ids.setdefault((name, cid), []).append(value)
+                for name in listed:
+                    chunk[name] = [ids.get((name, cid), []) for cid in cids]
+            with profiling.phase('output'):
+                writer.write(chunk[names])
+        if not writer.rows:
+            # Write the header (or schema) even if no participant matched
+            writer.write(pd.DataFrame(columns=names, dtype=object))
+    return writer.rows
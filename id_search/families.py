@@ -0,0 +1,199 @@
+"""
+Family and pedigree queries.
+
+Parents are stored as the individual IDs of the father and mother within
+the participant's family (family_id), and spouses as Consortium IDs. Whole
+families are read through the family index (family_id, individual_id), and
+ancestors and descendants are walked with one recursive query per batch.
+"""
+
+from id_search import db, utils
+from sqlalchemy import select, and_, or_, literal, Integer
+from sqlalchemy.inspection import inspect
+import pandas as pd
+
+# Participant columns of family records, after family_id and individual_id
+MEMBER_COLUMNS = ['consortium_id', 'center', 'father', 'mother', 'spouse',
+                  'sex', 'affection', 'diag']
+
+
+def _collection_kinds():
+    """Return the lookup kind of each child collection in COLLECTION_IDS."""
+
+    relationships = inspect(db.RegisteredParticipant).relationships
+    return {
+        name: f'{relationships[name].mapper.local_table.name}.{key}'
+        for name, key in utils.COLLECTION_IDS.items()
+    }
+
+
+def record_types():
+    """Return the Python type of each column of a family record."""
+
+    types = dict.fromkeys(['family_id', *MEMBER_COLUMNS], str)
+    types['individual_id'] = int
+    types.update(dict.fromkeys(utils.COLLECTION_IDS, list[str]))
+    return types
+
+
+def _members(members):
+    """
+    Select family records of the participants in the members selectable,
+    which has a consortium_id column, with parents resolved to Consortium
+    IDs.
+    """
+
+    p = db.RegisteredParticipant.__table__
+    center = db.Center.__table__
+    father, mother = p.alias('father'), p.alias('mother')
+    return (
+        select(p.c.family_id, p.c.individual_id, p.c.consortium_id,
+               center.c.name.label('center'),
+               father.c.consortium_id.label('father'),
+               mother.c.consortium_id.label('mother'),
+               p.c.spouse, p.c.sex, p.c.affection, p.c.diag)
+        .join_from(members, p, p.c.consortium_id == members.c.consortium_id)
+        .join(center, center.c.id == p.c.center_id)
+        .outerjoin(father, and_(father.c.family_id == p.c.family_id,
+                                father.c.individual_id == p.c.father))
+        .outerjoin(mother, and_(mother.c.family_id == p.c.family_id,
+                                mother.c.individual_id == p.c.mother))
+    )
+
+
+def _with_collections(records, session):
+    """Add the identifiers of each record's child collections as lists."""
+
+    cids = records['consortium_id'].drop_duplicates()
+    linked = utils.linked_identifiers(cids, session)
+    # Grouped in one pass over the rows, faster than a groupby of lists
+    lists = {}
+    for cid, kind, value in linked.itertuples(index=False, name=None):
+        lists.setdefault((kind, cid), []).append(value)
+    for name, kind in _collection_kinds().items():
+        records[name] = [lists.get((kind, cid), [])
+                         for cid in records['consortium_id']]
+    return records
+
+
+def family_members(family_ids, session):
+    """
+    Return every member of the given families, in a fixed number of queries
+    per chunk of CHUNK_SIZE families.
+
+    Parameters
+    ----------
+    family_ids : list-like of str
+    session : Session
+
+    Returns
+    -------
+    DataFrame
+        One record per member, ordered by family and individual, with the
+        columns of `record_types`. Parents are given by Consortium ID, and
+        child collections as lists of their identifiers.
+    """
+
+    p = db.RegisteredParticipant.__table__
+    family_ids = list(dict.fromkeys(str(f).strip() for f in family_ids))
+    found = []
+    for i in range(0, len(family_ids), utils.CHUNK_SIZE):
+        members = (select(p.c.consortium_id)
+                   .where(p.c.family_id.in_(
+                       family_ids[i:i + utils.CHUNK_SIZE]
+                   )).subquery())
+        found += session.execute(_members(members)).all()
+
+    columns = ['family_id', 'individual_id', *MEMBER_COLUMNS]
+    records = pd.DataFrame(found, columns=columns, dtype=object)
+    order = {f: i for i, f in enumerate(family_ids)}
+    records = (records.assign(position=records['family_id'].map(order))
+               .sort_values(['position', 'individual_id'], kind='stable')
+               .drop(columns='position').reset_index(drop=True))
+    return _with_collections(records, session)
+
+
+def relatives(values, keys, session, center=None, depth=1):
+    """
+    Return the ancestors and descendants of the participants matched by a
+    batch of identifiers, up to depth generations away, with one recursive
+    query per batch.
+
+    Parameters
+    ----------
+    values : list-like of str
+        Identifiers to look up.
+    keys : list of (table, column)
+        Lookup key(s) as found in `utils.lookups`.
+    session : Session
+    center : str, optional
+        Restrict the lookup of values to a single center.
+    depth : int, default 1
+        Number of generations to walk up and down, e.g. 1 for parents and
+        children, 2 to add grandparents and grandchildren.
+
+    Returns
+    -------
+    DataFrame
+        The matched value, the relative's generation (negative for
+        ancestors, 0 for the participant itself, positive for descendants)
+        and the relative's family record (see `family_members`), in input
+        order.
+    """
+
+    values = list(dict.fromkeys(values))
+    found = utils.resolve(values, keys, session, center)
+    cids = found['consortium_id'].drop_duplicates().tolist()
+
+    p = db.RegisteredParticipant.__table__
+    probe = utils.participant_probe
+    conn = session.connection()
+    probe.create(conn, checkfirst=True)
+    conn.execute(probe.delete())
+    if cids:
+        conn.execute(probe.insert(), [{'consortium_id': c} for c in cids])
+
+    # Each step moves one generation up from ancestors or down from
+    # descendants, within the family
+    walk = (select(p.c.consortium_id.label('start'), p.c.consortium_id,
+                   p.c.family_id, p.c.individual_id, p.c.father, p.c.mother,
+                   literal(0, Integer).label('generation'))
+            .join_from(probe, p, p.c.consortium_id == probe.c.consortium_id)
+            .where(p.c.family_id.is_not(None))
+            .cte('walk', recursive=True))
+    parent, child = p.alias('parent'), p.alias('child')
+    walk = walk.union(
+        select(walk.c.start, parent.c.consortium_id, parent.c.family_id,
+               parent.c.individual_id, parent.c.father, parent.c.mother,
+               walk.c.generation - 1)
+        .join_from(walk, parent, and_(
+            parent.c.family_id == walk.c.family_id,
+            parent.c.individual_id.in_([walk.c.father, walk.c.mother]),
+        ))
+        .where(walk.c.generation <= 0, walk.c.generation > -depth),
+        select(walk.c.start, child.c.consortium_id, child.c.family_id,
+               child.c.individual_id, child.c.father, child.c.mother,
+               walk.c.generation + 1)
+        .join_from(walk, child, and_(
+            child.c.family_id == walk.c.family_id,
+            or_(child.c.father == walk.c.individual_id,
+                child.c.mother == walk.c.individual_id),
+        ))
+        .where(walk.c.generation >= 0, walk.c.generation < depth),
+    )
+    stmt = _members(walk).add_columns(walk.c.start, walk.c.generation)
+    columns = ['family_id', 'individual_id', *MEMBER_COLUMNS, 'start',
+               'generation']
+    walked = pd.DataFrame(conn.execute(stmt).all(), columns=columns,
+                          dtype=object)
+    conn.execute(probe.delete())
+
+    order = {v: i for i, v in enumerate(values)}
+    records = (found.merge(walked, left_on='consortium_id', right_on='start',
+                           suffixes=('_start', ''))
+               .assign(position=lambda df: df['value'].map(order))
+               .sort_values(['position', 'start', 'generation',
+                             'individual_id'], kind='stable'))
+    records = records[['value', 'generation', 'family_id', 'individual_id',
+                       *MEMBER_COLUMNS]].reset_index(drop=True)
+    return _with_collections(records, session)
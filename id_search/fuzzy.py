@@ -0,0 +1,122 @@
+"""
+Fuzzy and prefix identifier search.
+
+Searches read the identifier index and its trigram search index (see
+`utils.build_index`), and rank candidates by how they match the query and
+their edit distance to it.
+"""
+
+from id_search import IndexNotBuilt, db, identifiers, utils
+from sqlalchemy import select, literal_column
+import numpy as np
+import pandas as pd
+
+# Order of search matches, best first
+MATCHES = ['exact', 'prefix', 'substring', 'fuzzy']
+# Trigram index matches read per search candidate, before filtering by kind
+# and center
+SEARCH_SCAN = 10
+
+
+def _pieces(query, count):
+    """Split query into count pieces of at least 3 characters, or fewer."""
+
+    count = min(count, len(query) // 3)
+    size = len(query) // count if count else 0
+    return [query[i*size:(i + 1)*size if i < count - 1 else None]
+            for i in range(count)]
+
+
+def search(query, keys, session, center=None, max_distance=2, limit=20,
+           candidates=100):
+    """
+    Find identifiers similar to a possibly mistyped or truncated query,
+    using the identifier index (see `utils.build_index`).
+
+    Candidates are identifiers next to the query in sorted order, which
+    catches truncation and typos near the end, and identifiers sharing an
+    exact piece of the query in the trigram index. With at most
+    max_distance edits, one of max_distance + 1 pieces is left intact.
+    Each query reads a bounded number of rows.
+
+    Parameters
+    ----------
+    query : str
+    keys : list of (table, column)
+        Lookup key(s) as found in `utils.lookups`.
+    session : Session
+    center : str, optional
+        Restrict the search to a single center.
+    max_distance : int, default 2
+        Maximum edit distance (see `identifiers.edit_distance`) of fuzzy
+        matches.
+    limit : int, default 20
+        Maximum number of matches returned.
+    candidates : int, default 100
+        Number of candidates read per query.
+
+    Returns
+    -------
+    DataFrame
+        value, kind and consortium_id of the matches, with how they match
+        (one of MATCHES) and their edit distance to the query, best first.
+    """
+
+    columns = ['value', 'kind', 'consortium_id', 'match', 'distance']
+    engine = session.get_bind()
+    if not utils.has_index(engine):
+        raise IndexNotBuilt('Search needs the identifier index; run '
+                            '`id-search build-index` first')
+    center_id = utils.get_center_id(session, center)
+    query = query.strip()
+    idx = db.identifier_index
+
+    fields = [idx.c.value, idx.c.kind, idx.c.consortium_id]
+    kinds = [utils.kind_name(table, column) for table, column in keys]
+    stmt = select(*fields).where(idx.c.kind.in_(kinds)).limit(candidates)
+    if center_id is not None:
+        stmt = stmt.where(idx.c.center_id == center_id)
+
+    found = []
+    for neighbours in [
+        stmt.where(idx.c.value >= query).order_by(idx.c.value),
+        stmt.where(idx.c.value < query).order_by(idx.c.value.desc()),
+    ]:
+        found += session.execute(neighbours).all()
+    if utils.has_search_index(engine):
+        fts = utils.search_index
+        for piece in _pieces(query, max_distance + 1):
+            phrase = '"' + piece.replace('"', '""') + '"'
+            # Bound the rows read for pieces common to many identifiers
+            matched = (select(fts.c.rowid)
+                       .where(fts.c[fts.name].op('MATCH')(phrase))
+                       .limit(candidates * SEARCH_SCAN).subquery())
+            found += session.execute(stmt.join_from(
+                idx, matched,
+                literal_column(f'{idx.name}.rowid') == matched.c.rowid
+            )).all()
+
+    found = pd.DataFrame(found, columns=[c.name for c in fields],
+                         dtype=object).drop_duplicates()
+
+    folded = query.casefold()
+    values = found['value'].str.casefold()
+    # Identifiers containing the query are that many insertions away, others
+    # are only compared if their length is close enough
+    contains = values.str.contains(folded, regex=False).to_numpy(bool)
+    distance = np.array([
+        len(value) - len(folded) if contained
+        else identifiers.edit_distance(folded, value, max_distance)
+        if abs(len(value) - len(folded)) <= max_distance
+        else max_distance + 1
+        for value, contained in zip(values, contains)
+    ], dtype=int)
+    found = found.assign(distance=distance, match=np.select(
+        [values == folded, values.str.startswith(folded), contains,
+         distance <= max_distance],
+        MATCHES, default=''
+    ))
+    found = found[found['match'] != ''].assign(
+        rank=lambda df: df['match'].map(MATCHES.index)
+    ).sort_values(['rank', 'distance', 'value', 'kind'])
+    return found[columns].head(limit).reset_index(drop=True)
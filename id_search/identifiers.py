@@ -0,0 +1,117 @@
+"""Parsing and normalization of identifiers, free of database dependencies"""
+
+import pandas as pd
+import re
+
+# Separators accepted between pedigree and individual, e.g. "1234-5"
+PEDIGREE_SEP = re.compile(r'\s*,\s*|\s*-\s*|\s*\.\s*|\s+')
+# Value type of composite (pedigree, individual) lookup columns
+PEDIGREE = 'pedigree'
+# Names of value types, as stored in exported files
+TYPE_NAMES = {str: 'str', int: 'int', PEDIGREE: PEDIGREE}
+
+
+def _individual(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return value
+
+
+def split_pedigree(value):
+    """Split a pedigree identifier into (pedigree, individual), if possible."""
+
+    if not isinstance(value, str):
+        return None
+    tokens = PEDIGREE_SEP.split(value, maxsplit=1)
+    if len(tokens) < 2:
+        return None
+
+    pedigree, individual = tokens
+    return pedigree, _individual(individual)
+
+
+def split_pedigrees(values):
+    """
+    Split a list-like of pedigree identifiers in one pass.
+
+    Returns a DataFrame of pedigree and individual columns, as returned by
+    `split_pedigree`, or None for values that cannot be split.
+    """
+
+    values = pd.Series(values, dtype=object).reset_index(drop=True)
+    text = values.where(values.map(lambda v: isinstance(v, str)))
+    parts = (text.str.split(PEDIGREE_SEP, n=1, expand=True)
+             .reindex(columns=[0, 1]).astype(object))
+    ok = parts[1].notna()
+    pairs = pd.DataFrame({'pedigree': None, 'individual': None},
+                         index=values.index, dtype=object)
+    pairs.loc[ok, 'pedigree'] = parts.loc[ok, 0]
+    pairs.loc[ok, 'individual'] = parts.loc[ok, 1].map(_individual)
+    return pairs
+
+
+def coerce(value, vtype):
+    """
+    Coerce an identifier to vtype, the Python type stored in its lookup
+    column, so that values read back from the database can be matched to the
+    input. Pedigree identifiers become (pedigree, individual) tuples, or None
+    if unparseable.
+    """
+
+    if vtype == PEDIGREE:
+        return split_pedigree(value)
+    try:
+        return vtype(value)
+    except (TypeError, ValueError):
+        return value
+
+
+def normalize(value, vtype):
+    """Normalize an identifier to its text form, e.g. "<pedigree>-<ind>"."""
+
+    v = coerce(value, vtype)
+    if isinstance(v, tuple):
+        return f'{v[0]}-{v[1]}'
+    return None if v is None else str(v)
+
+
+def normalize_all(values, vtype):
+    """
+    Normalize a list-like of identifiers to a Series of their text forms,
+    splitting pedigree identifiers in one pass.
+    """
+
+    if vtype != PEDIGREE:
+        return pd.Series([normalize(v, vtype) for v in values], dtype=object)
+    pairs = split_pedigrees(values)
+    ok = pairs['pedigree'].notna()
+    text = (pairs.loc[ok, 'pedigree'] + '-'
+            + pairs.loc[ok, 'individual'].map(str))
+    return text.reindex(pairs.index).astype(object).where(ok, None)
+
+
+def edit_distance(a, b, limit=None):
+    """
+    Return the number of single-character insertions, deletions,
+    substitutions and transpositions of adjacent characters turning a into
+    b (optimal string alignment distance).
+
+    If limit is given, stop early and return limit + 1 once the distance is
+    known to exceed it.
+    """
+
+    before, previous = None, list(range(len(b) + 1))
+    for i, x in enumerate(a, 1):
+        current = [i] + [0]*len(b)
+        for j, y in enumerate(b, 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1,
+                             previous[j - 1] + (x != y))
+            if i > 1 and j > 1 and x == b[j - 2] and a[i - 2] == y:
+                current[j] = min(current[j], before[j - 2] + 1)
+        if limit is not None and min(current) > limit:
+            return limit + 1
+        before, previous = previous, current
+    if limit is not None:
+        return min(previous[-1], limit + 1)
+    return previous[-1]
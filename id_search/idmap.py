@@ -0,0 +1,295 @@
+"""
+Memory-mapped identifier map, for resolving identifiers without SQLite.
+
+An ID map file holds every (identifier, kind) -> Consortium ID mapping of a
+database snapshot in a fixed binary layout:
+
+    magic        8 bytes, b'IDMAP01\\n'
+    header size  uint64, little-endian
+    header       JSON, see `export_idmap`
+    keys         count x S<key_width>, sorted; a kind byte followed by the
+                 normalized identifier
+    cids         count x uint32, index of each key's Consortium ID in heap
+    centers      count x uint16, center id of each key
+    heap         cid_count x S14, Consortium IDs
+
+Each section starts on an 8-byte boundary. Readers only need NumPy, so many
+processes can map the same file and share the OS page cache.
+"""
+
+from id_search import CenterNotFound, identifiers
+import numpy as np
+import pandas as pd
+import json
+import mmap
+import struct
+
+MAGIC = b'IDMAP01\n'
+ALIGN = 8
+CID_WIDTH = 14
+
+
+def _pad(n):
+    """Return the number of bytes needed to align offset n."""
+
+    return -n % ALIGN
+
+
+def read_identifiers(engine=None):
+    """
+    Read every identifier in the database into the sections of an ID map.
+
+    Returns
+    -------
+    header : dict
+        Header of an ID map file, see `export_idmap`.
+    sections : dict
+        keys (sorted), cids, centers and heap arrays, laid out as in an ID
+        map file.
+    """
+
+    # Imported here so that readers do not depend on SQLAlchemy
+    from id_search import db, utils
+    from sqlalchemy import select
+
+    engine = engine or db.engine
+    kinds = [utils.kind_name(table, column)
+             for table, column in utils.lookups['all']]
+    types = {utils.kind_name(table, column):
+             identifiers.TYPE_NAMES[utils.value_type(column)]
+             for table, column in utils.lookups['all']}
+    codes = {kind: bytes([i + 1]) for i, kind in enumerate(kinds)}
+
+    keys, cids, centers = [], [], []
+    ordinals = {}
+    with engine.connect() as conn:
+        center_ids = dict(
+            conn.execute(select(db.Center.name, db.Center.id)).all()
+        )
+        for stmt in utils.identifier_selects():
+            for value, kind, center_id, cid in conn.execute(stmt):
+                keys.append(codes[kind] + value.encode())
+                cids.append(ordinals.setdefault(cid, len(ordinals)))
+                centers.append(center_id or 0)
+
+    keys = np.array(keys, dtype=bytes)
+    order = np.argsort(keys, kind='stable')
+    sections = {
+        'keys': keys[order],
+        'cids': np.array(cids, dtype='<u4')[order],
+        'centers': np.array(centers, dtype='<u2')[order],
+        'heap': np.array(list(ordinals), dtype=f'S{CID_WIDTH}'),
+    }
+    header = {
+        'count': len(keys),
+        'key_width': keys.dtype.itemsize,
+        'cid_count': len(ordinals),
+        'kinds': kinds,
+        'types': types,
+        'lookups': {key: [utils.kind_name(table, column)
+                          for table, column in pairs]
+                    for key, pairs in utils.lookups.items()},
+        'centers': center_ids,
+    }
+    return header, sections
+
+
+def export_idmap(path, engine=None):
+    """Write every identifier in the database to an ID map file at path."""
+
+    print("Exporting ID map...")
+    header, sections = read_identifiers(engine)
+    data = json.dumps(header).encode()
+
+    with open(path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<Q', len(data)))
+        f.write(data + b'\0' * _pad(len(MAGIC) + 8 + len(data)))
+        for name in ('keys', 'cids', 'centers', 'heap'):
+            data = sections[name].tobytes()
+            f.write(data + b'\0' * _pad(len(data)))
+    print(f"Exported {header['count']} identifiers to {path}")
+
+
+class IDMap:
+    """
+    Read-only view of an ID map file.
+
+    Parameters
+    ----------
+    path : str
+        Path to a file written by `export_idmap`.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise Exception(f'"{path}" is not an ID map file')
+        size, = struct.unpack_from('<Q', self._mmap, len(MAGIC))
+        offset = len(MAGIC) + 8
+        header = json.loads(self._mmap[offset:offset + size])
+        offset += size + _pad(offset + size)
+
+        n = header['count']
+        sections = {}
+        for name, dtype, count in [('keys', f'S{header["key_width"]}', n),
+                                   ('cids', '<u4', n),
+                                   ('centers', '<u2', n),
+                                   ('heap', f'S{CID_WIDTH}',
+                                    header['cid_count'])]:
+            sections[name] = np.frombuffer(self._mmap, dtype=dtype,
+                                           count=count, offset=offset)
+            nbytes = sections[name].nbytes
+            offset += nbytes + _pad(nbytes)
+        self._load(header, sections)
+
+    @classmethod
+    def from_sections(cls, header, sections):
+        """
+        Return an ID map held in memory rather than mapped from a file, e.g.
+        from `read_identifiers`.
+        """
+
+        idmap = cls.__new__(cls)
+        idmap._mmap = None
+        idmap._load(header, sections)
+        return idmap
+
+    def _load(self, header, sections):
+        self.kinds = header['kinds']
+        self.types = {kind: {'str': str, 'int': int}.get(name, name)
+                      for kind, name in header['types'].items()}
+        self.lookups = header['lookups']
+        self.centers = header['centers']
+        self._codes = {kind: bytes([i + 1])
+                       for i, kind in enumerate(self.kinds)}
+        self._width = header['key_width']
+        self._keys = sections['keys']
+        self._cids = sections['cids']
+        self._centers = sections['centers']
+        self._heap = sections['heap']
+
+    def __len__(self):
+        return len(self._keys)
+
+    def probe(self, values, kinds, center=None):
+        """
+        Match values (a sequence) against the identifiers of the given
+        kinds, optionally within center, with one binary search of all
+        (kind, value) pairs.
+
+        Returns
+        -------
+        positions, kinds, ordinals : ndarray
+            Position in values, position in kinds and Consortium ID ordinal
+            (see `consortium_ids`) of each match.
+        """
+
+        if center is not None and center not in self.centers:
+            raise CenterNotFound(f'Center "{center}" not found')
+        center_id = self.centers.get(center)
+        normalized = {}
+        probes, positions, found = [], [], []
+        for k, kind in enumerate(kinds):
+            vtype = self.types[kind]
+            # Kinds of one type share the normalized values
+            if vtype not in normalized:
+                normalized[vtype] = [
+                    None if v is None else identifiers.normalize(v, vtype)
+                    for v in values
+                ]
+            code = self._codes[kind]
+            for pos, v in enumerate(normalized[vtype]):
+                if v is None:
+                    continue
+                key = code + v.encode()
+                # Keys longer than the widest stored key cannot match
+                if len(key) <= self._width:
+                    probes.append(key)
+                    positions.append(pos)
+                    found.append(k)
+        if not probes:
+            return (np.array([], dtype=int), np.array([], dtype=int),
+                    np.array([], dtype='<u4'))
+
+        probes = np.array(probes, dtype=f'S{self._width}')
+        lo = np.searchsorted(self._keys, probes, side='left')
+        hi = np.searchsorted(self._keys, probes, side='right')
+        counts = hi - lo
+        # Expand each [lo, hi) range into record indices
+        records = (np.repeat(lo - np.cumsum(counts) + counts, counts)
+                   + np.arange(counts.sum()))
+        positions = np.repeat(np.array(positions, dtype=int), counts)
+        found = np.repeat(np.array(found, dtype=int), counts)
+        if center is not None:
+            keep = self._centers[records] == center_id
+            positions, found, records = (positions[keep], found[keep],
+                                         records[keep])
+        return positions, found, self._cids[records]
+
+    def consortium_ids(self, ordinals):
+        """Return the Consortium IDs of ordinals, as an array of str."""
+
+        return self._heap[ordinals].astype(str).astype(object)
+
+    def lookup(self, value, key='all', center=None):
+        """Return sorted Consortium IDs for a single identifier."""
+
+        _, _, ordinals = self.probe([value], self.lookups[key], center)
+        return sorted(set(self.consortium_ids(ordinals)))
+
+    def batch_query(self, values, keys=None, center=None):
+        """
+        Query Consortium IDs based on a series or data frame of identifiers.
+
+        Same as `utils.batch_query`, resolved from the ID map.
+        """
+
+        values = pd.DataFrame(values).fillna('')
+        if keys is None:
+            keys = 'all'
+        if isinstance(keys, str):
+            keys = [keys]*values.shape[1]
+        if len(keys) != values.shape[1]:
+            raise Exception(
+                'Number of keys does not match number of columns in values'
+            )
+
+        rows, ordinals = [], []
+        for column, key in zip(values.columns, keys):
+            cells = values[column].astype(object)
+            distinct, inverse = np.unique(cells.astype(str).to_numpy(),
+                                          return_inverse=True)
+            # Map each distinct value back to an original (untyped) cell
+            first = np.zeros(len(distinct), dtype=int)
+            first[inverse[::-1]] = np.arange(len(cells))[::-1]
+            samples = [cells.iat[i] for i in first]
+            samples = [None if v == '' else v for v in samples]
+            pos, _, ords = self.probe(samples, self.lookups[key], center)
+
+            # Expand matches on distinct values to every row holding them
+            order = np.argsort(inverse, kind='stable')
+            starts = np.searchsorted(inverse[order], pos, side='left')
+            ends = np.searchsorted(inverse[order], pos, side='right')
+            counts = ends - starts
+            idx = (np.repeat(starts - np.cumsum(counts) + counts, counts)
+                   + np.arange(counts.sum()))
+            rows.append(order[idx])
+            ordinals.append(np.repeat(ords, counts))
+
+        pairs = np.unique(np.stack([np.concatenate(rows),
+                                    np.concatenate(ordinals)]), axis=1)
+        result = np.full(len(values), None, dtype=object)
+        if pairs.size:
+            row_ids, starts, counts = np.unique(pairs[0], return_index=True,
+                                                return_counts=True)
+            cids = self.consortium_ids(pairs[1])
+            single = counts == 1
+            result[row_ids[single]] = cids[starts[single]]
+            for row, start, count in zip(row_ids[~single], starts[~single],
+                                         counts[~single]):
+                result[row] = sorted(cids[start:start + count])
+
+        return pd.Series(result, index=values.index)
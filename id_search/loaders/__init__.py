@@ -0,0 +1,316 @@
+"""
+Loaders filling the database from source files.
+
+Each module of this package defines Loader subclasses, one per table, which
+`id_search.get_loaders` discovers. `load` parses and validates the source
+files of all loaders, in parallel if asked to, and bulk inserts the records
+in order of PRIORITY.
+"""
+
+from id_search import config, db
+from sqlalchemy import CheckConstraint, Integer, create_engine, delete, event
+from sqlalchemy import insert
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.exc import IntegrityError
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import datetime
+import os
+import pandas as pd
+import sqlite3
+
+# Pragmas for bulk loading into SQLite, trading durability for speed. A
+# load interrupted by a crash may leave the database corrupt, so rebuild it
+# from scratch in that case.
+BULK_PRAGMAS = {
+    'synchronous': 'OFF',
+    'journal_mode': 'MEMORY',
+    'temp_store': 'MEMORY',
+    'cache_size': -262144,
+}
+TRUE = {'1', 'true', 'yes', 'y', 't'}
+FALSE = {'0', 'false', 'no', 'n', 'f'}
+
+
+def _coerce(df, table):
+    """
+    Convert the columns of a chunk of text records to the values SQLite
+    stores for the types of table: integers, "YYYY-MM-DD" dates and 0/1
+    booleans.
+
+    Returns the converted records and a Series of the first conversion error
+    of each row (None if valid).
+    """
+
+    records = pd.DataFrame(index=df.index)
+    errors = pd.Series(None, index=df.index, dtype=object)
+    for column in table.columns:
+        if column.name not in df:
+            continue
+        values = df[column.name].astype(object)
+        values = values.where(values.notna() & (values != ''), None)
+        ptype = column.type.python_type
+        if ptype is int:
+            converted = pd.to_numeric(values, errors='coerce')
+            ok = converted.isna() | (converted % 1 == 0)
+            converted = converted.where(ok).astype('Int64').astype(object)
+        elif ptype is datetime.date:
+            converted = pd.to_datetime(values, errors='coerce',
+                                       format='ISO8601').dt.strftime('%Y-%m-%d')
+        elif ptype is bool:
+            lower = values.str.strip().str.lower()
+            converted = lower.map(lambda v: 1 if v in TRUE
+                                  else 0 if v in FALSE else None)
+        else:
+            converted = values
+        converted = converted.astype(object)
+        converted = converted.where(converted.notna(), None)
+        invalid = values.notna() & converted.isna() & errors.isna()
+        errors[invalid] = f'Invalid {ptype.__name__} in {column.name}'
+        records[column.name] = converted
+    return records, errors
+
+
+class Validator:
+    """
+    Check records against the NOT NULL and CHECK constraints of a table.
+
+    The CHECK expressions are evaluated by SQLite itself, on an in-memory
+    copy of the table without constraints, so they are applied exactly as
+    on insert.
+    """
+
+    def __init__(self, table):
+        self.table = table
+        self.checks = [(c.name or str(c.sqltext), str(c.sqltext))
+                       for c in table.constraints
+                       if isinstance(c, CheckConstraint)]
+        # Integer primary keys are assigned by SQLite if missing
+        self.required = [
+            c.name for c in table.columns
+            if not c.nullable and not (
+                c.primary_key and len(table.primary_key.columns) == 1
+                and isinstance(c.type, Integer)
+            )
+        ]
+        self._conn = None
+
+    def _connect(self):
+        # Opened on first use, so validators can be sent to worker processes
+        if self._conn is None:
+            self._conn = sqlite3.connect(':memory:')
+            dialect = sqlite.dialect()
+            columns = ', '.join(f'"{c.name}" {c.type.compile(dialect)}'
+                                for c in self.table.columns)
+            self._conn.execute(f'CREATE TABLE records ({columns})')
+        return self._conn
+
+    def __getstate__(self):
+        return {**self.__dict__, '_conn': None}
+
+    def validate(self, df):
+        """
+        Split a chunk of text records into valid records, converted by
+        `_coerce`, and rejected records with a reason column.
+        """
+
+        records, errors = _coerce(df, self.table)
+        for name in self.required:
+            missing = (records[name].isna() if name in records
+                       else pd.Series(True, index=records.index))
+            errors[missing & errors.isna()] = f'Missing {name}'
+
+        if self.checks and len(records):
+            conn = self._connect()
+            names = ', '.join(f'"{name}"' for name in records.columns)
+            conn.execute('DELETE FROM records')
+            conn.executemany(
+                f'INSERT INTO records (rowid, {names}) '
+                f'VALUES (?{", ?" * len(records.columns)})',
+                [(i, *row) for i, row in
+                 enumerate(records.itertuples(index=False, name=None))]
+            )
+            for name, check in self.checks:
+                failed = [i for i, in conn.execute(
+                    f'SELECT rowid FROM records WHERE NOT ({check})'
+                )]
+                failed = errors.index[failed]
+                failed = failed[errors[failed].isna()]
+                errors[failed] = f'Failed check {name}'
+
+        rejected = df[errors.notna()].assign(reason=errors.dropna())
+        return records[errors.isna()], rejected
+
+
+class Loader:
+    """
+    Base class of loaders, each filling the table of `model` from the files
+    matching `pattern` in the directory of the `source` config option.
+
+    Records are read in chunks of `chunk_size`, mapped onto the columns of
+    the table by `transform`, and validated against the table's constraints.
+    By default files are read as CSV (or TSV if named .tsv or .txt) whose
+    columns are named after the table's columns. Override `read` or
+    `transform` for other formats.
+    """
+
+    PRIORITY = float('inf')
+    model = None
+    # Config option of the source directory
+    source = 'data-dir'
+    # Glob pattern of source files, by default "<table>.csv"
+    pattern = None
+    chunk_size = 50000
+
+    @property
+    def table(self):
+        return self.model.__table__
+
+    @property
+    def name(self):
+        return type(self).__name__
+
+    def files(self):
+        """Return the source files of this loader."""
+
+        pattern = self.pattern or f'{self.table.name}.csv'
+        return sorted(Path(config[self.source].get(str)).glob(pattern))
+
+    def read(self, path):
+        """Yield DataFrames of up to chunk_size raw records from path."""
+
+        sep = '\t' if path.suffix in ('.tsv', '.txt') else ','
+        yield from pd.read_csv(path, sep=sep, dtype=str,
+                               keep_default_na=False,
+                               chunksize=self.chunk_size)
+
+    def transform(self, df):
+        """Map a chunk of raw records onto the columns of the table."""
+
+        return df
+
+    def parse(self):
+        """Yield (valid, rejected) DataFrames for each chunk of records."""
+
+        validator = Validator(self.table)
+        for path in self.files():
+            for chunk in self.read(path):
+                yield validator.validate(self.transform(chunk))
+
+    def parse_all(self):
+        """Return the list of all parsed chunks, e.g. in a worker process."""
+
+        return list(self.parse())
+
+
+def bulk_engine():
+    """Return a new engine for loading, with BULK_PRAGMAS set for SQLite."""
+
+    engine = create_engine(db.url)
+    if db.url.drivername == 'sqlite':
+        @event.listens_for(engine, 'connect')
+        def set_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for name, value in BULK_PRAGMAS.items():
+                cursor.execute(f'PRAGMA {name} = {value}')
+            cursor.close()
+    return engine
+
+
+def _insert(conn, loader, chunks, replace):
+    """Insert parsed chunks into the loader's table, returning counts."""
+
+    if replace:
+        conn.execute(delete(loader.table))
+    loaded, rejected = 0, []
+    for valid, bad in chunks:
+        if len(valid):
+            # Records are already in storage form, so they are passed to the
+            # driver's executemany as tuples, without per-row processing
+            stmt = insert(loader.table).compile(
+                dialect=conn.dialect, column_keys=list(valid.columns)
+            )
+            conn.exec_driver_sql(
+                str(stmt), list(valid.itertuples(index=False, name=None))
+            )
+            loaded += len(valid)
+        if len(bad):
+            rejected.append(bad)
+    return loaded, rejected
+
+
+def load(loaders, workers=1, replace=False, reject_dir='tmp'):
+    """
+    Run loaders, inserting each table's records in one transaction.
+
+    Parameters
+    ----------
+    loaders : list
+        Loader instances in order of priority, see `id_search.get_loaders`.
+        Modules with a legacy execute(db) function are executed as before.
+    workers : int, default 1
+        Number of processes parsing the source files of different loaders
+        in parallel. With 1, records are inserted as they are parsed, so
+        memory use is bounded by the chunk size.
+    replace : bool, default False
+        Delete the existing rows of each loaded table first. Tables whose
+        loader finds no source files are left as they are.
+    reject_dir : str
+        Rejected records of each table are saved to
+        "<reject_dir>/rejected_<table>.csv" along with the reason.
+
+    The identifier index, if built, is dropped before loading, so that
+    lookups never read it while it is out of date, and rebuilt once all
+    loaders have run.
+    """
+    from id_search import utils
+
+    db.check_writable()
+    indexed = utils.has_index(db.engine)
+    if indexed:
+        print('Dropping identifier index...')
+        utils.drop_index()
+    engine = bulk_engine()
+    pool = ProcessPoolExecutor(workers) if workers > 1 else None
+    try:
+        # Submit all parsing up front, so later loaders parse while earlier
+        # ones are inserted
+        parsed = [pool.submit(loader.parse_all)
+                  if pool and isinstance(loader, Loader) else None
+                  for loader in loaders]
+        for loader, future in zip(loaders, parsed):
+            if not isinstance(loader, Loader):
+                print(f'Executing loader {loader.__name__}...')
+                loader.execute(db)
+                continue
+
+            if not loader.files():
+                # Nothing to load, so the table is kept even with replace
+                print(f'No source files for {loader.table.name} '
+                      f'({loader.name}), skipping')
+                continue
+
+            print(f'Loading {loader.table.name} ({loader.name})...')
+            chunks = future.result() if future else loader.parse()
+            try:
+                with engine.begin() as conn:
+                    loaded, rejected = _insert(conn, loader, chunks, replace)
+            except IntegrityError as e:
+                raise Exception(
+                    f'Could not load {loader.table.name}: {e.orig} (load '
+                    f'with --replace to reload a table)'
+                )
+            print(f'Loaded {loaded} rows into {loader.table.name}')
+            if rejected:
+                rejected = pd.concat(rejected, ignore_index=True)
+                path = os.path.join(reject_dir,
+                                    f'rejected_{loader.table.name}.csv')
+                os.makedirs(reject_dir, exist_ok=True)
+                rejected.to_csv(path, index=False)
+                print(f'Rejected {len(rejected)} rows, see {path}')
+    finally:
+        if pool:
+            pool.shutdown(cancel_futures=True)
+        engine.dispose()
+    if indexed:
+        utils.build_index()
@@ -0,0 +1,47 @@
+"""
+Load each table from a CSV file named after it in data-dir, e.g.
+data/registered_participant.csv, with columns named after its columns.
+"""
+
+from id_search import db
+from id_search.loaders import Loader
+
+
+class Centers(Loader):
+    PRIORITY = 0
+    model = db.Center
+
+
+class RegisteredParticipants(Loader):
+    PRIORITY = 1
+    model = db.RegisteredParticipant
+
+
+class Aliases(Loader):
+    PRIORITY = 2
+    model = db.Alias
+
+
+class RutgersLCLs(Loader):
+    PRIORITY = 2
+    model = db.RutgersLCL
+
+
+class DNASamples(Loader):
+    PRIORITY = 2
+    model = db.DNASample
+
+
+class BloodSamples(Loader):
+    PRIORITY = 2
+    model = db.BloodSample
+
+
+class LocalDNASamples(Loader):
+    PRIORITY = 2
+    model = db.LocalDNASample
+
+
+class GenotypingResults(Loader):
+    PRIORITY = 2
+    model = db.GenotypingResult
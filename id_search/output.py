@@ -0,0 +1,142 @@
+"""Incremental writers for tabular results"""
+
+from pathlib import Path
+import datetime
+import gzip
+import typing
+
+FORMATS = {
+    '.csv': 'csv',
+    '.tsv': 'tsv',
+    '.txt': 'tsv',
+    '.parquet': 'parquet',
+    '.arrow': 'arrow',
+    '.feather': 'arrow',
+    '.ipc': 'arrow',
+}
+
+
+def _arrow_type(pytype):
+    """Return the Arrow type for a Python type such as int or list[str]."""
+
+    import pyarrow as pa
+
+    if typing.get_origin(pytype) is list:
+        return pa.list_(_arrow_type(typing.get_args(pytype)[0]))
+    return {
+        str: pa.string(),
+        int: pa.int64(),
+        float: pa.float64(),
+        bool: pa.bool_(),
+        datetime.date: pa.date32(),
+    }.get(pytype, pa.string())
+
+
+class TableWriter:
+    """
+    Append DataFrame chunks to a CSV, TSV, Parquet or Arrow IPC file.
+
+    CSV and TSV files are gzip-compressed if path ends in .gz, e.g.
+    "export.csv.gz". Arrow IPC files (.arrow, .feather or .ipc) are written
+    uncompressed, so that they can be memory-mapped by readers.
+
+    Parameters
+    ----------
+    path : str
+        Output file. The format is taken from its extension unless given.
+    fmt : {'csv', 'tsv', 'parquet', 'arrow'}, optional
+        Output format.
+    types : dict, optional
+        Python type of each column (e.g. int, list[str]). Used to fix the
+        Parquet and Arrow schema, since a single chunk may hold only nulls in
+        a column.
+    """
+
+    def __init__(self, path, fmt=None, types=None):
+        self.path = Path(path)
+        suffixes = [s.lower() for s in self.path.suffixes]
+        self.compressed = suffixes[-1:] == ['.gz']
+        if self.compressed:
+            suffixes.pop()
+        self.fmt = fmt or FORMATS.get(suffixes[-1] if suffixes else '')
+        if self.fmt not in FORMATS.values() or (
+                self.compressed and self.fmt not in ('csv', 'tsv')):
+            raise Exception(f'Unknown output format for "{path}"')
+        self.types = types or {}
+        self.rows = 0
+        self._writer = None
+        self._schema = None
+        self._file = None
+        self._columns = None
+        self._header_written = False
+        # Empty chunk held back until a chunk with rows fixes the schema
+        self._empty = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write(self, df):
+        """Append a chunk of rows."""
+
+        if self._columns is None:
+            self._columns = list(df.columns)
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        df = df.reindex(columns=self._columns)
+
+        if self.fmt in ('parquet', 'arrow'):
+            self._write_arrow(df)
+        else:
+            if self._file is None:
+                self._file = (gzip.open(self.path, 'wt', newline='')
+                              if self.compressed
+                              else open(self.path, 'w', newline=''))
+            df.to_csv(self._file, header=not self._header_written,
+                      index=False, sep='\t' if self.fmt == 'tsv' else ',')
+            self._header_written = True
+        self.rows += len(df)
+
+    def _write_arrow(self, df):
+        import pyarrow as pa
+
+        if self._writer is None:
+            # Columns without a given type are inferred from the first rows,
+            # since an empty chunk would make them null
+            if df.empty:
+                self._empty = df
+                return
+            self._open_arrow(df)
+        table = pa.Table.from_pandas(df, schema=self._schema,
+                                     preserve_index=False)
+        self._writer.write_table(table)
+
+    def _open_arrow(self, df):
+        import pyarrow as pa
+
+        inferred = pa.Schema.from_pandas(df, preserve_index=False)
+        self._schema = pa.schema([
+            pa.field(name, _arrow_type(self.types[name])
+                     if name in self.types else inferred.field(name).type)
+            for name in df.columns
+        ])
+        if self.fmt == 'parquet':
+            import pyarrow.parquet as pq
+            self._writer = pq.ParquetWriter(self.path, self._schema)
+        else:
+            self._writer = pa.ipc.new_file(self.path, self._schema)
+
+    def close(self):
+        """Finish writing the file."""
+
+        if self._writer is None and self._empty is not None:
+            # Only empty chunks were written, so the file only has a schema
+            self._open_arrow(self._empty)
+            self._empty = None
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,145 @@
+"""Instrumentation of SQL queries and lookup phases"""
+
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+import re
+import sys
+import time
+
+# Tables named by the FROM, JOIN, INTO and UPDATE clauses of a statement
+TABLE_PATTERN = re.compile(r'\b(?:FROM|JOIN|INTO|UPDATE)\s+"?(\w+)',
+                           re.IGNORECASE)
+
+_active = ContextVar('profiler', default=None)
+
+
+@contextmanager
+def phase(name):
+    """Time a phase of work for the active Profiler, if any."""
+
+    profiler = _active.get()
+    if profiler is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profiler.phases[name].append(time.perf_counter() - start)
+
+
+def _p95(times):
+    times = sorted(times)
+    return times[min(len(times) - 1, int(0.95 * len(times)))]
+
+
+class Profiler:
+    """
+    Collect query and phase timings while active.
+
+    Hooks the cursor events of engine to count and time SQL statements per
+    table, counts the ORM objects hydrated per model, and times the phases
+    marked with `phase` (e.g. resolve, hydrate, extract, output):
+
+        with Profiler() as profiler:
+            utils.batch_query(df, 'all')
+        print(profiler.format())
+
+    A statement touching several tables counts toward each of them. Phases
+    are timed inclusively, so nested phases overlap, and work done by
+    batch_query worker processes is not seen.
+
+    Parameters
+    ----------
+    engine : Engine, optional
+        Defaults to `db.engine`.
+    """
+
+    def __init__(self, engine=None):
+        from id_search import db
+        self.engine = engine or db.engine
+        self.base = db.Base
+        self.queries = defaultdict(list)
+        self.hydrated = Counter()
+        self.phases = defaultdict(list)
+        self.wall = 0.0
+        self._start = None
+
+    def _before(self, conn, cursor, statement, parameters, context,
+                executemany):
+        conn.info.setdefault('profiler_start', []).append(time.perf_counter())
+
+    def _after(self, conn, cursor, statement, parameters, context,
+               executemany):
+        elapsed = time.perf_counter() - conn.info['profiler_start'].pop()
+        tables = set(TABLE_PATTERN.findall(statement)) or {'(none)'}
+        for table in tables:
+            self.queries[table].append(elapsed)
+
+    def _load(self, target, context):
+        self.hydrated[type(target).__name__] += 1
+
+    def __enter__(self):
+        from sqlalchemy import event
+        event.listen(self.engine, 'before_cursor_execute', self._before)
+        event.listen(self.engine, 'after_cursor_execute', self._after)
+        event.listen(self.base, 'load', self._load, propagate=True)
+        self._token = _active.set(self)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        from sqlalchemy import event
+        self.wall += time.perf_counter() - self._start
+        self._start = None
+        _active.reset(self._token)
+        event.remove(self.engine, 'before_cursor_execute', self._before)
+        event.remove(self.engine, 'after_cursor_execute', self._after)
+        event.remove(self.base, 'load', self._load)
+
+    def stats(self):
+        """Return the collected statistics as a dict."""
+
+        wall = self.wall
+        if self._start is not None:
+            wall += time.perf_counter() - self._start
+        return {
+            'wall_s': wall,
+            'queries': sum(len(t) for t in self.queries.values()),
+            'tables': {
+                table: {'queries': len(times), 'total_s': sum(times),
+                        'p95_s': _p95(times)}
+                for table, times in sorted(self.queries.items())
+            },
+            'hydrated': dict(self.hydrated.most_common()),
+            'phases': {
+                name: {'calls': len(times), 'total_s': sum(times)}
+                for name, times in self.phases.items()
+            },
+        }
+
+    def format(self):
+        """Return the collected statistics as a text report."""
+
+        stats = self.stats()
+        lines = [f'Wall time: {stats["wall_s"]:.3f} s, '
+                 f'{stats["queries"]} queries', '',
+                 f'{"Table":30} {"Queries":>8} {"Total ms":>10} '
+                 f'{"p95 ms":>10}']
+        for table, s in stats['tables'].items():
+            lines.append(f'{table:30} {s["queries"]:8} '
+                         f'{s["total_s"]*1000:10.1f} {s["p95_s"]*1000:10.2f}')
+        lines += ['', f'{"Rows hydrated":30} {"Rows":>8}']
+        for model, rows in stats['hydrated'].items():
+            lines.append(f'{model:30} {rows:8}')
+        lines += ['', f'{"Phase":30} {"Calls":>8} {"Total ms":>10}']
+        for name, s in stats['phases'].items():
+            lines.append(f'{name:30} {s["calls"]:8} {s["total_s"]*1000:10.1f}')
+        return '\n'.join(lines)
+
+    def report(self, file=None):
+        """Print the text report, to stderr by default."""
+
+        # sys.stderr is looked up on each call, as it may be redirected
+        print(self.format(), file=file or sys.stderr)
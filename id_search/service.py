@@ -0,0 +1,94 @@
+"""Long-lived lookup service, e.g. for the web app"""
+
+from id_search import cache, db, fuzzy, utils
+from sqlalchemy.orm import Session
+import os
+
+
+class LookupService:
+    """
+    Answer lookups across many requests from one pooled engine.
+
+    The service is safe to share between threads: each call uses its own
+    Session from the engine's connection pool, and the identifier cache (if
+    enabled in the config) is only read after it is built.
+
+    Parameters
+    ----------
+    engine : Engine, optional
+        Defaults to `db.engine`.
+    warm : bool, default True
+        Open a connection and build the identifier cache up front, rather
+        than on the first request.
+    """
+
+    def __init__(self, engine=None, warm=True):
+        self.engine = engine or db.engine
+        # Connections must not be shared with processes forked from this one,
+        # e.g. by gunicorn --preload
+        os.register_at_fork(
+            after_in_child=lambda: self.engine.dispose(close=False)
+        )
+        if warm:
+            self.warm()
+
+    def warm(self):
+        """Open a pooled connection and load the identifier cache."""
+
+        with self.engine.connect():
+            pass
+        utils.has_index(self.engine)
+        cache.identifier_cache(self.engine)
+
+    def indices(self):
+        """Return the names of all lookup indices."""
+
+        return list(utils.lookups)
+
+    def centers(self):
+        """Return the names of all centers."""
+
+        return utils.cached_centers()
+
+    def _keys(self, index):
+        try:
+            return utils.lookups[index]
+        except KeyError:
+            raise ValueError(f'Unknown index "{index}"')
+
+    def lookup(self, values, index='all', center=None):
+        """
+        Look up one or more identifiers.
+
+        Returns
+        -------
+        DataFrame
+            Records of matched participants, see `utils.lookup_records`.
+        """
+
+        keys = self._keys(index)
+        if isinstance(values, str):
+            values = [values]
+        with Session(self.engine) as session:
+            return utils.lookup_records(values, keys, session, center)
+
+    def search(self, query, index='all', center=None, **kwargs):
+        """
+        Find identifiers similar to query, see `fuzzy.search` for options.
+        """
+
+        keys = self._keys(index)
+        with Session(self.engine) as session:
+            return fuzzy.search(query, keys, session, center, **kwargs)
+
+    def iter_csv(self, values, index='all', center=None,
+                 chunk_size=utils.CHUNK_SIZE):
+        """Yield CSV text for the records of values, one chunk at a time."""
+
+        keys = self._keys(index)
+        with Session(self.engine) as session:
+            for i in range(0, max(len(values), 1), chunk_size):
+                df = utils.lookup_records(values[i:i + chunk_size], keys,
+                                          session, center)
+                yield df.to_csv(index=False, header=i == 0)
+                session.expunge_all()
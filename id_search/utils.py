@@ -1,14 +1,67 @@
 """Functions supporting ibdgc-db tool"""
 
-from id_search import db
-from sqlalchemy.orm import Session, attributes
-from sqlalchemy.exc import OperationalError, NoResultFound
+from id_search import CenterNotFound, db, identifiers, profiling
+from id_search.cache import (database_path, forget_fingerprints,
+    identifier_cache, recent_fingerprint, snapshot_fingerprint)
+from sqlalchemy.orm import (Session, joinedload, selectinload,
+    configure_mappers)
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.inspection import inspect
-from sqlalchemy import select
+from sqlalchemy import (select, insert, update, delete, case, tuple_, literal,
+    union_all, cast, and_, String, Integer, func, MetaData, Table, Column,
+    CheckConstraint, literal_column)
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import pandas as pd
 from pprint import pprint
+from pathlib import Path
+import fnmatch
+import json
 import re
 
+# Maximum number of bound parameters per IN (...) query
+CHUNK_SIZE = 500
+# Identifier shown for each item of a participant's child collections
+COLLECTION_IDS = {
+    'aliases': 'alias',
+    'lcls': 'niddk_no',
+    'dna_samples': 'id',
+    'blood_samples': 'id',
+    'local_dna_samples': 'id',
+    'genotyping_results': 'id',
+}
+
+# GLOB check constraint on a single column, e.g. 'alias GLOB "[A-Z]..."'
+GLOB_CHECK = re.compile(r'^(\w+) GLOB "(.*)"$')
+# Text form of integers, as normalized by identifiers.normalize
+INTEGER_REGEX = re.compile(r'-?[0-9]+')
+
+# Parsed pedigree identifiers of a batch, joined against pedigree columns
+pedigree_probe = Table(
+    'pedigree_probe', MetaData(),
+    Column('pedigree', String),
+    # SQLite keeps non-numeric individuals as text
+    Column('individual', Integer),
+    prefixes=['TEMPORARY'],
+)
+
+# Consortium IDs of a batch, joined against every table linked to them
+participant_probe = Table(
+    'participant_probe', MetaData(),
+    Column('consortium_id', String(14), primary_key=True),
+    prefixes=['TEMPORARY'],
+)
+
+# Trigram search index of identifier values, see db.search_index
+search_index = Table(
+    db.search_index, MetaData(),
+    Column('rowid', Integer),
+    Column('value', String),
+    # The hidden column named after the table is matched against queries,
+    # and takes commands such as 'delete' on insert
+    Column(db.search_index, String),
+)
+
 lookups = {'all': []}
 for idx in db.Base.metadata.info['lookups']:
     k = f'{idx.parent.persist_selectable}.{idx.key}'
@@ -36,93 +89,835 @@ def get_centers():
     return centers
 
 
+def get_center_id(session, center):
+    """
+    Return the id of the named center, or None if center is None.
+
+    Center ids are queried once per session. Raises CenterNotFound for
+    unknown centers.
+    """
+
+    if center is None:
+        return None
+    ids = session.info.get('center_ids')
+    if ids is None:
+        ids = session.info['center_ids'] = dict(
+            session.execute(select(db.Center.name, db.Center.id)).all()
+        )
+    try:
+        return ids[center]
+    except KeyError:
+        raise CenterNotFound(f'Center "{center}" not found')
+
+
+def _in_center(stmt, table, center_id):
+    """
+    Restrict a select from table to rows of center_id, joining the
+    participant for tables without a center of their own.
+    """
+
+    if center_id is None:
+        return stmt
+    if 'center_id' in table.__table__.c:
+        return stmt.where(table.center_id == center_id)
+    p = db.RegisteredParticipant
+    return (stmt.join_from(table, p, p.consortium_id == table.consortium_id)
+            .where(p.center_id == center_id))
+
+
+def lookup_statement(value, keys, center_id=None):
+    """
+    Compile a lookup of a single identifier into one UNION ALL statement.
+
+    Parameters
+    ----------
+    value : str
+        Identifier to look up.
+    keys : list of (table, column)
+        Lookup key(s) as found in `lookups`.
+    center_id : int, optional
+        Restrict all queries to a single center.
+
+    Returns
+    -------
+    CompoundSelect or None
+        Statement returning (matched_table, matched_column, consortium_id)
+        rows, or None if value cannot match any of the keys. Keys are only
+        queried if value has the format of their column, as in `resolve`.
+    """
+
+    selects = []
+    for table, column in keys:
+        if not _can_match(value, column):
+            continue
+        if column.info.get('type') == db.PedigreeIndividual:
+            v = _parse_pedigree(value)
+            if v is None:
+                continue
+        else:
+            v = value
+
+        stmt = select(
+            literal(table.__tablename__).label('matched_table'),
+            literal(column.key).label('matched_column'),
+            table.consortium_id.label('consortium_id')
+        ).where(column == v)
+        selects.append(_in_center(stmt, table, center_id))
+
+    return union_all(*selects) if selects else None
+
+
+def index_statement(value, keys, center_id=None):
+    """
+    Compile a lookup of a single identifier against the identifier index.
+
+    Same as `lookup_statement`, but probes `db.identifier_index` and returns
+    (kind, consortium_id) rows, where kind is "<table>.<column>".
+    """
+
+    kinds = {}
+    for table, column in keys:
+        v = index_value(value, column)
+        if v is not None and _can_match(value, column):
+            kinds.setdefault(v, []).append(kind_name(table, column))
+    if not kinds:
+        return None
+
+    idx = db.identifier_index
+    stmt = select(idx.c.kind, idx.c.consortium_id).where(
+        tuple_(idx.c.value, idx.c.kind).in_(
+            [(v, k) for v, ks in kinds.items() for k in ks]
+        )
+    )
+    if center_id is not None:
+        stmt = stmt.where(idx.c.center_id == center_id)
+    return stmt
+
+
+def _statement(value, keys, session, center=None):
+    """Compile a lookup, using the identifier index if it has been built."""
+
+    center_id = get_center_id(session, center)
+    if has_index(session.get_bind()):
+        return index_statement(value, keys, center_id)
+    return lookup_statement(value, keys, center_id)
+
+
+def get_matches(value, keys, session, center=None):
+    """
+    Return (matched_table, matched_column, consortium_id) tuples for a single
+    identifier, optionally within center.
+    """
+
+    cache = identifier_cache(session.get_bind())
+    if cache is not None:
+        kinds = [kind_name(table, column) for table, column in keys]
+        _, found, cids = cache.probe([value], kinds, center)
+        return [tuple(kinds[k].split('.', 1)) + (cid,)
+                for k, cid in zip(found, cids)]
+
+    stmt = _statement(value, keys, session, center)
+    if stmt is None:
+        return []
+    if has_index(session.get_bind()):
+        return [tuple(kind.split('.', 1)) + (cid,)
+                for kind, cid in session.execute(stmt)]
+    return [tuple(row) for row in session.execute(stmt)]
+
+
+def cached_centers():
+    """
+    Return list of center names, cached in a sidecar file next to a SQLite
+    database until the database file changes.
+    """
+
+    if not db.is_sqlite_file:
+        return get_centers()
+    path = Path(db.url.database)
+    sidecar = path.with_name(path.name + '.centers.json')
+    try:
+        fingerprint = list(snapshot_fingerprint(path))
+    except OSError:
+        return []
+
+    try:
+        with open(sidecar) as f:
+            cached = json.load(f)
+        if cached['fingerprint'] == fingerprint:
+            return cached['centers']
+    except (OSError, ValueError, KeyError):
+        pass
+
+    centers = get_centers()
+    try:
+        with open(sidecar, 'w') as f:
+            json.dump({'fingerprint': fingerprint, 'centers': centers}, f)
+    except OSError:
+        pass
+    return centers
+
+
 def get_participants(value, keys, session, center=None):
     """
     Return participant(s) based on a single identifier,
     optionally within center.
     """
 
-    results = []
-    for table, column in keys:
+    with profiling.phase('resolve'):
+        cache = identifier_cache(session.get_bind())
+        if cache is not None:
+            kinds = [kind_name(table, column) for table, column in keys]
+            matched = set(cache.probe([value], kinds, center)[2])
+            if not matched:
+                return set()
+        else:
+            stmt = _statement(value, keys, session, center)
+            if stmt is None:
+                return set()
+            # Load each matched participant once, in the same round trip
+            matched = select(stmt.subquery().c.consortium_id)
+
+        return set(session.scalars(
+            select(db.RegisteredParticipant)
+            .where(db.RegisteredParticipant.consortium_id.in_(matched))
+        ))
+
+
+def _parse_pedigree(value):
+    """Split a pedigree identifier into a PedigreeIndividual, if possible."""
+
+    tokens = identifiers.split_pedigree(value)
+    return None if tokens is None else db.PedigreeIndividual(*tokens)
+
+
+def kind_name(table, column):
+    """Return the "<table>.<column>" name of a lookup column."""
+
+    return f'{table.__tablename__}.{column.key}'
+
+
+_value_types = {}
+
+
+def value_type(column):
+    """Return the Python type of values stored in a lookup column."""
+
+    # Memoized, as attribute access on mapped columns is slow
+    vtype = _value_types.get((column.class_, column.key))
+    if vtype is None:
         if column.info.get('type') == db.PedigreeIndividual:
-            tokens = re.split(
-                '\s*,\s*|\s*-\s*|\s*\.\s*|\s+',
-                value,
-                maxsplit=1
-            )
-            if len(tokens) < 2:
-                continue
+            vtype = identifiers.PEDIGREE
+        else:
+            vtype = column.type.python_type
+        _value_types[(column.class_, column.key)] = vtype
+    return vtype
+
+
+_value_patterns = {}
+
+
+def _value_pattern(column):
+    """
+    Return the regex that the normalized text form of every value of a
+    lookup column matches, or None if values have no fixed format.
+
+    It is taken from the column's GLOB check constraint in db.py, or else
+    from its type for integer columns.
+    """
+
+    key = (column.class_, column.key)
+    if key not in _value_patterns:
+        pattern = INTEGER_REGEX if value_type(column) is int else None
+        for constraint in column.class_.__table__.constraints:
+            match = (isinstance(constraint, CheckConstraint)
+                     and GLOB_CHECK.match(str(constraint.sqltext)))
+            if match and match[1] == column.key:
+                pattern = re.compile(fnmatch.translate(match[2]))
+        _value_patterns[key] = pattern
+    return _value_patterns[key]
+
+
+def _route(values, keys):
+    """
+    Return a boolean mask per key of the values that can match it, by
+    the format of its column (see `_value_pattern`).
+
+    Values are classified once per distinct format, on whole columns, so
+    that values of other kinds are never sent to SQL.
+    """
+
+    values = pd.Series(values, dtype=object)
+    masks = {}
+    routes = []
+    for table, column in keys:
+        vtype, pattern = value_type(column), _value_pattern(column)
+        if (vtype, pattern) not in masks:
+            if pattern is None:
+                mask = np.ones(len(values), dtype=bool)
             else:
-                v = db.PedigreeIndividual(*tokens)
+                text = identifiers.normalize_all(values, vtype)
+                mask = text.str.fullmatch(pattern, na=False).to_numpy(bool)
+            masks[vtype, pattern] = mask
+        routes.append(masks[vtype, pattern])
+    return routes
+
+
+def _can_match(value, column):
+    """
+    Return True if a single identifier has the format of a lookup column's
+    values, see `_route`.
+    """
+
+    pattern = _value_pattern(column)
+    if pattern is None:
+        return True
+    text = identifiers.normalize(value, value_type(column))
+    return text is not None and pattern.fullmatch(text) is not None
+
+
+def _bind_value(value, column):
+    """Coerce an identifier to the Python type stored in column."""
+
+    return identifiers.coerce(value, value_type(column))
+
+
+def index_value(value, column):
+    """Normalize an identifier to its text form in the identifier index."""
+
+    return identifiers.normalize(value, value_type(column))
+
+
+def index_expr(column):
+    """SQL expression for the text form of a lookup column's values."""
+
+    if value_type(column) == identifiers.PEDIGREE:
+        pedigree, individual = column.property.columns
+        return pedigree + '-' + cast(individual, String)
+    return cast(column, String)
+
+
+_tables = {}
+
+
+def _has_table(engine, name):
+    """
+    Return True if the database behind engine has a table.
+
+    The answer is kept until the database file changes (see
+    `recent_fingerprint`), so that long-lived processes notice indexes
+    built or dropped by other processes. For other databases it is kept
+    for the lifetime of the process.
+    """
+
+    path = database_path(engine)
+    try:
+        fingerprint = None if path is None else recent_fingerprint(path)
+    except OSError:
+        fingerprint = None
+    checked = _tables.get((engine, name))
+    if checked is None or checked[0] != fingerprint:
+        checked = (fingerprint, inspect(engine).has_table(name))
+        _tables[engine, name] = checked
+    return checked[1]
+
+
+def has_index(engine):
+    """Return True if the identifier index has been built for engine."""
+
+    return _has_table(engine, db.identifier_index.name)
+
+
+def has_search_index(engine):
+    """Return True if the trigram search index has been built for engine."""
+
+    return _has_table(engine, db.search_index)
+
+
+def forget_tables():
+    """Check again which indexes have been built, e.g. after writes."""
+
+    _tables.clear()
+
+
+def identifier_selects():
+    """
+    Yield one statement per lookup column (including aliases), selecting
+    (value, kind, center_id, consortium_id) rows for every identifier.
+
+    Values are in normalized text form. The center is taken from the table
+    itself where it has one, otherwise from the participant.
+    """
+
+    for table, column in lookups['all']:
+        value = index_expr(column)
+        kind = literal(kind_name(table, column)).label('kind')
+        if 'center_id' in table.__table__.c:
+            stmt = select(value.label('value'), kind, table.center_id,
+                          table.consortium_id)
         else:
-            v = value
+            stmt = (select(value.label('value'), kind,
+                           db.RegisteredParticipant.center_id,
+                           table.consortium_id)
+                    .join(db.RegisteredParticipant,
+                          db.RegisteredParticipant.consortium_id
+                          == table.consortium_id))
+        yield stmt.where(value.is_not(None))
+
 
-        if center:
-            center_id = session.scalar(
-                select(db.Center)
-                .where(db.Center.name == center)
-            ).id
-            stmt = select(table).where(
-                column == v,
-                table.center_id == center_id
+def drop_index(engine=None):
+    """Drop the identifier index and its trigram search index, if built."""
+
+    engine = engine or db.engine
+    with engine.begin() as conn:
+        conn.exec_driver_sql(f'DROP TABLE IF EXISTS {db.search_index}')
+        db.identifier_index.drop(conn, checkfirst=True)
+    forget_tables()
+    forget_fingerprints()
+
+
+def build_index(engine=None):
+    """
+    Materialize the identifier index from all lookup columns.
+
+    Every identifier in `lookups['all']` (including aliases) is stored as
+    normalized text alongside its lookup kind, center and Consortium ID.
+    Indexes of the schema missing from the database are created as well.
+    """
+
+    db.check_writable()
+    engine = engine or db.engine
+    idx = db.identifier_index
+
+    print("Building identifier index...")
+    with engine.begin() as conn:
+        conn.exec_driver_sql(f'DROP TABLE IF EXISTS {db.search_index}')
+        idx.drop(conn, checkfirst=True)
+        idx.create(conn)
+        for stmt in identifier_selects():
+            conn.execute(insert(idx).from_select(
+                ['value', 'kind', 'center_id', 'consortium_id'], stmt
+            ))
+        count = conn.scalar(select(func.count()).select_from(idx))
+        # Add indexes missing from databases created by older versions
+        for table in db.Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+
+        try:
+            conn.exec_driver_sql(
+                f"CREATE VIRTUAL TABLE {db.search_index} USING fts5(value, "
+                f"content='{idx.name}', content_rowid='rowid', "
+                f"tokenize='trigram')"
             )
+        except OperationalError:
+            print('SQLite lacks FTS5 trigram support; search only finds '
+                  'prefixes and neighbouring identifiers')
         else:
-            stmt = select(table).where(column == v)
+            conn.exec_driver_sql(f"INSERT INTO {db.search_index}"
+                                 f"({db.search_index}) VALUES ('rebuild')")
+    forget_tables()
+    forget_fingerprints()
+    print(f"Indexed {count} identifiers")
 
-        for item in session.scalars(stmt):
-            if isinstance(item, db.RegisteredParticipant):
-                results.append(item)
-            else:
-                results.append(item.participant)
 
-    return set(results)
+def _reindex(session, cids):
+    """
+    Replace the identifier index rows of the participants with the given
+    Consortium IDs by their current identifiers, along with their entries in
+    the trigram search index.
+
+    Called by writers in their own transaction, so that the index, if built,
+    never disagrees with the tables it is derived from.
+    """
+
+    engine = session.get_bind()
+    if not has_index(engine):
+        return
+    idx = db.identifier_index
+    fts = search_index if has_search_index(engine) else None
+    rowid = literal_column(f'{idx.name}.rowid')
+    cids = list(dict.fromkeys(cids))
+    for i in range(0, len(cids), CHUNK_SIZE):
+        chunk = cids[i:i + CHUNK_SIZE]
+        rows = idx.c.consortium_id.in_(chunk)
+        if fts is not None:
+            # External content tables are told of removed rows explicitly
+            session.execute(insert(fts).from_select(
+                [fts.name, 'rowid', 'value'],
+                select(literal('delete'), rowid, idx.c.value).where(rows)
+            ))
+        session.execute(delete(idx).where(rows))
+        start = session.scalar(select(func.coalesce(func.max(rowid), 0))
+                               .select_from(idx))
+        for stmt in identifier_selects():
+            session.execute(insert(idx).from_select(
+                ['value', 'kind', 'center_id', 'consortium_id'],
+                stmt.where(stmt.selected_columns.consortium_id.in_(chunk))
+            ))
+        if fts is not None:
+            session.execute(insert(fts).from_select(
+                ['rowid', 'value'],
+                select(rowid, idx.c.value).where(rowid > start)
+            ))
+
+
+def _resolve_index(values, keys, session, center_id=None):
+    """Same as `resolve`, probing the identifier index instead."""
+
+    idx = db.identifier_index
+    matches = []
+    # Columns sharing a value type share one normalized form, so their
+    # kinds can be probed together
+    values = pd.Series(values, dtype=object)
+    groups = {}
+    for (table, column), route in zip(keys, _route(values, keys)):
+        # Columns of one format also share the values routed to them
+        group = (value_type(column), _value_pattern(column))
+        groups.setdefault(group, ([], route))[0].append((table, column))
+    for pairs, route in groups.values():
+        column = pairs[0][1]
+        kinds = [kind_name(table, column) for table, column in pairs]
+        routed = values[route].reset_index(drop=True)
+        bound = pd.DataFrame({
+            'value': routed,
+            'key': identifiers.normalize_all(routed, value_type(column)),
+        }).dropna(subset=['key'])
+        if bound.empty:
+            continue
+
+        found = []
+        params = bound['key'].drop_duplicates().tolist()
+        for i in range(0, len(params), CHUNK_SIZE):
+            stmt = select(idx.c.value, idx.c.consortium_id).where(
+                idx.c.value.in_(params[i:i + CHUNK_SIZE]),
+                idx.c.kind.in_(kinds)
+            )
+            if center_id is not None:
+                stmt = stmt.where(idx.c.center_id == center_id)
+            found += session.execute(stmt).all()
+
+        found = pd.DataFrame(found, columns=['key', 'consortium_id'],
+                             dtype=object)
+        matches.append(bound.merge(found, on='key')[['value',
+                                                     'consortium_id']])
+
+    if not matches:
+        return pd.DataFrame(columns=['value', 'consortium_id'], dtype=object)
+    return pd.concat(matches, ignore_index=True).drop_duplicates()
+
+
+def resolve(values, keys, session, center=None):
+    """
+    Resolve distinct identifiers to Consortium IDs using chunked IN queries.
+
+    Parameters
+    ----------
+    values : list
+        Distinct identifiers to resolve.
+    keys : list of (table, column)
+        Lookup key(s) as found in `lookups`.
+    session : Session
+    center : str, optional
+        Restrict all queries to a single center.
+
+    Returns
+    -------
+    DataFrame
+        One row per (value, consortium_id) match.
+    """
+
+    cache = identifier_cache(session.get_bind())
+    if cache is not None:
+        values = pd.Series(list(values), dtype=object)
+        kinds = [kind_name(table, column) for table, column in keys]
+        positions, _, cids = cache.probe(values.tolist(), kinds, center)
+        return pd.DataFrame({'value': values.to_numpy()[positions],
+                             'consortium_id': cids},
+                            dtype=object).drop_duplicates()
+
+    center_id = get_center_id(session, center)
+    if has_index(session.get_bind()):
+        return _resolve_index(values, keys, session, center_id)
+
+    values = pd.Series(values, dtype=object)
+    matches = []
+    for (table, column), route in zip(keys, _route(values, keys)):
+        routed = values[route].tolist()
+        if value_type(column) == identifiers.PEDIGREE:
+            matches.append(_resolve_pedigrees(routed, table, column, session,
+                                              center_id))
+            continue
+
+        bound = pd.DataFrame({
+            'value': pd.Series(routed, dtype=object),
+            'key': pd.Series([_bind_value(v, column) for v in routed],
+                             dtype=object),
+        }).dropna(subset=['key'])
+        if bound.empty:
+            continue
+
+        found = []
+        params = bound['key'].drop_duplicates().tolist()
+        for i in range(0, len(params), CHUNK_SIZE):
+            stmt = select(column, table.consortium_id).where(
+                column.in_(params[i:i + CHUNK_SIZE])
+            )
+            stmt = _in_center(stmt, table, center_id)
+            found += session.execute(stmt).all()
+
+        found = pd.DataFrame(found, columns=['key', 'consortium_id'],
+                             dtype=object)
+        matches.append(bound.merge(found, on='key')[['value',
+                                                     'consortium_id']])
+
+    if not matches:
+        return pd.DataFrame(columns=['value', 'consortium_id'], dtype=object)
+    return pd.concat(matches, ignore_index=True).drop_duplicates()
+
+
+def _resolve_pedigrees(values, table, column, session, center_id=None):
+    """
+    Resolve pedigree identifiers against a composite (pedigree, individual)
+    lookup column.
+
+    All values are split in one pass, and the distinct pairs are matched by
+    a single join with a temporary table, which SQLite answers from the
+    column's index, unlike a row-value IN (...) list.
+    """
+
+    pairs = identifiers.split_pedigrees(values)
+    pairs['value'] = pd.Series(values, dtype=object).to_numpy()
+    pairs = pairs.dropna(subset=['pedigree'])
+    if pairs.empty:
+        return pd.DataFrame(columns=['value', 'consortium_id'], dtype=object)
+
+    probe = pedigree_probe
+    pedigree, individual = column.property.columns
+    conn = session.connection()
+    probe.create(conn, checkfirst=True)
+    conn.execute(delete(probe))
+    conn.execute(insert(probe), pairs[['pedigree', 'individual']]
+                 .drop_duplicates().to_dict('records'))
+    stmt = select(probe.c.pedigree, probe.c.individual,
+                  table.consortium_id).join_from(
+        probe, table, and_(pedigree == probe.c.pedigree,
+                           individual == probe.c.individual)
+    )
+    stmt = _in_center(stmt, table, center_id)
+    found = pd.DataFrame(conn.execute(stmt).all(),
+                         columns=['pedigree', 'individual', 'consortium_id'],
+                         dtype=object)
+    conn.execute(delete(probe))
+
+    return pairs.merge(found, on=['pedigree', 'individual'])[
+        ['value', 'consortium_id']
+    ]
+
+
+def load_participants(cids, session):
+    """
+    Load participants by Consortium ID, along with their center and child
+    collections, in a fixed number of queries per chunk of CHUNK_SIZE.
+
+    Participants already in the session are hydrated in place.
+    """
+
+    p = db.RegisteredParticipant
+    # The center backref only exists once mappers are configured, which no
+    # ORM query may have done yet if values were resolved in Core
+    configure_mappers()
+    options = [joinedload(p.center)] + [
+        selectinload(getattr(p, name)) for name in COLLECTION_IDS
+    ]
+
+    cids = list(dict.fromkeys(cids))
+    participants = []
+    with profiling.phase('hydrate'):
+        for i in range(0, len(cids), CHUNK_SIZE):
+            participants += session.scalars(
+                select(p)
+                .where(p.consortium_id.in_(cids[i:i + CHUNK_SIZE]))
+                .options(*options)
+            ).all()
+    return participants
 
 
 def extract_participant_data(participant):
-    """Extract data from participant object for DataFrame display."""
-    # Force loading of lazy attributes
-    for attr in attributes.instance_state(participant).unloaded:
-        getattr(participant, attr)
-
-    return {
-        k: getattr(participant, k)
-        for k in vars(participant)
-        if k != '_sa_instance_state'
+    """
+    Extract data from participant object for DataFrame display.
+
+    Child collections are rendered as lists of their identifiers. Use
+    `load_participants` first to avoid lazy loading them one at a time.
+    """
+
+    with profiling.phase('extract'):
+        data = {
+            attr.key: getattr(participant, attr.key)
+            for attr in inspect(db.RegisteredParticipant).column_attrs
+        }
+        data['center'] = participant.center.name
+        for name, key in COLLECTION_IDS.items():
+            data[name] = [getattr(item, key)
+                          for item in getattr(participant, name)]
+    return data
+
+
+def record_types():
+    """Return the Python type of each column of a participant record."""
+
+    mapper = inspect(db.RegisteredParticipant)
+    types = {attr.key: attr.columns[0].type.python_type
+             for attr in mapper.column_attrs}
+    types['center'] = str
+    for name, key in COLLECTION_IDS.items():
+        column = mapper.relationships[name].mapper.columns[key]
+        types[name] = list[column.type.python_type]
+    return types
+
+
+def lookup_records(values, keys, session, center=None):
+    """
+    Return records of the participants matched by a chunk of identifiers.
+
+    Parameters
+    ----------
+    values : list-like of str
+        Identifiers to look up.
+    keys : list of (table, column)
+        Lookup key(s) as found in `lookups`.
+    session : Session
+    center : str, optional
+        Restrict all queries to a single center.
+
+    Returns
+    -------
+    DataFrame
+        One row per (value, participant) match in input order, holding the
+        matched value followed by the columns of `extract_participant_data`.
+    """
+
+    values = list(dict.fromkeys(values))
+    order = {v: i for i, v in enumerate(values)}
+    with profiling.phase('resolve'):
+        found = resolve(values, keys, session, center)
+    found = (found.assign(position=found['value'].map(order))
+             .sort_values('position', kind='stable'))
+    participants = {
+        p.consortium_id: p
+        for p in load_participants(found['consortium_id'].tolist(), session)
     }
 
+    return pd.DataFrame(
+        [{'value': value, **extract_participant_data(participants[cid])}
+         for value, cid in zip(found['value'], found['consortium_id'])
+         if cid in participants],
+        columns=['value', *record_types()]
+    )
 
-def display_participant(participant):
-    """Print participant info."""
 
-    # Force loading of lazy attributes so we can print them
-    for attr in attributes.instance_state(participant).unloaded:
-        getattr(participant, attr)
+def _linked_selects(probe):
+    """
+    Yield one statement per lookup column (including aliases), selecting
+    (consortium_id, id_kind, id_value) rows for the participants in probe.
+    """
 
-    pprint({
-        k: v
-        for k, v in vars(participant).items()
-        if k != '_sa_instance_state'
-    })
+    for table, column in lookups['all']:
+        value = index_expr(column)
+        # SQLite answers IN (subquery) from the consortium_id index of the
+        # table, looking up each participant of the probe
+        yield (select(table.consortium_id, literal(kind_name(table, column)),
+                      value)
+               .where(table.consortium_id.in_(select(probe.c.consortium_id)),
+                      value.is_not(None)))
 
 
-def _agg_cids(series):
-    """Aggregate Consortium IDs from a series of registered participants."""
+def linked_identifiers(cids, session):
+    """
+    Return every identifier of participants in one query over all lookup
+    columns, as (consortium_id, id_kind, id_value) rows.
 
-    unique_cids = set()
-    for resultset in series:
-        for participant in resultset:
-            unique_cids.add(participant.consortium_id)
+    Kinds are lookup names as in `lookups` (e.g. "dna_sample.id") and values
+    are in normalized text form, e.g. "<pedigree>-<individual>".
+    """
 
-    unique_cids = list(unique_cids)
-    if len(unique_cids) < 2:
-        result = unique_cids[0] if len(unique_cids) else None
-    else:
-        result = sorted(unique_cids)
+    columns = ['consortium_id', 'id_kind', 'id_value']
+    cids = list(dict.fromkeys(cids))
+    if not cids:
+        return pd.DataFrame(columns=columns, dtype=object)
 
-    return result
+    probe = participant_probe
+    conn = session.connection()
+    probe.create(conn, checkfirst=True)
+    conn.execute(delete(probe))
+    conn.execute(insert(probe), [{'consortium_id': cid} for cid in cids])
+    linked = pd.DataFrame(
+        conn.execute(union_all(*_linked_selects(probe))).all(),
+        columns=columns, dtype=object
+    )
+    conn.execute(delete(probe))
+    return linked
 
 
-def batch_query(values, keys=None, center=None):
+def expand(values, keys, session, center=None):
+    """
+    Return all identifiers linked to the participants matched by a batch of
+    identifiers, in a fixed number of queries.
+
+    Parameters
+    ----------
+    values : list-like of str
+        Identifiers to look up.
+    keys : list of (table, column)
+        Lookup key(s) as found in `lookups`.
+    session : Session
+    center : str, optional
+        Restrict the lookup of values to a single center.
+
+    Returns
+    -------
+    DataFrame
+        Long-format table of (input, consortium_id, id_kind, id_value) rows,
+        in input order and then in the order of `lookups['all']`. Values
+        without a match are left out.
+    """
+
+    values = list(dict.fromkeys(values))
+    order = {v: i for i, v in enumerate(values)}
+    ranks = {kind_name(table, column): i
+             for i, (table, column) in enumerate(lookups['all'])}
+    with profiling.phase('resolve'):
+        found = resolve(values, keys, session, center)
+    with profiling.phase('hydrate'):
+        linked = linked_identifiers(found['consortium_id'], session)
+
+    expanded = found.rename(columns={'value': 'input'}).merge(
+        linked, on='consortium_id'
+    )
+    # Sort on integer keys only, as sorting strings is slow for large batches
+    expanded = expanded.assign(
+        position=expanded['input'].map(order),
+        participant=pd.factorize(expanded['consortium_id'])[0],
+        rank=expanded['id_kind'].map(ranks),
+    ).sort_values(['position', 'participant', 'rank'], kind='stable')
+    return expanded[['input', 'consortium_id', 'id_kind',
+                     'id_value']].reset_index(drop=True)
+
+
+def display_participant(participant):
+    """Print participant info."""
+
+    pprint(extract_participant_data(participant))
+
+
+def _init_worker():
+    """Give a batch_query worker process its own read-only engine."""
+
+    # Drop connections inherited from the parent process without closing them
+    db.engine.dispose(close=False)
+    db.engine = db.readonly_engine()
+
+
+def batch_query(values, keys=None, center=None, workers=1):
     """
     Query participants based on a series or data frame of identifiers.
 
@@ -136,6 +931,9 @@ def batch_query(values, keys=None, center=None):
         of columns in values.
     center : str, optional
         Restrict all queries to a single center.
+    workers : int, default 1
+        Number of processes. Rows are split into one shard per worker, each
+        resolved with its own read-only engine.
 
     Returns
     -------
@@ -143,6 +941,39 @@ def batch_query(values, keys=None, center=None):
         Consortium ID(s) (str or list of str) found for each row in values.
     """
 
+    if workers > 1 and len(values) > 1:
+        # Fail before starting any workers
+        with Session(db.engine) as session:
+            get_center_id(session, center)
+        values = pd.DataFrame(values)
+        shards = [values.iloc[rows]
+                  for rows in np.array_split(np.arange(len(values)), workers)]
+        with ProcessPoolExecutor(workers, initializer=_init_worker) as pool:
+            results = pool.map(batch_query, shards,
+                               [keys]*len(shards), [center]*len(shards))
+            return pd.concat(list(results))
+
+    values, keys = batch_columns(values, keys)
+    # Resolve the distinct values of each column once, then map the matches
+    # back onto row positions
+    matches = []
+    with Session(db.engine) as session:
+        for column, key in zip(values.columns, keys):
+            rows = batch_rows(values[column])
+            with profiling.phase('resolve'):
+                found = resolve(rows['value'].drop_duplicates().tolist(),
+                                 lookups[key], session, center)
+            matches.append(rows.merge(found, on='value')[['row',
+                                                          'consortium_id']])
+    return batch_result(matches, values.index)
+
+
+def batch_columns(values, keys):
+    """
+    Return the values of `batch_query` as a DataFrame, and the lookup name
+    of each of its columns.
+    """
+
     values = pd.DataFrame(values).fillna('')
     if keys is None:
         keys = 'all'
@@ -152,70 +983,233 @@ def batch_query(values, keys=None, center=None):
         raise Exception(
             'Number of keys does not match number of columns in values'
         )
+    return values, keys
 
-    df = pd.DataFrame()
-    with Session(db.engine) as session:
-        for column, key in zip(values.columns, keys):
-            df[f'{column}.{key}'] = values[column].apply(get_participants,
-                                                         keys=lookups[key],
-                                                         session=session,
-                                                         center=center)
 
-        return df.aggregate(_agg_cids, axis=1)
+def batch_rows(cells):
+    """Return the (row, value) pairs of the non-empty cells of a column."""
 
+    cells = cells.astype(object)
+    rows = pd.DataFrame({'row': np.arange(len(cells)),
+                         'value': cells.to_numpy()})
+    return rows[rows['value'] != '']
+
+
+def batch_result(matches, index):
+    """
+    Combine DataFrames of (row, consortium_id) matches into the Series
+    returned by `batch_query`, with the given index.
+    """
+
+    with profiling.phase('aggregate'):
+        matches = pd.concat(matches, ignore_index=True).drop_duplicates()
+        result = np.full(len(index), None, dtype=object)
+        ambiguous = matches['row'].duplicated(keep=False)
+        single = matches[~ambiguous]
+        result[single['row'].to_numpy()] = single['consortium_id'].to_numpy()
+
+        # Rows matching several participants get a sorted list of Consortium
+        # IDs
+        ambiguous = matches[ambiguous].sort_values(['row', 'consortium_id'])
+        rows = ambiguous['row'].to_numpy()
+        if len(rows):
+            bounds = np.flatnonzero(np.diff(rows)) + 1
+            cids = np.split(ambiguous['consortium_id'].to_numpy(), bounds)
+            for row, group in zip(rows[np.r_[0, bounds]], cids):
+                result[row] = group.tolist()
+
+    return pd.Series(result, index=index)
 
-def make_primary(alias):
-    """Make alias the primary Consortium ID for that participant."""
 
+# Consortium IDs matching db.CID_PATTERN
+CID_REGEX = re.compile(fnmatch.translate(db.CID_PATTERN))
+
+
+def _existing(session, column, values):
+    """Return the subset of values found in column."""
+
+    values = list(values)
+    found = set()
+    for i in range(0, len(values), CHUNK_SIZE):
+        found.update(session.scalars(
+            select(column).where(column.in_(values[i:i + CHUNK_SIZE]))
+        ))
+    return found
+
+
+def _conflict_frame(pairs, conflicts):
+    """Return the rows of pairs with a conflict, along with its message."""
+
+    conflicts = conflicts.dropna()
+    return (pairs.loc[conflicts.index].assign(conflict=conflicts)
+            .reset_index(drop=True))
+
+
+def _rekey(session, mapping):
+    """
+    Change the Consortium IDs of participants (old -> new in mapping) and of
+    all rows referencing them, including spouses, with one UPDATE per table
+    and chunk.
+    """
+
+    cid = db.RegisteredParticipant.__table__.c.consortium_id
+    # Spouses hold Consortium IDs without a foreign key
+    spouse = cid.table.c.spouse
+    tables = [cid.table] + [
+        table for table in db.Base.metadata.sorted_tables
+        if any(fk.column is cid for fk in table.foreign_keys)
+    ]
+    items = list(mapping.items())
+    for i in range(0, len(items), CHUNK_SIZE):
+        chunk = dict(items[i:i + CHUNK_SIZE])
+        for table in tables:
+            session.execute(
+                update(table)
+                .where(table.c.consortium_id.in_(chunk))
+                .values(consortium_id=case(chunk, value=table.c.consortium_id))
+            )
+        session.execute(
+            update(cid.table)
+            .where(spouse.in_(chunk))
+            .values(spouse=case(chunk, value=spouse))
+        )
+
+
+def add_aliases(pairs, dry_run=False):
+    """
+    Add aliases for many registered participants in one transaction.
+
+    Parameters
+    ----------
+    pairs : DataFrame or list of (consortium_id, alias)
+        Primary Consortium ID of each participant and its new alias.
+    dry_run : bool, default False
+        Only check for conflicts.
+
+    Returns
+    -------
+    DataFrame
+        consortium_id, alias and conflict message of every pair that cannot
+        be added. Nothing is written unless this is empty.
+    """
+
+    pairs = pd.DataFrame(pairs, dtype=object)
+    if pairs.empty:
+        return pd.DataFrame(columns=['consortium_id', 'alias', 'conflict'],
+                            dtype=object)
+    pairs.columns = ['consortium_id', 'alias']
+    pairs = pairs.apply(lambda column: column.str.strip())
+    cids, aliases = pairs['consortium_id'], pairs['alias']
+
+    primary = db.RegisteredParticipant.consortium_id
     with Session(db.engine) as session, session.begin():
-        try:
-            p = session.scalars(
-                select(db.Alias)
-                .where(db.Alias.alias == alias)
-            ).one().participant
-        except NoResultFound:
-            raise Exception(f'Alias "{alias}" not found')
+        participants = _existing(session, primary, set(cids))
+        in_use = (_existing(session, primary, set(aliases))
+                  | _existing(session, db.Alias.alias, set(aliases)))
 
-        props = {k: v for k, v in vars(p).items()
-                 if k not in ['_sa_instance_state', 'consortium_id', 'center']}
-        relations = [r for r in
-                     inspect(db.RegisteredParticipant).relationships.items()
-                     if r[0] not in ['aliases', 'center']]
+        # Checked in order, reporting the first conflict of each pair
+        conflicts = pd.Series(None, index=pairs.index, dtype=object)
+        for mask, message in [
+            (~cids.isin(participants), 'Participant "{0}" not found'),
+            (~aliases.str.fullmatch(CID_REGEX, na=False),
+             'Invalid Consortium ID "{1}"'),
+            (aliases.isin(in_use), 'Consortium ID "{1}" already in use'),
+            (aliases.duplicated(keep=False),
+             'Consortium ID "{1}" listed more than once'),
+        ]:
+            mask &= conflicts.isna()
+            conflicts[mask] = [message.format(*row)
+                               for row in pairs[mask].itertuples(index=False)]
+        conflicts = _conflict_frame(pairs, conflicts)
 
-        new = db.RegisteredParticipant(consortium_id=alias, center=p.center)
-        session.add(new)
+        if conflicts.empty and not pairs.empty and not dry_run:
+            # Checked here, so that dry runs work on read-only snapshots
+            db.check_writable()
+            session.execute(insert(db.Alias.__table__),
+                            pairs.to_dict('records'))
+            _reindex(session, cids)
+    forget_fingerprints()
+    return conflicts
 
-        aliases = []
-        for a in p.aliases:
-            if a.alias != alias:
-                aliases.append(a)
-        new.aliases = aliases + [db.Alias(alias=p.consortium_id)]
 
-        for r in relations:
-            setattr(new, r[0], getattr(p, r[0]))
+def make_primaries(aliases, dry_run=False):
+    """
+    Make many aliases the primary Consortium IDs of their participants in
+    one transaction.
 
-        session.delete(p)
-        session.flush()
+    Each participant and its child rows are re-keyed in place with bulk
+    UPDATEs, and its previous Consortium ID becomes an alias.
 
-        for k, v in props.items():
-            setattr(new, k, v)
+    Parameters
+    ----------
+    aliases : list-like of str
+    dry_run : bool, default False
+        Only check for conflicts.
+
+    Returns
+    -------
+    DataFrame
+        consortium_id, alias and conflict message of every alias that cannot
+        be made primary. Nothing is written unless this is empty.
+    """
+
+    aliases = pd.Series(list(aliases), dtype=object).str.strip()
+
+    with Session(db.engine) as session, session.begin():
+        owners = {}
+        values = aliases.drop_duplicates().tolist()
+        for i in range(0, len(values), CHUNK_SIZE):
+            owners.update(session.execute(
+                select(db.Alias.alias, db.Alias.consortium_id)
+                .where(db.Alias.alias.in_(values[i:i + CHUNK_SIZE]))
+            ).all())
+        pairs = pd.DataFrame({'consortium_id': aliases.map(owners),
+                              'alias': aliases})
+        primary = _existing(session, db.RegisteredParticipant.consortium_id,
+                            set(aliases))
+
+        conflicts = pd.Series(None, index=pairs.index, dtype=object)
+        for mask, message in [
+            (pairs['consortium_id'].isna(), 'Alias "{1}" not found'),
+            (aliases.isin(primary), 'Consortium ID "{1}" already in use'),
+            (aliases.duplicated(keep=False),
+             'Alias "{1}" listed more than once'),
+            (pairs['consortium_id'].duplicated(keep=False),
+             'Participant "{0}" listed more than once'),
+        ]:
+            mask &= conflicts.isna()
+            conflicts[mask] = [message.format(*row)
+                               for row in pairs[mask].itertuples(index=False)]
+        conflicts = _conflict_frame(pairs, conflicts)
+
+        if conflicts.empty and not pairs.empty and not dry_run:
+            db.check_writable()
+            for i in range(0, len(values), CHUNK_SIZE):
+                session.execute(delete(db.Alias.__table__).where(
+                    db.Alias.alias.in_(values[i:i + CHUNK_SIZE])
+                ))
+            _rekey(session, dict(zip(pairs['consortium_id'], pairs['alias'])))
+            # The previous Consortium IDs become aliases
+            session.execute(insert(db.Alias.__table__), [
+                {'alias': cid, 'consortium_id': alias}
+                for cid, alias in zip(pairs['consortium_id'], pairs['alias'])
+            ])
+            _reindex(session, [*pairs['consortium_id'], *pairs['alias']])
+    forget_fingerprints()
+    return conflicts
+
+
+def make_primary(alias):
+    """Make alias the primary Consortium ID for that participant."""
+
+    conflicts = make_primaries([alias])
+    if not conflicts.empty:
+        raise Exception(conflicts['conflict'][0])
 
 
 def add_alias(consortium_id, alias):
     """Add alias for existing registered participant."""
 
-    with Session(db.engine) as session, session.begin():
-        try:
-            p = (session.scalars(
-                select(db.RegisteredParticipant)
-                .where(db.RegisteredParticipant.consortium_id == consortium_id)
-            ).one())
-        except NoResultFound:
-            raise Exception(f'Participant "{consortium_id}" not found')
-
-        if get_participants(alias, [(db.RegisteredParticipant,
-                                     db.RegisteredParticipant.consortium_id),
-                                    (db.Alias, db.Alias.alias)], session):
-            raise Exception(f'Consortium ID "{alias}" already in use')
-        else:
-            p.aliases.append(db.Alias(alias=alias))
+    conflicts = add_aliases([(consortium_id, alias)])
+    if not conflicts.empty:
+        raise Exception(conflicts['conflict'][0])
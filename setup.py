@@ -15,8 +15,12 @@ setup(
     author='Christopher Tastad',
     author_email='christopher.tastad@mssm.edu',
     license='MIT',
-    packages=find_namespace_packages(where='.'),
+    packages=find_namespace_packages(where='.', include=['id_search*']),
     install_requires=read_requirements(),
+    extras_require={
+        'parquet': ['pyarrow'],
+        'async': ['aiosqlite'],
+    },
     include_package_data=True,  # Ensure package data is included
     entry_points={
         'console_scripts': [
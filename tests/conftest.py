@@ -0,0 +1,121 @@
+"""Fixtures for tests against a small synthetic database."""
+
+import os
+import shutil
+import sys
+import tempfile
+
+import pandas as pd
+import pytest
+from sqlalchemy import select
+
+from id_search import config
+
+# db.engine is created when id_search.db is first imported, so bind it to
+# the test database before any test module imports it
+DB_PATH = os.path.join(tempfile.mkdtemp(prefix='id-search-tests-'), 'test.db')
+config.set({'db-url': f'sqlite:///{DB_PATH}',
+            'snapshot': {'enabled': False},
+            'identifier-cache': False})
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..',
+                                'benchmarks'))
+import synthetic  # noqa: E402
+from id_search import cache, db, utils  # noqa: E402
+
+PARTICIPANTS = 400
+# Values matching no participant, in the formats of several lookup keys
+UNKNOWN = ['Z999999-999999', 'DNA99999999', 'not an id', '0']
+
+
+@pytest.fixture
+def reset_caches():
+    """Return a function forgetting what lookups know about the database."""
+    def reset():
+        utils.forget_tables()
+        cache.clear_caches()
+        cache.forget_fingerprints()
+    return reset
+
+
+@pytest.fixture(scope='session')
+def synthetic_db(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('synthetic') / 'synthetic.db')
+    synthetic.generate(path, PARTICIPANTS, seed=1)
+    return path
+
+
+@pytest.fixture
+def database(synthetic_db, reset_caches):
+    """A fresh copy of the synthetic database behind db.engine."""
+    db.engine.dispose()
+    shutil.copyfile(synthetic_db, DB_PATH)
+    reset_caches()
+    yield DB_PATH
+    config.set({'identifier-cache': False})
+    db.engine.dispose()
+    reset_caches()
+
+
+@pytest.fixture
+def snapshot(database, monkeypatch, reset_caches):
+    """Open the database as a read-only snapshot, as snapshot mode does."""
+    engine = db.readonly_engine(immutable=True)
+    monkeypatch.setattr(db, 'engine', engine)
+    monkeypatch.setattr(db, 'snapshot', True)
+    reset_caches()
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def identifiers():
+    """
+    Return a function reading (value, kind, center_id, consortium_id) of
+    every identifier in the database.
+    """
+    def read():
+        with db.engine.connect() as conn:
+            return [tuple(row) for stmt in utils.identifier_selects()
+                    for row in conn.execute(stmt)]
+    return read
+
+
+class Sample:
+    """Identifiers of every kind drawn from the database, with their matches."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.values = list(dict.fromkeys(row[0] for row in rows[::7]))
+        self.values += UNKNOWN
+        # The center of a participant matched by some of the values
+        self.center_id = rows[0][2]
+        with db.engine.connect() as conn:
+            self.center = conn.scalar(
+                select(db.Center.name)
+                .where(db.Center.id == self.center_id)
+            )
+
+    def series(self):
+        return pd.Series(self.values, dtype=object)
+
+    def matches(self, restricted=False):
+        """Consortium IDs matched by each value, read from identifier rows."""
+        matches = {value: set() for value in self.values}
+        for value, kind, center_id, cid in self.rows:
+            if (value in matches
+                    and (not restricted or center_id == self.center_id)):
+                matches[value].add(cid)
+        return [matches[value] for value in self.values]
+
+    @staticmethod
+    def as_sets(result):
+        """Sets of Consortium IDs of each row of a batch_query result."""
+        return [{cids} if isinstance(cids, str)
+                else set(cids) if cids is not None else set()
+                for cids in result]
+
+
+@pytest.fixture
+def sample(database, identifiers):
+    return Sample(identifiers())
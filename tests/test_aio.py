@@ -0,0 +1,122 @@
+"""The async service matches blocking lookups and coalesces requests."""
+
+import asyncio
+
+import pandas as pd
+import pytest
+from sqlalchemy.orm import Session
+
+from id_search import CenterNotFound, db, utils
+
+pytest.importorskip('aiosqlite')
+from id_search import aio  # noqa: E402
+
+
+def run(fn, **kwargs):
+    """Run fn(service) in a new event loop, with a warmed service."""
+    async def main():
+        async with aio.AsyncLookupService(**kwargs) as service:
+            return await fn(service)
+    return asyncio.run(main())
+
+
+def records(values, center=None):
+    with Session(db.engine) as session:
+        return utils.lookup_records(values, utils.lookups['all'], session,
+                                    center)
+
+
+def normalize(df):
+    """Value and Consortium ID pairs, with sorted collections."""
+    df = df.sort_values(['value', 'consortium_id']).reset_index(drop=True)
+    for name in utils.COLLECTION_IDS:
+        df[name] = df[name].map(sorted)
+    return df[['value', 'consortium_id', 'center', *utils.COLLECTION_IDS]]
+
+
+@pytest.mark.parametrize('restricted', [False, True])
+def test_lookup(sample, restricted):
+    center = sample.center if restricted else None
+    values = sample.values + ['not an id']
+
+    async def lookup(service):
+        return await service.lookup(values, center=center)
+
+    df = run(lookup)
+    assert list(df.columns) == ['value', *utils.record_types()]
+    pd.testing.assert_frame_equal(normalize(df),
+                                  normalize(records(values, center)))
+
+
+def test_resolve(sample):
+    async def resolve(service):
+        matched = await service.resolve(sample.values)
+        single = await service.get_participants(sample.values[0])
+        return matched, single
+
+    matched, single = run(resolve)
+    assert list(matched) == sample.values
+    assert [set(cids) for cids in matched.values()] == sample.matches()
+    found = {record['consortium_id'] for record in single}
+    assert found == sample.matches()[0]
+
+
+def test_coalescing(sample, monkeypatch):
+    batches = []
+    resolve = utils.resolve
+
+    def counted(values, *args, **kwargs):
+        batches.append(list(values))
+        return resolve(values, *args, **kwargs)
+
+    monkeypatch.setattr(utils, 'resolve', counted)
+    halves = [sample.values[::2], sample.values[1::2], sample.values[::2]]
+
+    async def concurrent(service):
+        return await asyncio.gather(*(service.resolve(values)
+                                      for values in halves))
+
+    results = run(concurrent, window=0.01)
+    # One query for all requests, each value queried once
+    assert len(batches) == 1
+    assert sorted(batches[0]) == sorted(set(sample.values))
+    assert results[0] == results[2]
+    expected = dict(zip(sample.values, sample.matches()))
+    for values, matched in zip(halves, results):
+        found = {value: set(cids) for value, cids in matched.items()}
+        assert found == {value: expected[value] for value in values}
+
+
+def test_coalescer_errors():
+    calls = []
+
+    async def resolve(batch):
+        calls.append(batch)
+        raise Exception('Lookup failed')
+
+    async def main():
+        coalescer = aio.Coalescer(resolve)
+        results = await asyncio.gather(coalescer.get(['a']),
+                                       coalescer.get(['a', 'b']),
+                                       return_exceptions=True)
+        # Failed values are not kept, and are queried again
+        with pytest.raises(Exception, match='Lookup failed'):
+            await coalescer.get(['a'])
+        return results
+
+    results = asyncio.run(main())
+    assert [str(e) for e in results] == ['Lookup failed'] * 2
+    assert calls == [['a', 'b'], ['a']]
+
+
+def test_errors(database):
+    async def unknown_index(service):
+        await service.lookup(['DNA'], index='nope')
+
+    async def unknown_center(service):
+        await service.lookup(['DNA'], center='No center')
+
+    with pytest.raises(ValueError, match='Unknown index "nope"'):
+        run(unknown_index)
+    with pytest.raises(CenterNotFound):
+        run(unknown_center)
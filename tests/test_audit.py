@@ -0,0 +1,80 @@
+"""The audit reports conflicts, and shared center-scoped IDs as warnings."""
+
+import sqlite3
+
+import pandas as pd
+import pytest
+from click.testing import CliRunner
+
+from id_search import audit
+from id_search.cli import cli
+
+
+def execute(database, *statements):
+    """Write rows that the schema would reject, as a faulty load would."""
+    with sqlite3.connect(database) as conn:
+        for statement in statements:
+            conn.execute(statement)
+    conn.close()
+
+
+@pytest.fixture
+def clean(database):
+    """The database without the LCLs, whose K numbers are ambiguous."""
+    execute(database, 'DELETE FROM rutgers_lcl')
+    return database
+
+
+def run_audit(tmp_path):
+    path = str(tmp_path / 'audit.csv')
+    counts = audit.audit(path, chunk_size=100)
+    return counts, pd.read_csv(path, dtype=str, keep_default_na=False)
+
+
+def test_center_scoped_kinds():
+    assert sorted(audit.center_scoped_kinds()) == [
+        'local_dna_sample.id',
+        'registered_participant.local_id',
+        'registered_participant.ped_ind_id',
+    ]
+
+
+def test_shared_ids_are_warnings(clean, tmp_path):
+    counts, df = run_audit(tmp_path)
+    assert set(counts) == {'shared'}
+    assert counts['shared'] == len(df)
+    assert set(df['kind']) <= set(audit.center_scoped_kinds())
+    assert set(df['detail']) == {'across centers'}
+
+
+def test_conflicts(clean, tmp_path):
+    with sqlite3.connect(clean) as conn:
+        cid, other = [row[0] for row in conn.execute(
+            'SELECT consortium_id FROM registered_participant LIMIT 2'
+        )]
+    conn.close()
+    execute(clean,
+            f"INSERT INTO alias VALUES ('{other}', '{cid}')",
+            "INSERT INTO dna_sample (id, consortium_id) "
+            "VALUES ('DNA99999999', 'Z999999-999999')")
+
+    counts, df = run_audit(tmp_path)
+    assert counts['alias'] == 1
+    assert counts['dangling_fk'] == 1
+    ambiguous = df[df['check'] == 'ambiguous']
+    assert set(ambiguous['value']) == {other}
+    assert set(ambiguous['consortium_id']) == {cid, other}
+    assert sum(counts.values()) == len(df)
+
+
+def test_cli(clean, tmp_path):
+    path = str(tmp_path / 'audit.csv')
+    result = CliRunner().invoke(cli, ['audit', '-o', path])
+    assert result.exit_code == 0, result.output
+    assert '(warning)' in result.output
+
+    execute(clean, "INSERT INTO dna_sample (id, consortium_id) "
+                   "VALUES ('DNA99999999', 'Z999999-999999')")
+    result = CliRunner().invoke(cli, ['audit', '-o', path])
+    assert result.exit_code == 1
+    assert '1 conflicts found' in result.output
@@ -0,0 +1,45 @@
+"""batch_query resolves identifiers with set-based queries."""
+
+import pandas as pd
+import pytest
+
+from id_search import CenterNotFound, utils
+
+
+@pytest.mark.parametrize('restricted', [False, True])
+def test_matches_identifiers(sample, restricted):
+    center = sample.center if restricted else None
+    result = utils.batch_query(sample.series(), 'all', center)
+    assert sample.as_sets(result) == sample.matches(restricted)
+
+
+def test_keeps_index(sample):
+    values = sample.series()
+    values.index = values.index * 10 + 5
+    result = utils.batch_query(values)
+    assert result.index.equals(values.index)
+
+
+def test_columns(database, identifiers):
+    rows = identifiers()
+    dna = next(row for row in rows if row[1] == 'dna_sample.id')
+    cid = next(row for row in rows if row[1] == 'registered_participant.'
+               'consortium_id' and row[3] != dna[3])
+    values = pd.DataFrame({'sample': [dna[0], None, 'nope', dna[0]],
+                           'cid': [None, cid[0], 'nope', cid[0]]})
+
+    result = utils.batch_query(values, ['dna_sample.id',
+                                        'registered_participant.consortium_id'])
+    assert result.tolist() == [dna[3], cid[3], None,
+                               sorted([dna[3], cid[3]])]
+
+
+def test_key_per_column(database):
+    values = pd.DataFrame({'a': ['x'], 'b': ['y']})
+    with pytest.raises(Exception, match='Number of keys'):
+        utils.batch_query(values, ['all'])
+
+
+def test_unknown_center(database):
+    with pytest.raises(CenterNotFound):
+        utils.batch_query(pd.Series(['DNA00000001']), 'all', 'No center')
@@ -0,0 +1,53 @@
+"""Commands report invalid options as usage errors."""
+
+import pandas as pd
+import pytest
+from click.testing import CliRunner
+
+from id_search.cli import cli
+
+
+def run(*args):
+    return CliRunner().invoke(cli, list(args))
+
+
+@pytest.fixture
+def manifest(tmp_path, sample):
+    path = tmp_path / 'manifest.csv'
+    values = sample.values
+    pd.DataFrame({'a': values, 'b': values[::-1]}).to_csv(path, index=False)
+    return str(path)
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_batch_query(manifest, sample, tmp_path, workers):
+    output = str(tmp_path / 'out.csv')
+    result = run('batch-query', '-k', 'a', '-w', str(workers), '-o', output,
+                 manifest)
+    assert result.exit_code == 0, result.output
+    df = pd.read_csv(output, dtype=str, keep_default_na=False)
+    assert df['a'].tolist() == sample.values
+    # Several matches are written as a list
+    found = [set(cids.strip("[]").replace("'", '').split(', ')) - {''}
+             for cids in df['consortium_id']]
+    assert found == sample.matches()
+
+
+@pytest.mark.parametrize('args, message', [
+    (['-i', 'nope'], "Invalid value for --index: nope (choose from"),
+    (['-i', 'all', '-i', 'all', '-i', 'all'],
+     "3 indices given for 2 columns"),
+    (['-k', 'c'], "Invalid value for --column: c not found"),
+])
+def test_batch_query_options(manifest, args, message):
+    result = run('batch-query', *args, manifest)
+    assert result.exit_code == 2
+    assert message in result.output
+
+
+@pytest.mark.parametrize('command', ['lookup', 'expand', 'relatives',
+                                     'search'])
+def test_unknown_index(database, command):
+    result = run(command, '-i', 'nope', 'A000001-000001')
+    assert result.exit_code == 2
+    assert "Invalid value for --index: nope (choose from" in result.output
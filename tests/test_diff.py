@@ -0,0 +1,117 @@
+"""
+The diff of two snapshots turns the old one into the new one, and lists
+the participants re-keyed to one of their aliases.
+"""
+
+import json
+import shutil
+import sqlite3
+
+import pytest
+from click.testing import CliRunner
+
+from id_search import db, diff, utils
+from id_search.cli import cli
+
+
+def read(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def rows(path):
+    """Rows of every table of a database, as sets."""
+    with sqlite3.connect(path) as conn:
+        tables = {table.name: set(conn.execute(f'SELECT * FROM {table.name}'))
+                  for table in db.Base.metadata.sorted_tables}
+    conn.close()
+    return tables
+
+
+def apply(path, records):
+    """Apply the add, remove and change records of a diff to a database."""
+    def where(key):
+        return (' AND '.join(f'{c} = ?' for c in key), list(key.values()))
+
+    with sqlite3.connect(path) as conn:
+        for op in ['remove', 'add', 'change']:
+            for r in records:
+                if r['op'] != op:
+                    continue
+                if op == 'remove':
+                    clause, params = where(r['key'])
+                    conn.execute(f'DELETE FROM {r["table"]} WHERE {clause}',
+                                 params)
+                elif op == 'add':
+                    names = ', '.join(r['row'])
+                    marks = ', '.join('?' * len(r['row']))
+                    conn.execute(f'INSERT INTO {r["table"]} ({names}) '
+                                 f'VALUES ({marks})', list(r['row'].values()))
+                else:
+                    clause, params = where(r['key'])
+                    changes = ', '.join(f'{c} = ?' for c in r['changes'])
+                    conn.execute(
+                        f'UPDATE {r["table"]} SET {changes} WHERE {clause}',
+                        [new for _, new in r['changes'].values()] + params
+                    )
+    conn.close()
+
+
+@pytest.fixture
+def changed(database, synthetic_db):
+    """Write to the database, returning the re-keyed Consortium IDs."""
+    with sqlite3.connect(database) as conn:
+        alias, cid = conn.execute(
+            'SELECT alias, consortium_id FROM alias LIMIT 1'
+        ).fetchone()
+        conn.execute('UPDATE registered_participant SET yob = 1950 '
+                     'WHERE consortium_id = (SELECT min(consortium_id) '
+                     'FROM registered_participant)')
+        conn.execute('DELETE FROM dna_sample WHERE id = '
+                     '(SELECT min(id) FROM dna_sample)')
+    conn.close()
+    utils.make_primary(alias)
+    return cid, alias
+
+
+def test_diff(changed, synthetic_db, database, tmp_path):
+    path = str(tmp_path / 'changes.jsonl')
+    counts = diff.diff(synthetic_db, database, path)
+    records = read(path)
+    assert sum(counts.values()) == len(records)
+
+    cid, alias = changed
+    rekeys = [r for r in records if r['op'] == 'rekey']
+    assert rekeys == [{'table': 'registered_participant', 'op': 'rekey',
+                       'old': cid, 'new': alias}]
+    assert counts['dna_sample', 'remove'] >= 1
+    changes = [r['changes'] for r in records if r['op'] == 'change'
+               and r['table'] == 'registered_participant']
+    assert {'yob'} in [set(c) for c in changes]
+
+    copy = str(tmp_path / 'old.db')
+    shutil.copyfile(synthetic_db, copy)
+    apply(copy, records)
+    assert rows(copy) == rows(database)
+
+
+def test_no_changes(database, synthetic_db, tmp_path):
+    path = str(tmp_path / 'changes.jsonl')
+    assert diff.diff(synthetic_db, database, path) == {}
+    assert read(path) == []
+
+
+def test_missing_tables(database, tmp_path):
+    empty = str(tmp_path / 'empty.db')
+    sqlite3.connect(empty).close()
+    with pytest.raises(Exception, match='Tables missing from NEW database'):
+        diff.diff(database, empty, str(tmp_path / 'changes.jsonl'))
+
+
+def test_cli(changed, synthetic_db, database, tmp_path):
+    path = str(tmp_path / 'out' / 'changes.jsonl')
+    result = CliRunner().invoke(cli, ['diff', '-o', path, synthetic_db,
+                                      database])
+    assert result.exit_code == 0, result.output
+    assert 'registered_participant: 1 rekey' in result.output
+    assert f'changes saved to {path}' in result.output
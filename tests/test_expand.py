@@ -0,0 +1,65 @@
+"""expand lists every identifier linked to the participants of each value."""
+
+import pandas as pd
+import pytest
+from click.testing import CliRunner
+from sqlalchemy.orm import Session
+
+from id_search import db, utils
+from id_search.cli import cli
+
+COLUMNS = ['input', 'consortium_id', 'id_kind', 'id_value']
+
+
+def expand(values, center=None):
+    with Session(db.engine) as session:
+        return utils.expand(values, utils.lookups['all'], session, center)
+
+
+def expected_rows(sample, restricted=False):
+    """(input, consortium_id, id_kind, id_value) rows from identifier rows."""
+    owned = {}
+    for value, kind, _, cid in sample.rows:
+        owned.setdefault(cid, set()).add((kind, value))
+    return {(value, cid, kind, linked)
+            for value, cids in zip(sample.values, sample.matches(restricted))
+            for cid in cids for kind, linked in owned[cid]}
+
+
+@pytest.mark.parametrize('restricted', [False, True])
+def test_expand(sample, restricted):
+    df = expand(sample.values, sample.center if restricted else None)
+    assert list(df.columns) == COLUMNS
+    rows = set(df.itertuples(index=False, name=None))
+    assert rows == expected_rows(sample, restricted)
+    assert not df.duplicated().any()
+
+
+def test_order(sample):
+    df = expand(sample.values)
+    order = {value: i for i, value in enumerate(sample.values)}
+    kinds = {utils.kind_name(table, column): i
+             for i, (table, column) in enumerate(utils.lookups['all'])}
+    # Inputs in order, each participant's identifiers in order of lookups
+    assert df['input'].map(order).is_monotonic_increasing
+    for _, rows in df.groupby(['input', 'consortium_id'], sort=False):
+        assert rows['id_kind'].map(kinds).is_monotonic_increasing
+
+
+def test_no_matches(database):
+    df = expand(['not an id'])
+    assert df.empty and list(df.columns) == COLUMNS
+    with Session(db.engine) as session:
+        linked = utils.linked_identifiers([], session)
+    assert list(linked.columns) == COLUMNS[1:]
+
+
+def test_cli(sample, tmp_path):
+    source = tmp_path / 'values.txt'
+    source.write_text('\n'.join(sample.values) + '\n\n')
+    path = str(tmp_path / 'expand.csv')
+    result = CliRunner().invoke(cli, ['expand', '--input', str(source),
+                                      '--chunk-size', '50', '-o', path])
+    assert result.exit_code == 0, result.output
+    df = pd.read_csv(path, dtype=str)
+    assert set(df.itertuples(index=False, name=None)) == expected_rows(sample)
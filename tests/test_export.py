@@ -0,0 +1,85 @@
+"""Export writes one denormalized row per participant, chunk by chunk."""
+
+import sqlite3
+
+import pandas as pd
+import pytest
+from click.testing import CliRunner
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from id_search import CenterNotFound, db, export, utils
+from id_search.cli import cli
+
+COMPARED = ['consortium_id', 'center', 'local_id',
+            *utils.COLLECTION_IDS]
+
+
+def reference(center=None):
+    """Records of every participant (of center), as lookups return them."""
+    p = db.RegisteredParticipant
+    with Session(db.engine) as session:
+        stmt = select(p.consortium_id)
+        if center is not None:
+            stmt = stmt.join(db.Center).where(db.Center.name == center)
+        cids = session.scalars(stmt).all()
+        records = [utils.extract_participant_data(participant)
+                   for participant in utils.load_participants(cids, session)]
+    return normalize(pd.DataFrame(records))
+
+
+def normalize(df):
+    """Compared columns, in Consortium ID order with sorted collections."""
+    df = df[COMPARED].sort_values('consortium_id').reset_index(drop=True)
+    for name in utils.COLLECTION_IDS:
+        df[name] = df[name].map(lambda ids: sorted(map(str, ids)))
+    return df
+
+
+@pytest.mark.parametrize('restricted', [False, True])
+def test_export(sample, tmp_path, restricted):
+    center = sample.center if restricted else None
+    path = str(tmp_path / 'participants.parquet')
+    rows = export.export(path, center=center, chunk_size=37)
+    df = pd.read_parquet(path)
+    assert rows == len(df)
+    assert list(df.columns) == list(utils.record_types())
+    # Rows are written in Consortium ID order
+    assert df['consortium_id'].is_monotonic_increasing
+    pd.testing.assert_frame_equal(normalize(df), reference(center))
+
+
+def test_columns(database, tmp_path):
+    path = str(tmp_path / 'participants.csv.gz')
+    export.export(path, ['center', 'dna_samples'], chunk_size=50)
+    df = pd.read_csv(path)
+    assert list(df.columns) == ['center', 'dna_samples']
+    assert len(df) == len(reference())
+
+    with pytest.raises(Exception, match='Unknown column'):
+        export.export(path, ['nope'])
+    with pytest.raises(CenterNotFound):
+        export.export(path, center='No center')
+
+
+def test_empty_center(database, tmp_path):
+    with sqlite3.connect(database) as conn:
+        conn.execute("INSERT INTO center (name, investigator) "
+                     "VALUES ('Empty', 'Nobody')")
+    conn.close()
+    path = str(tmp_path / 'participants.parquet')
+    assert export.export(path, center='Empty') == 0
+    df = pd.read_parquet(path)
+    assert df.empty and list(df.columns) == list(utils.record_types())
+
+
+def test_cli(database, tmp_path):
+    path = str(tmp_path / 'participants.tsv')
+    result = CliRunner().invoke(cli, ['export', '-k', 'consortium_id',
+                                      '-k', 'aliases', '-o', path])
+    assert result.exit_code == 0, result.output
+    assert len(pd.read_csv(path, sep='\t')) == len(reference())
+
+    result = CliRunner().invoke(cli, ['export', '-k', 'nope', '-o', path])
+    assert result.exit_code == 2
+    assert 'nope (choose from' in result.output
@@ -0,0 +1,115 @@
+"""Family queries read whole pedigrees and walk parents and children."""
+
+import sqlite3
+
+import pandas as pd
+import pytest
+from click.testing import CliRunner
+from sqlalchemy.orm import Session
+
+from id_search import db, families, utils
+from id_search.cli import cli
+
+CID = [(db.RegisteredParticipant, db.RegisteredParticipant.consortium_id)]
+
+
+def participants(database):
+    """Participant rows with family columns, read directly."""
+    with sqlite3.connect(database) as conn:
+        df = pd.read_sql('SELECT consortium_id, family_id, individual_id, '
+                         'father, mother, spouse FROM registered_participant '
+                         'WHERE family_id IS NOT NULL', conn)
+    conn.close()
+    return df
+
+
+@pytest.fixture
+def family(database):
+    """Members of a family with two parents and several children."""
+    df = participants(database)
+    sizes = df.groupby('family_id').size()
+    family_id = sizes[sizes >= 4].index[0]
+    family = df[df['family_id'] == family_id]
+    return family.set_index('individual_id').sort_index()
+
+
+def relatives(values, depth=1):
+    with Session(db.engine) as session:
+        return families.relatives(values, CID, session, depth=depth)
+
+
+def test_family_members(database, family):
+    family_id = family['family_id'].iloc[0]
+    with Session(db.engine) as session:
+        df = families.family_members([family_id, 'no such family'], session)
+    assert set(df.columns) == set(families.record_types())
+    assert df['individual_id'].tolist() == sorted(family.index)
+    assert df['consortium_id'].tolist() == family['consortium_id'].tolist()
+
+    father, mother = family.loc[[1, 2], 'consortium_id']
+    children = df[df['individual_id'] > 2]
+    assert set(children['father']) == {father}
+    assert set(children['mother']) == {mother}
+    assert df.loc[0, 'spouse'] == mother
+
+    with Session(db.engine) as session:
+        for record in df.itertuples():
+            participant, = utils.load_participants([record.consortium_id],
+                                                   session)
+            samples = [s.id for s in participant.dna_samples]
+            assert sorted(record.dna_samples) == sorted(samples)
+
+
+def test_relatives(database, family):
+    child = family.loc[3, 'consortium_id']
+    df = relatives([child, 'not an id'])
+    assert set(df['value']) == {child}
+    generations = dict(zip(df['consortium_id'], df['generation']))
+    assert generations[child] == 0
+    assert generations[family.loc[1, 'consortium_id']] == -1
+    assert generations[family.loc[2, 'consortium_id']] == -1
+    # Siblings are neither ancestors nor descendants
+    assert set(generations) == {child, family.loc[1, 'consortium_id'],
+                                family.loc[2, 'consortium_id']}
+
+    parent = family.loc[1, 'consortium_id']
+    df = relatives([parent])
+    assert sorted(df['generation']) == [0] + [1] * (len(family) - 2)
+
+
+def test_depth(database, family):
+    # A grandchild through the first child
+    grandparent = family.loc[1, 'consortium_id']
+    grandchild = 'Z000000-000001'
+    with sqlite3.connect(database) as conn:
+        conn.execute(
+            'INSERT INTO registered_participant (consortium_id, center_id, '
+            'family_id, individual_id, father) VALUES (?, 1, ?, 99, 3)',
+            (grandchild, family['family_id'].iloc[0])
+        )
+    conn.close()
+
+    df = relatives([grandparent])
+    assert grandchild not in df['consortium_id'].tolist()
+    df = relatives([grandparent], depth=2)
+    row = df[df['consortium_id'] == grandchild]
+    assert row['generation'].tolist() == [2]
+    df = relatives([grandchild], depth=2)
+    row = df[df['consortium_id'] == grandparent]
+    assert row['generation'].tolist() == [-2]
+
+
+def test_cli(database, family, tmp_path):
+    family_id = family['family_id'].iloc[0]
+    path = str(tmp_path / 'family.csv')
+    result = CliRunner().invoke(cli, ['family', '-o', path, family_id])
+    assert result.exit_code == 0, result.output
+    assert len(pd.read_csv(path)) == len(family)
+
+    path = str(tmp_path / 'relatives.csv')
+    result = CliRunner().invoke(cli, [
+        'relatives', '-i', 'registered_participant.consortium_id',
+        '--depth', '1', '-o', path, family.loc[1, 'consortium_id'],
+    ])
+    assert result.exit_code == 0, result.output
+    assert len(pd.read_csv(path)) == len(family) - 1
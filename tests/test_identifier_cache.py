@@ -0,0 +1,72 @@
+"""The in-memory identifier cache resolves like the database it mirrors."""
+
+import sqlite3
+
+import pytest
+from sqlalchemy.orm import Session
+
+from id_search import cache, config, db, utils
+
+
+@pytest.fixture
+def cached(database):
+    config.set({'identifier-cache': True})
+    return cache.identifier_cache()
+
+
+@pytest.mark.parametrize('restricted', [False, True])
+def test_batch_query(cached, sample, restricted):
+    center = sample.center if restricted else None
+    result = utils.batch_query(sample.series(), 'all', center)
+    assert sample.as_sets(result) == sample.matches(restricted)
+
+
+def test_single_lookups(cached, sample):
+    keys = utils.lookups['all']
+    with Session(db.engine) as session:
+        matches = {value: sorted(utils.get_matches(value, keys, session))
+                  for value in sample.values}
+        participants = {value: utils.get_participants(value, keys, session)
+                        for value in sample.values}
+        config.set({'identifier-cache': False})
+        for value in sample.values:
+            assert matches[value] == sorted(
+                utils.get_matches(value, keys, session)
+            )
+            assert participants[value] == utils.get_participants(value, keys,
+                                                                 session)
+
+
+def test_stale_reads_file_once_per_interval(cached, monkeypatch):
+    reads = []
+    fingerprint = cache.snapshot_fingerprint
+    monkeypatch.setattr(cache, 'snapshot_fingerprint',
+                        lambda path: reads.append(path) or fingerprint(path))
+    cache.forget_fingerprints()
+    for _ in range(100):
+        assert not cached.stale()
+    assert len(reads) == 1
+
+
+def test_rebuilt_after_writes(cached, identifiers):
+    cid = identifiers()[0][3]
+    alias = 'Z000001-000001'
+    assert utils.batch_query([alias]).tolist() == [None]
+
+    # Writes of this process are seen at once
+    assert utils.add_aliases([(cid, alias)]).empty
+    assert utils.batch_query([alias]).tolist() == [cid]
+    assert cache.identifier_cache() is not cached
+
+
+def test_rebuilt_after_writes_of_other_processes(cached, identifiers,
+                                                 monkeypatch):
+    cid = identifiers()[0][3]
+    alias = 'Z000001-000001'
+    assert utils.batch_query([alias]).tolist() == [None]
+
+    with sqlite3.connect(db.engine.url.database) as conn:
+        conn.execute('INSERT INTO alias (alias, consortium_id) VALUES (?, ?)',
+                     (alias, cid))
+    monkeypatch.setattr(cache, 'FINGERPRINT_INTERVAL', 0)
+    assert utils.batch_query([alias]).tolist() == [cid]
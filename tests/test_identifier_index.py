@@ -0,0 +1,70 @@
+"""
+Lookups through the identifier index match lookups of the tables, also
+while other processes build or drop it.
+"""
+
+import multiprocessing
+
+import pytest
+from sqlalchemy.orm import Session
+
+from id_search import cache, db, utils
+from id_search.service import LookupService
+
+
+@pytest.fixture
+def indexed(database):
+    utils.build_index()
+    return database
+
+
+def in_other_process(fn):
+    """Run fn in a forked process, as another command would."""
+    def run():
+        db.engine.dispose(close=False)
+        fn()
+    process = multiprocessing.get_context('fork').Process(target=run)
+    process.start()
+    process.join()
+    assert process.exitcode == 0
+
+
+@pytest.mark.parametrize('restricted', [False, True])
+def test_batch_query(indexed, sample, restricted):
+    assert utils.has_index(db.engine)
+    center = sample.center if restricted else None
+    result = utils.batch_query(sample.series(), 'all', center)
+    assert sample.as_sets(result) == sample.matches(restricted)
+
+
+def test_single_lookups(database, sample):
+    def lookup():
+        with Session(db.engine) as session:
+            return [sorted(utils.get_matches(value, utils.lookups['all'],
+                                             session))
+                    for value in sample.values]
+    expected = lookup()
+    utils.build_index()
+    assert utils.has_index(db.engine)
+    assert lookup() == expected
+
+
+def test_service_survives_drop_index(indexed, sample, monkeypatch):
+    monkeypatch.setattr(cache, 'FINGERPRINT_INTERVAL', 0)
+    service = LookupService()
+    expected = service.lookup(sample.values)
+
+    in_other_process(utils.drop_index)
+    assert not utils.has_index(service.engine)
+    assert service.lookup(sample.values).equals(expected)
+
+
+def test_service_uses_later_index(database, sample, monkeypatch):
+    monkeypatch.setattr(cache, 'FINGERPRINT_INTERVAL', 0)
+    service = LookupService()
+    expected = service.lookup(sample.values)
+    assert not utils.has_index(service.engine)
+
+    in_other_process(utils.build_index)
+    assert utils.has_index(service.engine)
+    assert service.lookup(sample.values).equals(expected)
@@ -0,0 +1,52 @@
+"""ID map files resolve identifiers like the database they were exported from."""
+
+import pandas as pd
+import pytest
+
+from id_search import CenterNotFound, idmap, utils
+
+
+@pytest.fixture
+def exported(database, tmp_path):
+    path = str(tmp_path / 'test.idmap')
+    idmap.export_idmap(path)
+    return idmap.IDMap(path)
+
+
+@pytest.mark.parametrize('restricted', [False, True])
+def test_batch_query(exported, sample, restricted):
+    center = sample.center if restricted else None
+    result = exported.batch_query(sample.series(), 'all', center)
+    assert sample.as_sets(result) == sample.matches(restricted)
+    assert result.equals(utils.batch_query(sample.series(), 'all', center))
+
+
+def test_lookup(exported, sample):
+    assert ([set(exported.lookup(value)) for value in sample.values]
+            == sample.matches())
+
+
+def test_keys(exported, identifiers):
+    rows = identifiers()
+    assert len(exported) == len(rows)
+    dna = next(row for row in rows if row[1] == 'dna_sample.id')
+    values = pd.DataFrame({'sample': [dna[0]], 'cid': [dna[3]]})
+    result = exported.batch_query(values, ['dna_sample.id', 'all'])
+    assert result.tolist() == [dna[3]]
+    # Values are only matched against the identifiers of their key
+    cid_key = 'registered_participant.consortium_id'
+    assert exported.lookup(dna[0], cid_key) == []
+    with pytest.raises(Exception, match='Number of keys'):
+        exported.batch_query(values, ['all'])
+
+
+def test_unknown_center(exported):
+    with pytest.raises(CenterNotFound):
+        exported.lookup('DNA00000001', center='No center')
+
+
+def test_not_an_idmap(tmp_path):
+    path = tmp_path / 'test.idmap'
+    path.write_bytes(b'SQLite format 3\0' + b'\0' * 100)
+    with pytest.raises(Exception, match='is not an ID map file'):
+        idmap.IDMap(str(path))
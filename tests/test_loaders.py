@@ -0,0 +1,92 @@
+"""Loaders validate source files and bulk insert them into their tables."""
+
+import random
+
+import pandas as pd
+import pytest
+from sqlalchemy import func, select
+
+import synthetic
+from id_search import config, db, get_loaders, loaders, utils
+
+
+@pytest.fixture
+def data_dir(database, tmp_path):
+    path = tmp_path / 'data'
+    path.mkdir()
+    previous = config['data-dir'].get(str)
+    config.set({'data-dir': str(path)})
+    yield path
+    config.set({'data-dir': previous})
+
+
+def counts():
+    with db.engine.connect() as conn:
+        return {table.name: conn.scalar(select(func.count())
+                                        .select_from(table))
+                for table in db.Base.metadata.sorted_tables}
+
+
+def new_aliases(n):
+    """Pairs of an existing Consortium ID and a new alias."""
+    with db.engine.connect() as conn:
+        cids = conn.scalars(
+            select(db.RegisteredParticipant.consortium_id).limit(n)
+        ).all()
+        known = set(conn.scalars(select(db.Alias.alias)))
+    aliases = [cid for cid in synthetic._cids(random.Random(5), n + 10)
+               if cid not in known and cid not in cids][:n]
+    return list(zip(cids, aliases))
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_replace_keeps_tables_without_files(data_dir, tmp_path, workers):
+    before = counts()
+    pairs = new_aliases(3)
+    pd.DataFrame(pairs, columns=['consortium_id', 'alias']).to_csv(
+        data_dir / 'alias.csv', index=False
+    )
+
+    loaders.load(get_loaders(), workers=workers, replace=True,
+                 reject_dir=str(tmp_path))
+    after = counts()
+    assert after.pop('alias') == 3
+    before.pop('alias')
+    assert after == before
+
+
+def test_rejects_invalid_records(data_dir, tmp_path):
+    utils.build_index()
+    (cid, alias), = new_aliases(1)
+    pd.DataFrame({
+        'alias': [alias, 'not an id', 'A000001-000001'],
+        'consortium_id': [cid, cid, ''],
+    }).to_csv(data_dir / 'alias.csv', index=False)
+
+    loaders.load(get_loaders(), reject_dir=str(tmp_path))
+    rejected = pd.read_csv(tmp_path / 'rejected_alias.csv', dtype=str)
+    assert rejected['alias'].tolist() == ['not an id', 'A000001-000001']
+    assert rejected['reason'].tolist() == ['Failed check cid',
+                                           'Missing consortium_id']
+    # The identifier index is rebuilt after loading
+    assert utils.has_index(db.engine)
+    assert utils.batch_query(pd.Series([alias])).tolist() == [cid]
+
+
+def test_validator_coerces_types():
+    validator = loaders.Validator(db.RegisteredParticipant.__table__)
+    df = pd.DataFrame({
+        'consortium_id': ['A000001-000001', 'A000002-000002',
+                          'A000003-000003'],
+        'center_id': ['1', '1', '1'],
+        'yob': ['1970', 'nineteen', '1980'],
+        'control': ['yes', 'n', 'maybe'],
+        'registration_date': ['2001-02-03', '', '2001-02-03'],
+    })
+    valid, rejected = validator.validate(df)
+    assert valid.to_dict('records') == [{
+        'consortium_id': 'A000001-000001', 'center_id': 1, 'yob': 1970,
+        'control': 1, 'registration_date': '2001-02-03',
+    }]
+    assert rejected['reason'].tolist() == ['Invalid int in yob',
+                                           'Invalid bool in control']
@@ -0,0 +1,81 @@
+"""
+Participants are hydrated in bulk into the same records as read one by
+one, through the tables, the identifier index and the identifier cache.
+"""
+
+import pandas as pd
+import pytest
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from id_search import config, db, utils
+
+
+@pytest.fixture(params=['plain', 'index', 'cache'])
+def mode(request, database):
+    if request.param == 'index':
+        utils.build_index()
+    elif request.param == 'cache':
+        config.set({'identifier-cache': True})
+    return request.param
+
+
+def reference_records(cids):
+    """Records of participants, loaded one attribute at a time."""
+    p = db.RegisteredParticipant
+    with Session(db.engine) as session:
+        return {
+            participant.consortium_id:
+                sort_collections(utils.extract_participant_data(participant))
+            for participant in session.scalars(
+                select(p).where(p.consortium_id.in_(set(cids)))
+            )
+        }
+
+
+def sort_collections(record):
+    """Child collections are loaded in no particular order."""
+    return {name: sorted(value) if name in utils.COLLECTION_IDS else value
+            for name, value in record.items()}
+
+
+@pytest.mark.parametrize('restricted', [False, True])
+def test_lookup_records(mode, sample, restricted):
+    center = sample.center if restricted else None
+    with Session(db.engine) as session:
+        records = utils.lookup_records(sample.values, utils.lookups['all'],
+                                       session, center)
+
+    assert list(records.columns) == ['value', *utils.record_types()]
+    assert (set(zip(records['value'], records['consortium_id']))
+            == {(value, cid)
+                for value, cids in zip(sample.values,
+                                       sample.matches(restricted))
+                for cid in cids})
+    # Matches are returned in input order
+    order = {value: i for i, value in enumerate(sample.values)}
+    assert records['value'].map(order).is_monotonic_increasing
+
+    participants = reference_records(records['consortium_id'])
+    reference = pd.DataFrame(
+        [{'value': value, **participants[cid]}
+         for value, cid in zip(records['value'], records['consortium_id'])],
+        columns=records.columns
+    )
+    records = pd.DataFrame([sort_collections(record) for record
+                            in records.to_dict('records')],
+                           columns=records.columns)
+    pd.testing.assert_frame_equal(records, reference)
+
+
+def test_get_participants(mode, sample):
+    with Session(db.engine) as session:
+        found = [utils.get_participants(value, utils.lookups['all'], session)
+                 for value in sample.values]
+        assert ([{p.consortium_id for p in result} for result in found]
+                == sample.matches())
+        cids = [p.consortium_id for result in found for p in result]
+        loaded = {p.consortium_id:
+                  sort_collections(utils.extract_participant_data(p))
+                  for p in utils.load_participants(cids, session)}
+    assert loaded == reference_records(cids)
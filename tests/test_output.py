@@ -0,0 +1,70 @@
+"""TableWriter appends chunks to files of every supported format."""
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from id_search.output import TableWriter
+
+TYPES = {'value': str, 'count': int, 'ids': list[str]}
+
+
+def read(path):
+    if path.endswith('.parquet'):
+        return pq.read_table(path).to_pandas()
+    if path.endswith('.arrow'):
+        with pa.ipc.open_file(path) as reader:
+            return reader.read_all().to_pandas()
+    sep = '\t' if '.tsv' in path else ','
+    return pd.read_csv(path, sep=sep)
+
+
+def chunks():
+    yield pd.DataFrame(columns=['value', 'count'])
+    yield pd.DataFrame({'count': [1, 2], 'value': ['a', 'b']})
+    yield pd.DataFrame({'value': ['c'], 'count': [3]})
+
+
+@pytest.mark.parametrize('name', ['out.csv', 'out.tsv', 'out.csv.gz',
+                                  'out.tsv.gz', 'out.parquet', 'out.arrow'])
+def test_formats(tmp_path, name):
+    path = str(tmp_path / 'sub' / name)
+    with TableWriter(path, types=TYPES) as writer:
+        for chunk in chunks():
+            writer.write(chunk)
+    assert writer.rows == 3
+    # Columns are kept in the order of the first chunk
+    expected = pd.DataFrame({'value': ['a', 'b', 'c'], 'count': [1, 2, 3]})
+    pd.testing.assert_frame_equal(read(path), expected)
+
+
+@pytest.mark.parametrize('fmt', ['parquet', 'arrow'])
+def test_schema_from_types(tmp_path, fmt):
+    path = str(tmp_path / f'out.{fmt}')
+    with TableWriter(path, types=TYPES) as writer:
+        # A column holding only nulls in the first chunk takes its type
+        writer.write(pd.DataFrame({'value': ['a'], 'ids': [None]}))
+        writer.write(pd.DataFrame({'value': ['b'], 'ids': [['x', 'y']]}))
+    ids = read(path)['ids'].tolist()
+    assert ids[0] is None and list(ids[1]) == ['x', 'y']
+
+
+@pytest.mark.parametrize('fmt', ['parquet', 'arrow'])
+def test_only_empty_chunks(tmp_path, fmt):
+    path = str(tmp_path / f'out.{fmt}')
+    with TableWriter(path, types=TYPES) as writer:
+        writer.write(pd.DataFrame(columns=['value', 'count']))
+    assert writer.rows == 0
+    if fmt == 'parquet':
+        schema = pq.read_schema(path)
+    else:
+        schema = pa.ipc.open_file(path).schema
+    assert schema.names == ['value', 'count']
+    assert schema.field('count').type == pa.int64()
+
+
+@pytest.mark.parametrize('name', ['out.xlsx', 'out.parquet.gz', 'out'])
+def test_unknown_format(tmp_path, name):
+    with pytest.raises(Exception, match='Unknown output format'):
+        TableWriter(str(tmp_path / name))
@@ -0,0 +1,53 @@
+"""The profiler counts queries, hydrated rows and phases while active."""
+
+from click.testing import CliRunner
+from sqlalchemy.orm import Session
+
+from id_search import db, profiling, utils
+from id_search.cli import cli
+
+
+def lookup(values):
+    with Session(db.engine) as session:
+        return utils.lookup_records(values, utils.lookups['all'], session)
+
+
+def test_profiler(sample):
+    with profiling.Profiler() as profiler:
+        records = lookup(sample.values)
+    stats = profiler.stats()
+
+    assert stats['queries'] > 0
+    assert stats['tables']['registered_participant']['queries'] > 0
+    participants = records['consortium_id'].nunique()
+    assert stats['hydrated']['RegisteredParticipant'] == participants
+    assert {'resolve', 'hydrate', 'extract'} <= set(stats['phases'])
+    assert stats['wall_s'] >= stats['phases']['resolve']['total_s']
+
+    report = profiler.format()
+    assert report.startswith('Wall time: ')
+    assert 'registered_participant' in report
+
+
+def test_inactive(sample):
+    with profiling.Profiler() as profiler:
+        pass
+    lookup(sample.values)
+    stats = profiler.stats()
+    assert stats['queries'] == 0
+    assert stats['hydrated'] == {} and stats['phases'] == {}
+    # Phases are not timed without an active profiler
+    with profiling.phase('resolve'):
+        pass
+
+
+def test_cli_profile(sample, tmp_path):
+    result = CliRunner().invoke(cli, [
+        '--profile', 'lookup', '-i', 'all', '-o', str(tmp_path / 'out.csv'),
+        *sample.values[:5],
+    ])
+    assert result.exit_code == 0, result.output
+    # The report is printed to stderr, after the command's output
+    assert 'Results have been saved' in result.output
+    output = result.output
+    assert output.index('Wall time: ') > output.index('Results have been')
@@ -0,0 +1,44 @@
+"""Identifiers are only looked up by the keys whose format they have."""
+
+import pytest
+from sqlalchemy.orm import Session
+
+from id_search import db, utils
+
+CID = (db.RegisteredParticipant, db.RegisteredParticipant.consortium_id)
+NIDDK = (db.RutgersLCL, db.RutgersLCL.niddk_no)
+LOCAL_ID = (db.RegisteredParticipant, db.RegisteredParticipant.local_id)
+
+
+def test_route():
+    values = ['A000001-000001', '123456', 'x', None]
+    cid, niddk, local_id = utils._route(values, [CID, NIDDK, LOCAL_ID])
+    assert cid.tolist() == [True, False, False, False]
+    assert niddk.tolist() == [False, True, False, False]
+    # Columns without a fixed format take every value
+    assert local_id.all()
+
+
+@pytest.mark.parametrize('statement', [utils.lookup_statement,
+                                       utils.index_statement])
+def test_single_value_statements(statement):
+    assert statement('x', [CID, NIDDK]) is None
+    assert statement('A000001-000001', [CID, NIDDK]) is not None
+    assert statement('123456', [CID, NIDDK]) is not None
+
+
+def test_lookup_statement_queries_matching_keys():
+    keys = [CID, NIDDK, LOCAL_ID]
+    assert len(utils.lookup_statement('123456', keys).selects) == 2
+    assert len(utils.lookup_statement('A000001-000001', keys).selects) == 2
+
+
+@pytest.mark.parametrize('indexed', [False, True])
+def test_get_matches(sample, indexed):
+    if indexed:
+        utils.build_index()
+    with Session(db.engine) as session:
+        matches = [{cid for _, _, cid in utils.get_matches(
+                        value, utils.lookups['all'], session)}
+                   for value in sample.values]
+    assert matches == sample.matches()
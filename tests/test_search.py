@@ -0,0 +1,96 @@
+"""Search finds identifiers that are truncated or mistyped."""
+
+import pytest
+from click.testing import CliRunner
+from sqlalchemy.orm import Session
+
+from id_search import IndexNotBuilt, db, fuzzy, identifiers, utils
+from id_search.cli import cli
+
+DNA = [(db.DNASample, db.DNASample.id)]
+
+
+@pytest.fixture
+def indexed(database):
+    utils.build_index()
+    return database
+
+
+def search(query, keys=None, **kwargs):
+    with Session(db.engine) as session:
+        return fuzzy.search(query, keys or utils.lookups['all'], session,
+                            **kwargs)
+
+
+def first(identifiers, kind):
+    return next(row for row in identifiers() if row[1] == kind)
+
+
+def transpose(value):
+    """Swap the last two differing adjacent characters of value."""
+    for i in range(len(value) - 2, -1, -1):
+        if value[i] != value[i + 1]:
+            return value[:i] + value[i + 1] + value[i] + value[i + 2:]
+
+
+def test_edit_distance():
+    assert identifiers.edit_distance('DNA123', 'DNA123') == 0
+    assert identifiers.edit_distance('DNA123', 'DNA213') == 1
+    assert identifiers.edit_distance('DNA123', 'DNA12') == 1
+    assert identifiers.edit_distance('DNA123', 'XYZ', limit=1) == 2
+
+
+def test_exact_and_prefix(indexed, identifiers):
+    value, kind, _, cid = first(identifiers,
+                                'registered_participant.consortium_id')
+    df = search(value)
+    assert df.iloc[0][['value', 'kind', 'consortium_id', 'match',
+                       'distance']].tolist() == [value, kind, cid, 'exact', 0]
+
+    df = search(value[:9])
+    assert value in df['value'].tolist()
+    assert set(df['match']) == {'prefix'}
+    assert df['distance'].is_monotonic_increasing
+
+
+@pytest.mark.parametrize('typo', [transpose, lambda v: v.replace('-', '')])
+def test_fuzzy(indexed, identifiers, typo):
+    value, kind, _, cid = first(identifiers,
+                                'registered_participant.consortium_id')
+    df = search(typo(value))
+    row = df[df['value'] == value].iloc[0]
+    assert (row['match'], row['distance']) == ('fuzzy', 1)
+    assert row['consortium_id'] == cid
+
+
+def test_options(indexed, sample, identifiers):
+    value = first(identifiers, 'dna_sample.id')[0]
+    df = search(value[:5], DNA, limit=5)
+    assert len(df) == 5
+    assert set(df['kind']) == {'dna_sample.id'}
+
+    centers = {(value, kind): center for value, kind, center, _ in sample.rows}
+    df = search(value[:5], center=sample.center)
+    assert not df.empty
+    found = {centers[key] for key in zip(df['value'], df['kind'])}
+    assert found == {sample.center_id}
+
+
+def test_without_trigram_index(indexed, identifiers):
+    with db.engine.begin() as conn:
+        conn.exec_driver_sql(f'DROP TABLE {db.search_index}')
+    utils.forget_tables()
+    value = first(identifiers, 'dna_sample.id')[0]
+    assert not utils.has_search_index(db.engine)
+    # Identifiers next to the query in sorted order are still found
+    df = search(value[:-1] + 'X')
+    row = df[df['value'] == value].iloc[0]
+    assert (row['match'], row['distance']) == ('fuzzy', 1)
+
+
+def test_index_not_built(database):
+    with pytest.raises(IndexNotBuilt):
+        search('DNA')
+    result = CliRunner().invoke(cli, ['search', 'DNA'])
+    assert result.exit_code == 1
+    assert 'build-index' in result.output
@@ -0,0 +1,115 @@
+"""LookupService and the web app answer lookups across many requests."""
+
+import importlib.util
+import io
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pytest
+
+from id_search import CenterNotFound, config
+from id_search.service import LookupService
+
+APP = os.path.join(os.path.dirname(__file__), '..', 'web-app', 'id-tool.py')
+
+
+@pytest.fixture(params=['plain', 'cache'])
+def service(request, database):
+    if request.param == 'cache':
+        config.set({'identifier-cache': True})
+    return LookupService()
+
+
+@pytest.fixture
+def client(database):
+    pytest.importorskip('flask')
+    # Imported per test, since the app creates its service on import
+    spec = importlib.util.spec_from_file_location('id_tool', APP)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.app.test_client()
+
+
+def matched(records, values):
+    """Sets of Consortium IDs matched by each value in lookup records."""
+    return [set(records.loc[records['value'] == value, 'consortium_id'])
+            for value in values]
+
+
+def test_lookup(service, sample):
+    records = service.lookup(sample.values)
+    assert matched(records, sample.values) == sample.matches()
+    restricted = service.lookup(sample.values, center=sample.center)
+    assert matched(restricted, sample.values) == sample.matches(True)
+
+    value = sample.values[0]
+    assert service.lookup(value).equals(service.lookup([value]))
+
+
+def test_concurrent_lookups(service, sample):
+    values = [sample.values[i::8] for i in range(8)]
+    with ThreadPoolExecutor(4) as pool:
+        results = list(pool.map(service.lookup, values * 2))
+    for chunk, records in zip(values * 2, results):
+        assert matched(records, chunk) == [
+            matches for value, matches in zip(sample.values, sample.matches())
+            if value in chunk
+        ]
+
+
+def test_choices(service, sample):
+    assert service.indices()[-1] == 'all'
+    assert sample.center in service.centers()
+    with pytest.raises(ValueError, match='Unknown index'):
+        service.lookup('x', index='nope')
+    with pytest.raises(CenterNotFound):
+        service.lookup('x', center='No center')
+
+
+def test_iter_csv(service, sample):
+    chunks = list(service.iter_csv(sample.values, chunk_size=50))
+    assert len(chunks) == math.ceil(len(sample.values) / 50)
+    df = pd.read_csv(io.StringIO(''.join(chunks)), dtype=str)
+    expected = service.lookup(sample.values)
+    assert df['value'].tolist() == expected['value'].tolist()
+    assert df['consortium_id'].tolist() == expected['consortium_id'].tolist()
+
+
+def test_app_index(client, sample):
+    response = client.get('/')
+    assert response.status_code == 200
+    assert sample.center in response.text
+
+
+def test_app_api(client, sample):
+    value = sample.values[0]
+    records = client.get('/api/lookup', query_string={'value': value}).json
+    assert {r['consortium_id'] for r in records} == sample.matches()[0]
+
+    response = client.post('/api/batch', json={'values': sample.values,
+                                               'center': sample.center})
+    records = pd.DataFrame(response.json)
+    assert matched(records, sample.values) == sample.matches(True)
+
+    for args in [{}, {'value': value, 'index': 'nope'},
+                 {'value': value, 'center': 'No center'}]:
+        response = client.get('/api/lookup', query_string=args)
+        assert response.status_code == 400
+        assert 'error' in response.json
+    assert client.post('/api/batch', json={}).status_code == 400
+
+
+def test_app_download(client, sample):
+    response = client.post('/lookup', data={
+        'index': 'all', 'center': '', 'value': ', '.join(sample.values[:20]),
+    })
+    assert response.status_code == 200
+    assert response.mimetype == 'text/csv'
+    df = pd.read_csv(io.StringIO(response.text), dtype=str)
+    assert matched(df, sample.values[:20]) == sample.matches()[:20]
+
+    for form in [{'index': 'nope', 'value': 'x'},
+                 {'index': 'all', 'center': 'No center', 'value': 'x'}]:
+        assert client.post('/lookup', data=form).status_code == 400
@@ -0,0 +1,44 @@
+"""Snapshot mode answers lookups from a read-only file and refuses writes."""
+
+import pytest
+from click.testing import CliRunner
+from sqlalchemy.exc import OperationalError
+
+from id_search import ReadOnlyError, config, db, loaders, utils
+from id_search.cli import cli
+
+
+@pytest.mark.parametrize('indexed', [False, True])
+@pytest.mark.parametrize('restricted', [False, True])
+def test_batch_query(database, sample, request, indexed, restricted):
+    if indexed:
+        utils.build_index()
+    request.getfixturevalue('snapshot')
+    center = sample.center if restricted else None
+    result = utils.batch_query(sample.series(), 'all', center)
+    assert sample.as_sets(result) == sample.matches(restricted)
+
+
+def test_pragmas(snapshot):
+    opts = config['snapshot']
+    with snapshot.connect() as conn:
+        assert (conn.exec_driver_sql('PRAGMA cache_size').scalar()
+                == opts['cache-size'].get(int))
+        with pytest.raises(OperationalError, match='readonly'):
+            conn.exec_driver_sql('DELETE FROM alias')
+
+
+@pytest.mark.parametrize('write', [
+    utils.build_index,
+    db.init_db,
+    lambda: loaders.load([]),
+])
+def test_writes_refused(snapshot, write):
+    with pytest.raises(ReadOnlyError):
+        write()
+
+
+def test_cli_reports_read_only(snapshot):
+    result = CliRunner().invoke(cli, ['build-index'])
+    assert result.exit_code == 1
+    assert 'read-only snapshot' in result.output
@@ -0,0 +1,128 @@
+"""
+Bulk writes re-key every row referencing a participant, and lookups see
+them through the tables, the identifier index and the identifier cache.
+"""
+
+import random
+
+import pandas as pd
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+import synthetic
+from id_search import ReadOnlyError, config, db, utils
+
+
+@pytest.fixture(params=['plain', 'index', 'cache'])
+def mode(request, database):
+    if request.param == 'index':
+        utils.build_index()
+    elif request.param == 'cache':
+        config.set({'identifier-cache': True})
+    return request.param
+
+
+def new_cids(identifiers, n):
+    """Consortium IDs not yet in the database."""
+    known = {row[0] for row in identifiers()}
+    return [cid for cid in synthetic._cids(random.Random(99), n + 10)
+            if cid not in known][:n]
+
+
+def lookup(values):
+    return utils.batch_query(pd.Series(values, dtype=object)).tolist()
+
+
+def matches(cids):
+    """Consortium IDs of one row of a batch_query result, as a set."""
+    return {cids} if isinstance(cids, str) else set(cids or [])
+
+
+def referencing_columns():
+    """Columns of every table referencing a participant's Consortium ID."""
+    participant = db.RegisteredParticipant.__table__
+    return [participant.c.spouse] + [
+        column for table in db.Base.metadata.sorted_tables
+        for column in table.c
+        if any(fk.column is participant.c.consortium_id
+               for fk in column.foreign_keys)
+    ]
+
+
+def test_add_aliases(mode, identifiers):
+    with Session(db.engine) as session:
+        cids = session.scalars(
+            select(db.RegisteredParticipant.consortium_id).limit(2)
+        ).all()
+    aliases = new_cids(identifiers, 2)
+    pairs = list(zip(cids, aliases))
+    assert lookup(aliases) == [None, None]
+
+    assert utils.add_aliases(pairs, dry_run=True).empty
+    assert lookup(aliases) == [None, None]
+
+    assert utils.add_aliases(pairs).empty
+    assert lookup(aliases) == cids
+
+    conflicts = utils.add_aliases(pairs)
+    assert conflicts['conflict'].str.contains('already in use').all()
+    assert utils.add_aliases([]).empty
+
+
+def test_make_primaries(mode, identifiers):
+    # A married participant with samples
+    p = db.RegisteredParticipant
+    with Session(db.engine) as session:
+        cid = session.scalar(
+            select(p.consortium_id)
+            .join(db.DNASample, db.DNASample.consortium_id == p.consortium_id)
+            .where(p.consortium_id.in_(select(p.spouse)))
+            .limit(1)
+        )
+    alias, = new_cids(identifiers, 1)
+    assert utils.add_aliases([(cid, alias)]).empty
+    owned = [value for value, _, _, owner in identifiers() if owner == cid]
+    # Resolved before writing, so that lookups have state to invalidate
+    assert all(cid in matches(value) for value in lookup(owned))
+
+    assert utils.make_primaries([alias], dry_run=True).empty
+    assert lookup([alias]) == [cid]
+
+    assert utils.make_primaries([alias]).empty
+    with db.engine.connect() as conn:
+        for column in referencing_columns():
+            count = conn.scalar(select(func.count()).where(column == cid))
+            assert count == 0, f'{column} still references {cid}'
+        assert conn.scalar(select(func.count()).where(p.spouse == alias))
+    with Session(db.engine) as session:
+        participant, = utils.load_participants([alias], session)
+        assert cid in [a.alias for a in participant.aliases]
+        assert participant.dna_samples
+
+    # Values such as local IDs may match participants of other centers
+    for value in lookup(owned):
+        assert alias in matches(value) and cid not in matches(value)
+    assert lookup([cid]) == [alias]
+
+    conflicts = utils.make_primaries([cid, cid, 'Z999999-999999'])
+    assert conflicts['conflict'].tolist() == [
+        f'Alias "{cid}" listed more than once',
+        f'Alias "{cid}" listed more than once',
+        'Alias "Z999999-999999" not found',
+    ]
+
+
+def test_dry_run_on_snapshot(snapshot, identifiers):
+    with Session(snapshot) as session:
+        cid, alias = session.execute(
+            select(db.Alias.consortium_id, db.Alias.alias).limit(1)
+        ).one()
+    new, = new_cids(identifiers, 1)
+
+    assert utils.add_aliases([(cid, new)], dry_run=True).empty
+    assert utils.make_primaries([alias], dry_run=True).empty
+    with pytest.raises(ReadOnlyError):
+        utils.add_aliases([(cid, new)])
+    with pytest.raises(ReadOnlyError):
+        utils.make_primaries([alias])
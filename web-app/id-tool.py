@@ -1,29 +1,82 @@
-from flask import Flask, render_template, request
-from ibdgc_db.cli import cli
-import click
+from flask import (Flask, Response, render_template, request,
+    send_from_directory)
+from id_search.service import LookupService
+import os
+
+app = Flask(__name__, root_path=os.path.dirname(os.path.abspath(__file__)),
+            template_folder='.')
+# One service per worker process, shared by all of its requests
+service = LookupService()
+
+
+def _values(text):
+    """Split pasted identifiers on newlines and commas."""
+
+    return [v.strip() for v in text.replace(',', '\n').splitlines()
+            if v.strip()]
+
+
+def _json(df):
+    return Response(df.to_json(orient='records', date_format='iso'),
+                    mimetype='application/json')
 
-app = Flask(__name__)
 
 @app.route('/')
 def index():
-    centers = utils.get_centers()
-    return render_template('index.html') 
+    return render_template('index.html', centers=service.centers(),
+                           indices=service.indices())
+
+
+@app.route('/style.css')
+def style():
+    return send_from_directory(app.root_path, 'style.css')
+
+
+@app.route('/api/lookup')
+def api_lookup():
+    """Look up a single identifier, e.g. /api/lookup?value=A123456-123456"""
+
+    try:
+        return _json(service.lookup(request.args['value'],
+                                    request.args.get('index', 'all'),
+                                    request.args.get('center') or None))
+    except (KeyError, ValueError) as e:
+        return {'error': str(e)}, 400
+
+
+@app.route('/api/batch', methods=['POST'])
+def api_batch():
+    """Look up {"values": [...], "index": ..., "center": ...}"""
+
+    query = request.get_json(force=True)
+    try:
+        return _json(service.lookup(list(query['values']),
+                                    query.get('index', 'all'),
+                                    query.get('center') or None))
+    except (KeyError, TypeError, ValueError) as e:
+        return {'error': str(e)}, 400
+
 
 @app.route('/lookup', methods=['POST'])
 def lookup():
+    """Download lookup results for the submitted form as CSV."""
+
     index = request.form['index']
-    center = request.form['center']
-    value = request.form['value']
-    
-    ctx = click.Context(cli, info_name=cli.name)
-    args = ['--index', index, '--center', center, value]
-    
-    try:
-        result = cli.invoke(ctx, ['lookup'] + args)
-        return result.output
-    
-    except click.ClickException as e:
-        return str(e), 400
+    center = request.form.get('center') or None
+    values = _values(request.form['value'])
+    # Checked up front, since errors raised while streaming the response
+    # would only truncate it
+    if index not in service.indices():
+        return f'Unknown index "{index}"', 400
+    if center is not None and center not in service.centers():
+        return f'Center "{center}" not found', 400
+
+    return Response(
+        service.iter_csv(values, index, center),
+        mimetype='text/csv',
+        headers={'Content-Disposition':
+                 'attachment; filename=participants_lookup.csv'}
+    )
 
 if __name__ == '__main__':
     app.run()